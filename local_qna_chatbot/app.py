@@ -4,6 +4,7 @@ import os
 import time
 import json
 import re
+import uuid
 from typing import Optional
 
 # Set page config
@@ -54,26 +55,58 @@ st.markdown("""
 
 # API configuration
 API_URL = "http://localhost:8000"
+# Document collection this browser session uploads to and asks about
+COLLECTION_ID = "default"
 
-def upload_file(file):
-    """Upload a file to the backend"""
+def upload_file(file, on_progress=None):
+    """Upload a file to the backend and wait until it has been indexed"""
     files = {"file": (file.name, file, file.type)}
     try:
-        response = requests.post(f"{API_URL}/upload/", files=files, timeout=30)
+        response = requests.post(
+            f"{API_URL}/upload/",
+            files=files,
+            data={"collection_id": COLLECTION_ID},
+            timeout=30
+        )
         response.raise_for_status()
-        return response.json()
+        result = response.json()
     except requests.exceptions.RequestException as e:
         error_msg = f"Error uploading file: {str(e)}"
         print(error_msg)
         return {"status": "error", "message": error_msg}
 
+    # The backend indexes the document in the background
+    if result.get("job_id"):
+        return wait_for_job(result["job_id"], on_progress)
+    return result
+
+def wait_for_job(job_id: str, on_progress=None, poll_interval: float = 0.5) -> dict:
+    """Poll an ingestion job until it finishes"""
+    while True:
+        try:
+            response = requests.get(f"{API_URL}/jobs/{job_id}", timeout=10)
+            response.raise_for_status()
+            job = response.json()
+        except requests.exceptions.RequestException as e:
+            error_msg = f"Error checking upload progress: {str(e)}"
+            print(error_msg)
+            return {"status": "error", "message": error_msg}
+
+        if on_progress:
+            on_progress(job)
+        if job["status"] == "completed":
+            return {"status": "success", "message": "Document uploaded and processed successfully"}
+        if job["status"] in ("failed", "cancelled"):
+            return {"status": "error", "message": job.get("error") or f"Upload {job['status']}"}
+        time.sleep(poll_interval)
+
 def ask_question(question: str, temperature: float = 0.7) -> dict:
     """Send a question to the RAG model with better error handling"""
     try:
         print(f"Sending request to {API_URL}/ask with question: {question}")
         response = requests.post(
             f"{API_URL}/ask",
-            json={"question": question, "temperature": temperature},
+            json={"question": question, "temperature": temperature, "collection_id": COLLECTION_ID},
             timeout=300
         )
         
@@ -110,6 +143,45 @@ def ask_question(question: str, temperature: float = 0.7) -> dict:
         print(error_msg)
         return {"answer": error_msg}
 
+def ask_question_stream(question: str, temperature: float = 0.7):
+    """Stream an answer from the RAG model, yielding pieces of text as they arrive"""
+    try:
+        with requests.post(
+            f"{API_URL}/ask/stream",
+            json={"question": question, "temperature": temperature, "collection_id": COLLECTION_ID},
+            stream=True,
+            timeout=(10, 300)
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                # Server-Sent Events: payloads arrive on "data:" lines
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                if event.get("type") == "token":
+                    yield event.get("content", "")
+                elif event.get("type") == "error":
+                    yield f"Error: {event.get('error')}"
+                    return
+                elif event.get("type") == "done":
+                    return
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Error getting response: {str(e)}"
+        print(error_msg)
+        yield error_msg
+    except json.JSONDecodeError as e:
+        error_msg = f"Error parsing response: {str(e)}"
+        print(error_msg)
+        yield error_msg
+
+def render_stream(placeholder, question: str, temperature: float) -> str:
+    """Render a streamed answer progressively and return the full text"""
+    text = ""
+    for piece in ask_question_stream(question, temperature):
+        text += piece
+        placeholder.markdown(text + "▌")
+    return text or "No answer provided"
+
 def main():
     st.title("💲 LocalMind")
     st.markdown("Upload a document and ask questions about its content.")
@@ -131,10 +203,20 @@ def main():
             0.0, 1.0, 0.7, 0.1,
             help="Higher values make output more random, lower values more focused"
         )
+
+        # Each session gets its own collection unless one is entered to share
+        if "collection_id" not in st.session_state:
+            st.session_state.collection_id = uuid.uuid4().hex[:12]
+        collection_id = st.text_input(
+            "Collection",
+            key="collection_id",
+            help="Documents are kept per collection. Enter the same name in another session to share them."
+        )
     
-    # Update global API URL
-    global API_URL
+    # Update global API URL and collection
+    global API_URL, COLLECTION_ID
     API_URL = api_url
+    COLLECTION_ID = collection_id.strip() or "default"
         
 
 
@@ -164,9 +246,20 @@ def main():
         if uploaded_file.name != st.session_state.current_file:
             # Place status container right here
             status_container = st.empty()
-            with status_container:
+            with status_container.container():
                 with st.spinner("Uploading and indexing document..."):
-                    upload_result = upload_file(uploaded_file)
+                    progress_bar = st.progress(0.0, text="Uploading...")
+
+                    def show_progress(job):
+                        if job.get("progress") is None:
+                            return
+                        total = f"~{job['total_chunks']}" if job.get("total_is_estimate") else job["total_chunks"]
+                        text = f"Indexed {job['embedded_chunks']}/{total} chunks"
+                        if job.get("eta_seconds") is not None:
+                            text += f" (about {job['eta_seconds']:.0f}s left)"
+                        progress_bar.progress(min(job["progress"], 1.0), text=text)
+
+                    upload_result = upload_file(uploaded_file, on_progress=show_progress)
                     if upload_result and upload_result.get("status") == "success":
                         st.success("✅ Document uploaded successfully!")
                         st.session_state.current_file = uploaded_file.name
@@ -198,18 +291,16 @@ def main():
             full_response = ""
             
             try:
-                with st.spinner("Thinking..."):
-                    response = ask_question(prompt, temperature)
-                    full_response = response.get("answer", "No answer provided")
-                    
-                    # Auto-recover if backend lost the session (restarted)
-                    if "RAG pipeline not initialized" in full_response and uploaded_file:
-                        st.toast("Restoring connection...", icon="🔄")
-                        uploaded_file.seek(0)
-                        upload_file(uploaded_file)
-                        # Retry the question
-                        response = ask_question(prompt, temperature)
-                        full_response = response.get("answer", "No answer provided")
+                message_placeholder.markdown("Thinking...")
+                full_response = render_stream(message_placeholder, prompt, temperature)
+                
+                # Auto-recover if backend lost the session (restarted)
+                if "RAG pipeline not initialized" in full_response and uploaded_file:
+                    st.toast("Restoring connection...", icon="🔄")
+                    uploaded_file.seek(0)
+                    upload_file(uploaded_file)
+                    # Retry the question
+                    full_response = render_stream(message_placeholder, prompt, temperature)
                     
             except Exception as e:
                 full_response = f"An error occurred: {str(e)}"
@@ -0,0 +1,90 @@
+"""
+Compare FAISS index types on a synthetic corpus.
+
+Reports build time, recall@k against the exact flat index, queries per
+second and serialized index size for each index type.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_ann.py --n 100000 --dim 768 --k 5
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.embeddings.index_factory import INDEX_TYPES, build_index, search_parameters
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, seed: int = 0):
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(8, n // 500)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n + n_queries)
+    data = centers[labels] + 0.5 * rng.standard_normal((n + n_queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return np.ascontiguousarray(data[:n]), np.ascontiguousarray(data[n:])
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def bench_index(index_type, corpus, queries, truth, k, nprobe, ef_search):
+    start = time.perf_counter()
+    index = build_index(corpus, index_type=index_type)
+    build_seconds = time.perf_counter() - start
+
+    params = search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+    # Single-query calls, matching how the retriever searches
+    start = time.perf_counter()
+    found = np.vstack([index.search(q.reshape(1, -1), k, params=params)[1] for q in queries])
+    search_seconds = time.perf_counter() - start
+
+    return {
+        "index_type": index_type,
+        "built_as": type(index).__name__,
+        "build_s": round(build_seconds, 3),
+        f"recall@{k}": round(recall_at_k(found, truth), 4),
+        "qps": round(len(queries) / search_seconds, 1),
+        "memory_mb": round(faiss.serialize_index(index).nbytes / 2**20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50000, help="Corpus size")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension (nomic-embed-text: 768)")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    corpus, queries = synthetic_corpus(args.n, args.dim, args.queries)
+    truth = faiss.IndexFlatL2(args.dim)
+    truth.add(corpus)
+    _, truth_ids = truth.search(queries, args.k)
+
+    results = []
+    for index_type in args.types:
+        result = bench_index(index_type, corpus, queries, truth_ids, args.k, args.nprobe, args.ef_search)
+        results.append(result)
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
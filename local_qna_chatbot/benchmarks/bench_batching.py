@@ -0,0 +1,110 @@
+"""
+Measure query micro-batching: throughput and latency of concurrent searches.
+
+Runs `concurrency` asyncio clients that each send queries back to back
+through the retrieval layer's search (and, with --embed, the query
+embedding) with batching off and on, and reports queries per second,
+p50/p99 latency and the mean batch size. Searches use a flat index of
+random vectors; --embed needs the configured embedding backend (e.g. a
+running Ollama server).
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_batching.py --vectors 100000 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag import batcher
+
+WORDS = (
+    "the retrieval index stores embeddings of every chunk so that questions can be answered "
+    "from the uploaded documents without sending them anywhere else model context window"
+).split()
+
+
+async def client(index, queries, texts, k, deadline, latencies):
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if texts is not None:
+            vector = await batcher.aembed_query(texts[i % len(texts)])
+        else:
+            vector = queries[i % len(queries)]
+        await batcher.asearch_query(index, vector, k)
+        latencies.append(time.perf_counter() - start)
+        i += 1
+
+
+async def run(index, queries, texts, k, concurrency, seconds):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(index, queries[c::concurrency], texts, k, deadline, latencies) for c in range(concurrency)
+    ))
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000, help="Vectors in the index")
+    parser.add_argument("--dimension", type=int, default=768, help="Vector dimension")
+    parser.add_argument("--k", type=int, default=20, help="Neighbours per query")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent clients")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run")
+    parser.add_argument("--embed", action="store_true", help="Embed query texts too (needs the embedding backend)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    batcher.configure_blas()
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(args.dimension)
+    index.add(rng.standard_normal((args.vectors, args.dimension), dtype=np.float32))
+    queries = rng.standard_normal((4096, args.dimension), dtype=np.float32)
+    texts = None
+    if args.embed:
+        # Measure the model, not the embedding cache
+        batcher.get_client().cache = None
+        texts = [" ".join(rng.choice(WORDS, 12)) for _ in range(1000)]
+        index = faiss.IndexFlatL2(len(batcher.get_client().embed_one(texts[0])))
+        index.add(rng.standard_normal((args.vectors, index.d), dtype=np.float32))
+
+    results = []
+    for concurrency in args.concurrency:
+        for batching in (False, True):
+            batcher.USE_QUERY_BATCHING = batching
+            before = batcher.batching_stats() if batching else None
+            latencies, seconds = asyncio.run(run(index, queries, texts, args.k, concurrency, args.seconds))
+            latencies = np.array(latencies) * 1000
+            result = {
+                "concurrency": concurrency,
+                "batching": batching,
+                "queries_per_s": round(len(latencies) / seconds, 1),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+            }
+            if batching:
+                after = batcher.batching_stats()
+                for stage in ("embed", "search") if texts is not None else ("search",):
+                    batches = after[stage]["batches"] - before[stage]["batches"]
+                    batched = after[stage]["queries"] - before[stage]["queries"]
+                    result[f"mean_{stage}_batch"] = round(batched / max(batches, 1), 1)
+            results.append(result)
+            print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
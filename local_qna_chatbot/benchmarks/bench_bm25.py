@@ -0,0 +1,80 @@
+"""
+Measure the BM25 lexical index used by hybrid retrieval.
+
+Indexes synthetic chunks in ingestion-sized batches (so buffered postings
+are merged along the way), then times keyword queries of one to four
+terms with a mix of rare and common words. Reports indexing throughput,
+index memory and query latency percentiles.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_bm25.py --chunks 50000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.embeddings.bm25 import BM25Index
+from src.rag.retriever import HYBRID_CANDIDATES
+
+
+def synthetic_chunks(n_chunks: int, words_per_chunk: int, vocab_size: int, seed: int = 0):
+    """Chunks of Zipf-distributed words, so a few terms are very common."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"term{i}" for i in range(vocab_size)])
+    for _ in range(n_chunks):
+        ids = np.minimum(rng.zipf(1.2, words_per_chunk), vocab_size) - 1
+        yield " ".join(vocab[ids])
+
+
+def percentiles(seconds) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(ms, p)), 4) for p in (50, 95, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000, help="Number of chunks to index")
+    parser.add_argument("--words", type=int, default=300, help="Words per chunk")
+    parser.add_argument("--vocab", type=int, default=50000, help="Distinct words")
+    parser.add_argument("--batch", type=int, default=64, help="Chunks added at a time")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries to time")
+    parser.add_argument("--k", type=int, default=HYBRID_CANDIDATES, help="Rows returned per query")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    chunks = list(synthetic_chunks(args.chunks, args.words, args.vocab))
+    index = BM25Index()
+    start = time.perf_counter()
+    for i in range(0, len(chunks), args.batch):
+        index.add(chunks[i:i + args.batch])
+    index_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    results = {
+        "index_seconds": round(index_seconds, 3),
+        "chunks_per_s": round(args.chunks / index_seconds),
+        "memory_mb": round(index.memory_bytes() / 2**20, 2),
+    }
+    for n_terms in (1, 2, 4):
+        timings = []
+        for _ in range(args.queries):
+            query = " ".join(f"term{i}" for i in rng.integers(0, min(args.vocab, 5000), n_terms))
+            start = time.perf_counter()
+            index.search(query, args.k)
+            timings.append(time.perf_counter() - start)
+        results[f"{n_terms}_term_query"] = percentiles(timings)
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
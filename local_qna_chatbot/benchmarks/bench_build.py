@@ -0,0 +1,107 @@
+"""
+Measure how cleaning and chunking the dataset scales with worker processes.
+
+Runs the process_data pipeline on the same synthetic records with each
+worker count and reports per-stage time and the speedup over one worker.
+The chunk tables produced must be identical. With --memory, also reports
+peak memory allocated in the main process (tracing slows it down, so
+timings from such a run are not comparable).
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_build.py --records 20000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.ingestion.cleaner import clean_text
+from src.ingestion.incremental import CHUNK_HASHES_FILE, StageTimer, update_processed
+
+WORDS = (
+    "the retrieval index stores embeddings of every chunk so that questions can be answered "
+    "from the uploaded documents without sending them anywhere else model context window"
+).split()
+
+
+def synthetic_records(n_records: int, words_per_record: int, seed: int = 0):
+    """Generated lazily, like records streamed from a file."""
+    rng = np.random.default_rng(seed)
+    for i in range(n_records):
+        words = rng.choice(WORDS, words_per_record)
+        # Sentences of 12 words, so the chunker has boundaries to respect
+        text = ". ".join(" ".join(words[j:j + 12]) for j in range(0, len(words), 12)) + "."
+        yield {"id": i, "text": text}
+
+
+def run(records, workers: int, directory: Path, trace_memory: bool):
+    timer = StageTimer()
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        if executor is not None:
+            # Start the workers outside the timed stages
+            list(executor.map(clean_text, [""] * workers))
+        if trace_memory:
+            tracemalloc.start()
+        update_processed(records, directory, full=True, executor=executor, timer=timer)
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        tracemalloc.stop()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return timer, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=5000, help="Number of records")
+    parser.add_argument("--words", type=int, default=600, help="Words per record")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("--memory", action="store_true", help="Trace peak memory of the main process")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    baseline = reference = None
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bench_build_"))
+    try:
+        for workers in args.workers:
+            start = time.perf_counter()
+            timer, peak = run(synthetic_records(args.records, args.words), workers, tmp_dir, args.memory)
+            seconds = time.perf_counter() - start
+            hashes = np.load(tmp_dir / CHUNK_HASHES_FILE)
+            if reference is None:
+                reference = hashes
+            elif not np.array_equal(hashes, reference):
+                raise AssertionError(f"Chunks built with {workers} workers differ from the first run")
+            baseline = baseline or seconds
+            result = {
+                "workers": workers,
+                **{f"{name.replace(' ', '_')}_s": round(value, 3) for name, value in timer.seconds.items()},
+                "total_s": round(seconds, 3),
+                "speedup": round(baseline / seconds, 2),
+                "chunks": len(hashes),
+            }
+            if peak is not None:
+                result["peak_mb"] = round(peak / 2**20, 1)
+            results.append(result)
+            print("  ".join(f"{key}={value}" for key, value in result.items()))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
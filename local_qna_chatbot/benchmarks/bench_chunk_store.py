@@ -0,0 +1,111 @@
+"""
+Compare the JSON chunk list with the columnar, memory-mapped chunk table.
+
+Writes the same synthetic chunks as a JSON list of dicts (the former
+processed_data.json) and as a ChunkTable, then measures for each: file
+size, load time, memory allocated by loading (traced Python allocations;
+mapped pages are not counted, they belong to the page cache) and latency
+of random lookups by row.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_chunk_store.py --chunks 200000
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.embeddings.chunk_table import ChunkTable
+
+WORDS = (
+    "the retrieval index stores embeddings of every chunk so that questions can be answered "
+    "from the uploaded documents without sending them anywhere else model context window"
+).split()
+
+
+def synthetic_records(n_chunks: int, words_per_chunk: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vocab = np.array(WORDS)
+    offset = 0
+    for i in range(n_chunks):
+        text = " ".join(vocab[rng.integers(0, len(vocab), words_per_chunk)])
+        yield {"id": i + 1, "text": text, "start": offset, "end": offset + len(text)}
+        offset += len(text) + 1
+
+
+def directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir()) if path.is_dir() else path.stat().st_size
+
+
+def measure(label: str, path: Path, load, text, lookups: np.ndarray) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = load()
+    load_seconds = time.perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for row in lookups:
+        text(data, int(row))
+    lookup_seconds = time.perf_counter() - start
+
+    return {
+        "store": label,
+        "file_mb": round(directory_bytes(path) / 2**20, 2),
+        "load_ms": round(load_seconds * 1000, 2),
+        "allocated_mb": round(allocated / 2**20, 2),
+        "lookup_us": round(lookup_seconds / len(lookups) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000, help="Number of chunks")
+    parser.add_argument("--words", type=int, default=100, help="Words per chunk")
+    parser.add_argument("--lookups", type=int, default=10000, help="Random lookups timed")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bench_chunk_store_"))
+    try:
+        records = list(synthetic_records(args.chunks, args.words))
+        json_path = tmp_dir / "processed_data.json"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2)
+        table_path = tmp_dir / "chunks"
+        ChunkTable.from_records(records).save(table_path)
+        del records
+
+        def load_json():
+            with open(json_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        lookups = np.random.default_rng(1).integers(0, args.chunks, args.lookups)
+        results = [
+            measure("json", json_path, load_json, lambda data, row: data[row]["text"], lookups),
+            measure(
+                "chunk table", table_path, lambda: ChunkTable.open(table_path),
+                lambda data, row: data.text(row), lookups
+            ),
+        ]
+        for result in results:
+            print("  ".join(f"{key}={value}" for key, value in result.items()))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compare the word-window chunker with the token-aware streaming chunker.
+
+Runs `chunk_text(clean_text(text))` (the original path) and `chunk_document`
+over a synthetic multi-megabyte document fed in blocks, once with ASCII
+text (numpy fast path) and once with non-ASCII text (regex tokenizer).
+Reports throughput, number of chunks and peak traced memory.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_chunker.py --mb 16
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.ingestion.chunker import CHUNK_OVERLAP, CHUNK_TOKENS, chunk_document, chunk_text
+from src.ingestion.cleaner import clean_text
+from src.ingestion.extract import TEXT_BLOCK_SIZE
+
+WORDS = (
+    "the retrieval index stores embeddings of every chunk so that questions can be answered "
+    "from the uploaded documents without sending them anywhere else model context window"
+).split()
+
+
+def synthetic_text(megabytes: float, non_ascii: bool = False, seed: int = 0) -> str:
+    """Sentences of 8-30 words, grouped into paragraphs of 2-8 sentences."""
+    rng = np.random.default_rng(seed)
+    words = WORDS + (["café", "naïve", "straße", "日本語"] if non_ascii else [])
+    target = int(megabytes * 2**20)
+    paragraphs, length = [], 0
+    while length < target:
+        sentences = []
+        for _ in range(rng.integers(2, 9)):
+            sentence = " ".join(words[i] for i in rng.integers(0, len(words), rng.integers(8, 31)))
+            sentences.append(sentence.capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def blocks(text: str, block_size: int):
+    for start in range(0, len(text), block_size):
+        yield text[start:start + block_size]
+
+
+def measure(label: str, run, megabytes: float) -> dict:
+    start = time.perf_counter()
+    n_chunks = run()
+    seconds = time.perf_counter() - start
+
+    # Separate pass, tracing slows the run down
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "chunker": label,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(megabytes / seconds, 2),
+        "chunks": n_chunks,
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=8, help="Size of the synthetic document")
+    parser.add_argument("--size", type=int, default=CHUNK_TOKENS, help="Tokens per chunk")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help="Tokens shared by consecutive chunks")
+    parser.add_argument("--block", type=int, default=TEXT_BLOCK_SIZE, help="Characters per streamed piece")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for non_ascii in (False, True):
+        text = synthetic_text(args.mb, non_ascii=non_ascii)
+        suffix = " (non-ASCII)" if non_ascii else ""
+        runs = [
+            ("chunk_text" + suffix, lambda: len(chunk_text(clean_text(text)))),
+            (
+                "chunk_document" + suffix,
+                lambda: sum(1 for _ in chunk_document(blocks(text, args.block), args.size, args.overlap))
+            ),
+            (
+                "chunk_document, no boundaries" + suffix,
+                lambda: sum(1 for _ in chunk_document(
+                    blocks(text, args.block), args.size, args.overlap, respect_boundaries=False
+                ))
+            ),
+        ]
+        for label, run in runs:
+            result = measure(label, run, args.mb)
+            results.append(result)
+            print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare embedding throughput of the Ollama and local backends.
+
+Embeds the same synthetic chunks with each configuration, with the
+embedding cache disabled, and reports texts per second. The Ollama
+configuration needs a running Ollama server with the embedding model
+pulled; the local ones need `sentence-transformers` (and
+`optimum[onnxruntime]` for onnx). Configurations that cannot be loaded are
+reported and skipped.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_embedders.py --texts 512 --threads 4
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.embeddings.embedder import EmbeddingClient
+from src.embeddings.local_embedder import LOCAL_BATCH_SIZE, LOCAL_MODEL_NAME, LocalEmbedder
+
+WORDS = (
+    "the retrieval index stores embeddings of every chunk so that questions can be answered "
+    "from the uploaded documents without sending them anywhere else model context window"
+).split()
+
+
+def synthetic_chunks(n_texts: int, words_per_text: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, words_per_text)) for _ in range(n_texts)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=256, help="Texts embedded per configuration")
+    parser.add_argument("--words", type=int, default=200, help="Words per text")
+    parser.add_argument("--model", default=LOCAL_MODEL_NAME, help="sentence-transformers model")
+    parser.add_argument("--threads", type=int, help="CPU threads for the local backend")
+    parser.add_argument("--batch-size", type=int, default=LOCAL_BATCH_SIZE, help="Texts per local forward pass")
+    parser.add_argument("--skip-ollama", action="store_true", help="Only measure the local backend")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    texts = synthetic_chunks(args.texts, args.words)
+    configs = [] if args.skip_ollama else [("ollama", lambda: EmbeddingClient())]
+    for runtime in ("torch", "onnx"):
+        for quantize in (False, True):
+            configs.append((
+                f"local {runtime}" + (" int8" if quantize else ""),
+                lambda runtime=runtime, quantize=quantize: LocalEmbedder(
+                    args.model, runtime=runtime, quantize=quantize,
+                    threads=args.threads, batch_size=args.batch_size
+                )
+            ))
+
+    results = []
+    for label, create in configs:
+        try:
+            embedder = create()
+            # Loads the model and warms up outside the timed run
+            embedder.embed(texts[:2])
+        except Exception as e:
+            print(f"{label}: skipped ({e})")
+            continue
+        start = time.perf_counter()
+        embeddings = embedder.embed(texts)
+        seconds = time.perf_counter() - start
+        embedder.close()
+        result = {
+            "backend": label,
+            "seconds": round(seconds, 3),
+            "texts_per_s": round(len(texts) / seconds, 1),
+            "dimension": embeddings.shape[1],
+        }
+        results.append(result)
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Load-test the API: throughput and latency percentiles of /ask and /upload/.
+
+By default starts the stub Ollama (stub_ollama.py) and the FastAPI app in
+this process, with collections in a temporary directory, so no model is
+needed and the numbers measure the chatbot itself plus the configured stub
+latencies. With --url, drives an already running API instead (point it at
+a real or stub Ollama yourself).
+
+A seed document is uploaded first. Then `concurrency` clients ask distinct
+questions back to back for --seconds, and afterwards upload small
+documents, timing both the upload request and the time until its ingestion
+job completes. Reports requests per second, errors and p50/p95/p99 latency
+per scenario; --output writes them as JSON so runs can be compared.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_load.py --concurrency 1 8 32 --seconds 10 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from stub_ollama import start_stub
+
+WORDS = (
+    "the retrieval index stores embeddings of every chunk so that questions can be answered "
+    "from the uploaded documents without sending them anywhere else model context window"
+).split()
+COLLECTION = "bench"
+# Seconds between polls of an ingestion job
+JOB_POLL_INTERVAL = 0.05
+
+
+def synthetic_document(rng, kilobytes: float) -> bytes:
+    sentences, length = [], 0
+    while length < kilobytes * 1024:
+        sentence = " ".join(rng.choice(WORDS, rng.integers(8, 31))).capitalize() + "."
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences).encode("utf-8")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_api(stub_url: str, store_dir: Path) -> str:
+    """Serve the app in a background thread, talking to the stub, with collections under `store_dir`."""
+    import uvicorn
+    from src.api import server
+    from src.embeddings import embedder
+    from src.rag import collections, generator
+
+    generator.OLLAMA_API_URL = f"{stub_url}/api/chat"
+    # No embedding cache: every question is embedded by the stub, as on a first run
+    embedder._default_client = embedder.EmbeddingClient(host=stub_url, cache=None)
+    server.collections = collections.CollectionRegistry(root=store_dir)
+
+    port = _free_port()
+    api = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=api.run, name="api", daemon=True).start()
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(url, timeout=1.0)
+            return url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise RuntimeError("The API did not start")
+
+
+async def upload(client: httpx.AsyncClient, name: str, content: bytes):
+    """Upload a document; returns (request seconds, seconds until indexed)."""
+    start = time.perf_counter()
+    response = await client.post(
+        "/upload/", files={"file": (name, content, "text/plain")}, data={"collection_id": COLLECTION}
+    )
+    response.raise_for_status()
+    accepted = time.perf_counter() - start
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] in ("completed", "failed", "cancelled"):
+            break
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+    if job["status"] != "completed":
+        raise RuntimeError(f"Ingestion of {name} ended as {job['status']}: {job.get('error')}")
+    return accepted, time.perf_counter() - start
+
+
+async def ask_client(client, questions, deadline, latencies, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.post("/ask", json={"question": questions[i % len(questions)], "collection_id": COLLECTION})
+            failed = response.status_code != 200 or "error" in response.json()
+        except httpx.HTTPError:
+            failed = True
+        latencies.append(time.perf_counter() - start)
+        errors[0] += failed
+        i += 1
+
+
+async def upload_client(client, client_id, documents, deadline, latencies, indexed, errors):
+    i = 0
+    while time.perf_counter() < deadline and i < len(documents):
+        try:
+            accepted, done = await upload(client, f"load_{client_id}_{i}.txt", documents[i])
+            latencies.append(accepted)
+            indexed.append(done)
+        except (httpx.HTTPError, RuntimeError):
+            errors[0] += 1
+        i += 1
+
+
+def summary(name: str, concurrency: int, latencies, seconds: float, errors: int) -> dict:
+    requests = len(latencies)
+    latencies = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "requests_per_s": round(requests / seconds, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 1),
+    }
+
+
+async def run(url: str, args) -> list:
+    rng = np.random.default_rng(0)
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency + [args.upload_concurrency]) + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(300.0), limits=limits) as client:
+        _, seconds = await upload(client, "seed.txt", synthetic_document(rng, args.seed_kb))
+        print(f"Seed document of {args.seed_kb} KB indexed in {seconds:.2f}s")
+
+        for concurrency in args.concurrency:
+            # Distinct questions, so the answer cache does not serve them
+            questions = [" ".join(rng.choice(WORDS, 10)) + f" ({concurrency}-{i})?" for i in range(100000)]
+            latencies, errors = [], [0]
+            started = time.perf_counter()
+            deadline = started + args.seconds
+            await asyncio.gather(*(
+                ask_client(client, questions[c::concurrency], deadline, latencies, errors) for c in range(concurrency)
+            ))
+            results.append(summary("ask", concurrency, latencies, time.perf_counter() - started, errors[0]))
+            print("  ".join(f"{key}={value}" for key, value in results[-1].items()))
+
+        if args.upload_seconds > 0:
+            concurrency = args.upload_concurrency
+            documents = [synthetic_document(rng, args.upload_kb) for _ in range(args.max_uploads)]
+            latencies, indexed, errors = [], [], [0]
+            started = time.perf_counter()
+            deadline = started + args.upload_seconds
+            await asyncio.gather(*(
+                upload_client(client, c, documents[c::concurrency], deadline, latencies, indexed, errors)
+                for c in range(concurrency)
+            ))
+            seconds = time.perf_counter() - started
+            for name, values in (("upload", latencies), ("upload_indexed", indexed)):
+                results.append(summary(name, concurrency, values, seconds, errors[0]))
+                print("  ".join(f"{key}={value}" for key, value in results[-1].items()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running API (default: start the app and a stub Ollama here)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent /ask clients")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each /ask run")
+    parser.add_argument("--seed-kb", type=float, default=256, help="Size of the document questions are asked about")
+    parser.add_argument("--upload-concurrency", type=int, default=4, help="Concurrent /upload/ clients")
+    parser.add_argument("--upload-seconds", type=float, default=10.0, help="Duration of the upload run, 0 to skip it")
+    parser.add_argument("--upload-kb", type=float, default=32, help="Size of each uploaded document")
+    parser.add_argument("--max-uploads", type=int, default=200, help="Most documents to upload")
+    stub = parser.add_argument_group("stub Ollama (without --url)")
+    stub.add_argument("--dimension", type=int, default=768, help="Embedding dimension")
+    stub.add_argument("--embed-latency", type=float, default=0.005, help="Seconds per embedding request")
+    stub.add_argument("--first-token", type=float, default=0.2, help="Seconds before the first answer token")
+    stub.add_argument("--token-latency", type=float, default=0.01, help="Seconds between answer tokens")
+    stub.add_argument("--tokens", type=int, default=32, help="Tokens per answer")
+    stub.add_argument("--load-time", type=float, default=0.0, help="Seconds to load a model that is not loaded")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    store_dir = None
+    url = args.url
+    if url is None:
+        stub_server = start_stub(
+            dimension=args.dimension, embed_latency=args.embed_latency, first_token=args.first_token,
+            token_latency=args.token_latency, tokens=args.tokens, load_time=args.load_time,
+        )
+        store_dir = Path(tempfile.mkdtemp(prefix="bench_load_"))
+        url = start_local_api(f"http://127.0.0.1:{stub_server.server_address[1]}", store_dir)
+    try:
+        results = asyncio.run(run(url, args))
+    finally:
+        if store_dir is not None:
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+    if args.output:
+        machine = {"python": platform.python_version(), "platform": platform.platform()}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "machine": machine, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
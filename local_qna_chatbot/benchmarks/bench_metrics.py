@@ -0,0 +1,64 @@
+"""
+Measure the cost of the latency instrumentation.
+
+Times `span`, `count` and `event` calls with metrics enabled, inside and
+outside a request trace, and with metrics disabled, and reports the cost
+per call. A query records a few dozen of them.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_metrics.py --calls 1000000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.monitoring import metrics
+
+
+def per_call_ns(calls: int) -> dict:
+    timings = {}
+    start = time.perf_counter()
+    for _ in range(calls):
+        with metrics.span("bench"):
+            pass
+    timings["span_ns"] = (time.perf_counter() - start) / calls * 1e9
+    start = time.perf_counter()
+    for _ in range(calls):
+        metrics.count("bench", 3)
+    timings["count_ns"] = (time.perf_counter() - start) / calls * 1e9
+    start = time.perf_counter()
+    for _ in range(calls):
+        metrics.event("bench")
+    timings["event_ns"] = (time.perf_counter() - start) / calls * 1e9
+    return {key: round(value, 1) for key, value in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200000, help="Calls per measurement")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for mode in ("disabled", "enabled", "enabled, traced"):
+        metrics.ENABLE_METRICS = mode != "disabled"
+        if mode.endswith("traced"):
+            with metrics.trace_request("bench"):
+                timings = per_call_ns(args.calls)
+        else:
+            timings = per_call_ns(args.calls)
+        result = {"mode": mode, **timings}
+        results.append(result)
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Microbenchmarks of the hot paths: cleaning, chunking, index build and search.
+
+Cleans and chunks a synthetic document, then builds each index type over
+random unit vectors at every corpus size and measures single-query
+search latency. Results are printed and, with --output, written as JSON
+so runs before and after a change can be compared. A million 768-d
+vectors take 3 GB; pass --sizes 10000 100000 1000000 to include them.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_micro.py --sizes 10000 100000 --output micro.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.embeddings.build_faiss import build_faiss
+from src.embeddings.index_factory import DEFAULT_INDEX_TYPE, INDEX_TYPES
+from src.embeddings.search_faiss import search
+from src.ingestion.chunker import chunk_document, chunk_text
+from src.ingestion.cleaner import clean_text
+from src.ingestion.extract import TEXT_BLOCK_SIZE
+
+WORDS = (
+    "the retrieval index stores embeddings of every chunk so that questions can be answered "
+    "from the uploaded documents without sending them anywhere else model context window"
+).split()
+
+
+def synthetic_text(megabytes: float, seed: int = 0) -> str:
+    """Sentences of 8-30 words in paragraphs, with the stray whitespace cleaning removes."""
+    rng = np.random.default_rng(seed)
+    target = int(megabytes * 2**20)
+    paragraphs, length = [], 0
+    while length < target:
+        sentences = [
+            " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), rng.integers(8, 31))).capitalize() + "."
+            for _ in range(rng.integers(2, 9))
+        ]
+        paragraph = "  ".join(sentences) + " \t"
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def timed(run, repeat: int = 3):
+    """Best of `repeat` runs: (seconds, result of the last run)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def text_benchmarks(megabytes: float):
+    text = synthetic_text(megabytes)
+    cleaned = clean_text(text)
+    blocks = lambda: (text[i:i + TEXT_BLOCK_SIZE] for i in range(0, len(text), TEXT_BLOCK_SIZE))
+    runs = [
+        ("clean_text", lambda: clean_text(text), None),
+        ("chunk_text", lambda: chunk_text(cleaned), len),
+        ("chunk_document", lambda: sum(1 for _ in chunk_document(blocks())), int),
+    ]
+    for name, run, n_chunks in runs:
+        seconds, result = timed(run)
+        row = {"benchmark": name, "seconds": round(seconds, 4), "mb_per_s": round(megabytes / seconds, 2)}
+        if n_chunks is not None:
+            row["chunks"] = n_chunks(result)
+        yield row
+
+
+def index_benchmarks(sizes, dimension: int, index_types, queries: int, k: int):
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        vectors = rng.standard_normal((size, dimension), dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        query_vectors = vectors[rng.integers(0, size, queries)]
+        for index_type in index_types:
+            start = time.perf_counter()
+            index = build_faiss(vectors, index_type=index_type)
+            build_seconds = time.perf_counter() - start
+
+            latencies = []
+            for query in query_vectors:
+                start = time.perf_counter()
+                search(index, query, k=k)
+                latencies.append(time.perf_counter() - start)
+            latencies = np.array(latencies) * 1000
+            yield {
+                "benchmark": "index",
+                "index_type": index_type,
+                "vectors": size,
+                "build_s": round(build_seconds, 3),
+                "search_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "search_p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                "queries_per_s": round(len(latencies) / (latencies.sum() / 1000), 1),
+            }
+            del index
+        del vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=4, help="Size of the synthetic document")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="Vectors per index")
+    parser.add_argument("--dimension", type=int, default=768, help="Vector dimension")
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=[DEFAULT_INDEX_TYPE, "ivf_flat"],
+                        help="Index types to build and search")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries per index")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--skip-text", action="store_true", help="Only run the index benchmarks")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    runs = [] if args.skip_text else [text_benchmarks(args.mb)]
+    runs.append(index_benchmarks(args.sizes, args.dimension, args.index_types, args.queries, args.k))
+    for run in runs:
+        for result in run:
+            results.append(result)
+            print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+    if args.output:
+        machine = {"python": platform.python_version(), "faiss": faiss.__version__, "cpus": faiss.omp_get_max_threads()}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "machine": machine, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
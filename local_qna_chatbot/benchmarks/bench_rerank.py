@@ -0,0 +1,88 @@
+"""
+Measure the latency the cross-encoder reranking stage adds to a query.
+
+Scores synthetic chunks of realistic length against a question for a range
+of candidate counts, with no time budget, and reports latency percentiles
+per count together with how many of those queries would have exceeded the
+configured budget and fallen back to the vector order. Requires the
+`sentence-transformers` package and downloads the model on first use.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/bench_rerank.py --candidates 5 10 20 40 --queries 20
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.reranker import (
+    RERANK_BATCH_SIZE, RERANK_BUDGET, RERANK_MAX_LENGTH, RERANK_MODEL, RERANK_WORKERS, CrossEncoderReranker
+)
+
+WORDS = (
+    "the retrieval index stores embeddings of every chunk so that questions can be answered "
+    "from the uploaded documents without sending them anywhere else model context window "
+    "error code backend port configuration timeout memory request server client"
+).split()
+
+
+def synthetic_chunks(n_chunks: int, words_per_chunk: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, words_per_chunk)) for _ in range(n_chunks)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=RERANK_MODEL, help="Cross-encoder model")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[5, 10, 20, 40], help="Candidate counts")
+    parser.add_argument("--queries", type=int, default=20, help="Queries timed per candidate count")
+    parser.add_argument("--words", type=int, default=350, help="Words per chunk")
+    parser.add_argument("--batch-size", type=int, default=RERANK_BATCH_SIZE, help="Pairs per model call")
+    parser.add_argument("--workers", type=int, default=RERANK_WORKERS, help="Model calls running at once")
+    parser.add_argument("--max-length", type=int, default=RERANK_MAX_LENGTH, help="Tokens per pair")
+    parser.add_argument("--budget", type=float, default=RERANK_BUDGET, help="Budget to compare against")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    reranker = CrossEncoderReranker(
+        args.model, batch_size=args.batch_size, workers=args.workers, max_length=args.max_length, budget=None
+    )
+    if not reranker.wait_until_loaded():
+        sys.exit(f"Could not load {args.model}: {reranker.stats()['error']}")
+
+    chunks = synthetic_chunks(max(args.candidates), args.words)
+    query = "which backend port does the server use when the request times out?"
+    # Warm up, the first calls allocate buffers
+    reranker.rerank(query, chunks[:args.batch_size], 1)
+
+    results = []
+    for n in args.candidates:
+        timings = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            reranker.rerank(query, chunks[:n], 2)
+            timings.append(time.perf_counter() - start)
+        ms = np.asarray(timings) * 1000
+        result = {
+            "candidates": n,
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(ms, 95)), 1),
+            "max_ms": round(float(ms.max()), 1),
+            "over_budget": int((ms > args.budget * 1000).sum()) if args.budget else 0,
+        }
+        results.append(result)
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+    reranker.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
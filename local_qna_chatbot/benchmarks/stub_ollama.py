@@ -0,0 +1,230 @@
+"""
+A stand-in for the Ollama server, for benchmarks and load tests.
+
+Answers the endpoints the chatbot uses, /api/embed, /api/embeddings and
+/api/chat (streaming and not), with no model behind them:
+- embeddings are deterministic: each word is hashed to a few signed
+  dimensions and the sum is L2-normalized, so texts sharing words are
+  similar and retrieval behaves sensibly;
+- chat answers wait `--first-token` seconds, then produce `--tokens`
+  tokens `--token-latency` seconds apart, and report token counts and
+  durations like Ollama does;
+- a model that is not loaded takes `--load-time` seconds to load and then
+  stays loaded for the request's keep_alive (5 minutes by default), so
+  cold starts can be reproduced.
+
+Usage (from local_qna_chatbot/):
+    python benchmarks/stub_ollama.py --port 11434 --first-token 0.2 --tokens 40
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Dimension of nomic-embed-text
+DIMENSION = 768
+# Signed dimensions each word adds to
+WORD_DIMENSIONS = 4
+# Ollama's default keep_alive, in seconds
+DEFAULT_KEEP_ALIVE = 300
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word: str, dimension: int) -> np.ndarray:
+    digest = hashlib.blake2b(word.encode("utf-8"), digest_size=4 * WORD_DIMENSIONS).digest()
+    values = np.frombuffer(digest, dtype=np.uint32)
+    vector = np.zeros(dimension, dtype=np.float32)
+    np.add.at(vector, values % dimension, np.where(values & (1 << 31), -1.0, 1.0))
+    return vector
+
+
+def embed_text(text: str, dimension: int = DIMENSION) -> np.ndarray:
+    """Deterministic unit vector of a text's words."""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in text.lower().split():
+        vector += _word_vector(word, dimension)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = norm = 1.0
+    return vector / norm
+
+
+def parse_keep_alive(value) -> float:
+    """Seconds of a keep_alive value (a number of seconds or a duration like "30m"); negative means forever."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, str):
+        for unit in sorted(_DURATION_UNITS, key=len, reverse=True):
+            if value.endswith(unit):
+                seconds = float(value[:-len(unit)]) * _DURATION_UNITS[unit]
+                break
+        else:
+            seconds = float(value)
+    else:
+        seconds = float(value)
+    return float("inf") if seconds < 0 else seconds
+
+
+class StubOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, dimension=DIMENSION, embed_latency=0.0, first_token=0.2,
+                 token_latency=0.01, tokens=32, load_time=0.0):
+        super().__init__(address, _Handler)
+        self.dimension = dimension
+        self.embed_latency = embed_latency
+        self.first_token = first_token
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.load_time = load_time
+        # Model name -> monotonic time it unloads
+        self.loaded_until = {}
+        self.loads = 0
+        self.requests = {"embed": 0, "chat": 0}
+        self._lock = threading.Lock()
+
+    def count(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def use_model(self, body: dict) -> float:
+        """Load the request's model if it is not loaded; returns the seconds spent loading."""
+        model = body.get("model")
+        with self._lock:
+            cold = self.loaded_until.get(model, 0.0) <= time.monotonic()
+            if cold:
+                self.loads += 1
+        if cold:
+            time.sleep(self.load_time)
+        load_time = self.load_time if cold else 0.0
+        with self._lock:
+            self.loaded_until[model] = time.monotonic() + parse_keep_alive(body.get("keep_alive"))
+        return load_time
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubOllama
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/embed":
+            texts = body.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            self.server.count("embed")
+            load_time = self.server.use_model(body)
+            time.sleep(self.server.embed_latency)
+            self._send_json({
+                "model": body.get("model"),
+                "load_duration": int(load_time * 1e9),
+                "embeddings": [embed_text(text, self.server.dimension).tolist() for text in texts],
+            })
+        elif self.path == "/api/embeddings":
+            self.server.count("embed")
+            self.server.use_model(body)
+            time.sleep(self.server.embed_latency)
+            self._send_json({"embedding": embed_text(body.get("prompt", ""), self.server.dimension).tolist()})
+        elif self.path == "/api/chat":
+            self.server.count("chat")
+            self._chat(body)
+        else:
+            self._send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+    def _chat(self, body: dict):
+        server = self.server
+        prompt = " ".join(message.get("content", "") for message in body.get("messages", []))
+        started = time.perf_counter()
+        load_time = server.use_model(body)
+        loaded = time.perf_counter()
+        time.sleep(server.first_token)
+        prompt_done = time.perf_counter()
+        # Words of the question, so different questions get different answers
+        words = prompt.split()[-server.tokens:] or ["answer"]
+        n_tokens = min(server.tokens, body.get("options", {}).get("num_predict", server.tokens))
+        pieces = [f" {words[i % len(words)]}" for i in range(max(0, n_tokens))]
+
+        def final(content: str) -> dict:
+            now = time.perf_counter()
+            return {
+                "model": body.get("model"),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "total_duration": int((now - started) * 1e9),
+                "load_duration": int(load_time * 1e9),
+                "prompt_eval_count": len(prompt.split()),
+                "prompt_eval_duration": int((prompt_done - loaded) * 1e9),
+                "eval_count": len(pieces),
+                "eval_duration": int((now - prompt_done) * 1e9),
+            }
+
+        if not body.get("stream", True):
+            time.sleep(server.token_latency * len(pieces))
+            self._send_json(final("".join(pieces).strip()))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for piece in pieces:
+            self._send_chunk({"model": body.get("model"), "message": {"role": "assistant", "content": piece}, "done": False})
+            time.sleep(server.token_latency)
+        self._send_chunk(final(""))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_chunk(self, payload: dict):
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def _send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 0, **options) -> StubOllama:
+    """Serve a stub in a background thread; port 0 picks a free port (see `server_address`)."""
+    server = StubOllama((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dimension", type=int, default=DIMENSION, help="Embedding dimension")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per embedding request")
+    parser.add_argument("--first-token", type=float, default=0.2, help="Seconds before the first answer token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds between answer tokens")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens per answer")
+    parser.add_argument("--load-time", type=float, default=0.0, help="Seconds to load a model that is not loaded")
+    args = parser.parse_args()
+
+    server = StubOllama(
+        (args.host, args.port), dimension=args.dimension, embed_latency=args.embed_latency,
+        first_token=args.first_token, token_latency=args.token_latency, tokens=args.tokens,
+        load_time=args.load_time,
+    )
+    print(f"Stub Ollama listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
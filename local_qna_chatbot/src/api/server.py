@@ -1,25 +1,75 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Union, List
+from typing import Any, Dict, Optional, Union, List
 from src.rag.pipeline import RAGPipeline
+from src.rag.collections import CollectionRegistry, DEFAULT_COLLECTION
+from src.rag import generator
+from src.rag.reranker import get_reranker, USE_RERANKER
+from src.rag.batcher import batching_stats, configure_blas
+from src.embeddings.embedder import get_client
+from src.ingestion.jobs import IngestionQueue, QueueFullError
+from src.monitoring import finish_trace, latency_summary, render_prometheus, start_trace, trace_request, use_trace
 import uvicorn
+import asyncio
 import os
 import tempfile
 import shutil
+import json
 
 app = FastAPI()
 
-# Initialize RAG pipeline
-rag_pipeline = RAGPipeline()
+# One RAG pipeline per document collection, loaded on demand
+collections = CollectionRegistry()
+
+# Uploads are ingested in the background, one job per document
+ingestion_queue = IngestionQueue()
+
+def warm_up_models():
+    """Load the embedding and chat models so the first question does not wait for them."""
+    for name, warm_up in (("embedding model", lambda: get_client().warm_up()), ("chat model", generator.warm_up)):
+        try:
+            print(f"Warmed up the {name} in {warm_up():.1f}s")
+        except Exception as e:
+            print(f"Could not warm up the {name}: {e}")
+
+@app.on_event("startup")
+async def configure_search():
+    # Batched query searches use BLAS; set once, the threshold is process-wide
+    configure_blas()
+
+@app.on_event("startup")
+async def start_warm_up():
+    # In the background, so the API accepts requests while models load
+    if generator.WARM_UP_ON_STARTUP:
+        app.state.warm_up = asyncio.create_task(asyncio.to_thread(warm_up_models))
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await generator.aclose()
+    await get_client().aclose()
+    collections.flush()
+
+async def get_pipeline(collection_id: str) -> RAGPipeline:
+    """Return a collection's pipeline, loading it off the event loop if needed."""
+    try:
+        return await asyncio.to_thread(collections.get, collection_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 class QueryRequest(BaseModel):
     question: str
     temperature: Optional[float] = 0.7
+    collection_id: str = DEFAULT_COLLECTION
+    # Attach the per-stage timing breakdown to the response
+    include_timings: bool = False
 
 class QueryResponse(BaseModel):
     response: str
     context: List[str] = Field(default_factory=list)
     query: str = ""
+    cached: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = None
 
 class ErrorResponse(BaseModel):
     error: str
@@ -38,62 +88,249 @@ async def ask_question(request: QueryRequest):
     Ask a question to the QnA chatbot.
     
     Args:
-        request (QueryRequest): Contains the question and optional temperature
+        request (QueryRequest): Contains the question, optional temperature,
+            the collection to search and whether to include timings
     
     Returns:
         Union[QueryResponse, ErrorResponse]: Response containing either the answer or an error
     """
-    if not rag_pipeline.initialized:
-        return ErrorResponse(error="RAG pipeline not initialized. Please upload a document first.")
+    with trace_request("/ask") as trace:
+        rag_pipeline = await get_pipeline(request.collection_id)
+        if not rag_pipeline.initialized:
+            return ErrorResponse(error="RAG pipeline not initialized. Please upload a document first.")
+        
+        try:
+            # Process the query
+            result = await rag_pipeline.aprocess_query(
+                query=request.question,
+                temperature=request.temperature
+            )
+            
+            # Check if there was an error in processing
+            if "error" in result:
+                return ErrorResponse(error=result["error"])
+                
+            # Ensure all required fields are present
+            if not all(k in result for k in ["response", "context", "query"]):
+                return ErrorResponse(error="Invalid response format from RAG pipeline")
+                
+            if request.include_timings and trace is not None:
+                result["timings"] = trace.as_dict()
+            return QueryResponse(**result)
+            
+        except Exception as e:
+            return ErrorResponse(error=f"Error processing your request: {str(e)}")
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QueryRequest):
+    """
+    Ask a question and stream the answer as Server-Sent Events.
     
-    try:
-        # Process the query
-        result = rag_pipeline.process_query(
+    Each event is a JSON object on a `data:` line. The stream starts with a
+    "context" event, continues with "token" events carrying answer text and
+    ends with a "done" event, or carries a single "error" event. With
+    include_timings, the "done" event carries the timing breakdown.
+    """
+    # Created here and recorded into around each step: the generator is
+    # resumed, and closed on a disconnect, in contexts the trace cannot be
+    # set and reset across
+    trace = start_trace()
+    with use_trace(trace):
+        rag_pipeline = await get_pipeline(request.collection_id)
+
+    async def event_stream():
+        events = rag_pipeline.aprocess_query_stream(
             query=request.question,
             temperature=request.temperature
         )
-        
-        # Check if there was an error in processing
-        if "error" in result:
-            return ErrorResponse(error=result["error"])
-            
-        # Ensure all required fields are present
-        if not all(k in result for k in ["response", "context", "query"]):
-            return ErrorResponse(error="Invalid response format from RAG pipeline")
-            
-        return QueryResponse(**result)
-        
-    except Exception as e:
-        return ErrorResponse(error=f"Error processing your request: {str(e)}")
+        try:
+            while True:
+                with use_trace(trace):
+                    try:
+                        event = await events.__anext__()
+                    except StopAsyncIteration:
+                        break
+                if event["type"] == "done" and request.include_timings and trace is not None:
+                    event["timings"] = trace.as_dict()
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            with use_trace(trace):
+                await events.aclose()
+            finish_trace("/ask/stream", trace)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/documents")
+async def list_documents(collection_id: str = DEFAULT_COLLECTION):
+    """
+    List the documents stored in a collection.
+    """
+    rag_pipeline = await get_pipeline(collection_id)
+    return {
+        "collection_id": collection_id,
+        "documents": [
+            {
+                "doc_id": doc["doc_id"],
+                "name": doc["name"],
+                "status": doc.get("status", "ready"),
+                "chunks": doc["chunks"],
+                "added_at": doc["added_at"]
+            }
+            for doc in rag_pipeline.store.documents
+        ],
+        "total_chunks": len(rag_pipeline.store)
+    }
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: int, collection_id: str = DEFAULT_COLLECTION):
+    """
+    Remove a document and its chunks from a collection.
+    """
+    try:
+        rag_pipeline = await asyncio.to_thread(collections.pin, collection_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        removed = await asyncio.to_thread(rag_pipeline.remove_document, doc_id)
+    finally:
+        collections.unpin(collection_id)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    return {"status": "success", "message": f"Document {doc_id} removed"}
+
+def _save_upload(file: UploadFile) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
+        shutil.copyfileobj(file.file, temp_file)
+        return temp_file.name
 
 @app.post("/upload/")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), collection_id: str = Form(DEFAULT_COLLECTION)):
     """
     Upload a document to be processed by the RAG system.
+    
+    The document is added to the given collection in the background. The
+    response carries a job id whose progress can be followed at /jobs/{job_id}.
     """
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-            temp_path = temp_file.name
-
-        try:
-            # Initialize the RAG pipeline with the uploaded document
-            rag_pipeline.initialize(documents_path=temp_path)
-            return {
-                "status": "success",
-                "message": "Document uploaded and processed successfully",
-                "filename": file.filename
-            }
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        # Keep the collection loaded until its job has finished
+        rag_pipeline = await asyncio.to_thread(collections.pin, collection_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    try:
+        # Save uploaded file temporarily (disk I/O off the event loop)
+        temp_path = await asyncio.to_thread(_save_upload, file)
     except Exception as e:
+        collections.unpin(collection_id)
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+    try:
+        # The job deletes the temporary file and unpins the collection when it finishes
+        job = ingestion_queue.submit(
+            rag_pipeline, temp_path, file.filename,
+            collection_id=collection_id,
+            on_done=lambda: collections.unpin(collection_id)
+        )
+    except QueueFullError as e:
+        os.remove(temp_path)
+        collections.unpin(collection_id)
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {
+        "status": "queued",
+        "message": "Document queued for processing",
+        "filename": file.filename,
+        "collection_id": collection_id,
+        "job_id": job.id
+    }
+
+@app.get("/cache/stats")
+async def answer_cache_stats(collection_id: str = DEFAULT_COLLECTION):
+    """
+    Hit rates and time saved by a collection's answer cache.
+    """
+    rag_pipeline = await get_pipeline(collection_id)
+    if rag_pipeline.answer_cache is None:
+        return {"collection_id": collection_id, "enabled": False}
+    return {"collection_id": collection_id, "enabled": True, **rag_pipeline.answer_cache.stats()}
+
+@app.get("/rerank/stats")
+async def rerank_stats():
+    """
+    How often the cross-encoder reranked within its time budget.
+    """
+    if not USE_RERANKER:
+        return {"enabled": False}
+    return {"enabled": True, **get_reranker().stats()}
+
+@app.get("/batching/stats")
+async def query_batching_stats():
+    """
+    How many concurrent queries were embedded and searched together.
+    """
+    return batching_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Stage and request latency histograms, per-request counts and events,
+    in the Prometheus text format.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/summary")
+async def metrics_summary():
+    """
+    Count, p50 and p95 in milliseconds of each endpoint and stage; cold-start
+    and warm generation are the stages generate_cold and generate_warm.
+    """
+    return latency_summary()
+
+@app.get("/collections")
+async def list_collections():
+    """
+    List the document collections and which of them are loaded in memory.
+    """
+    return {
+        "collections": await asyncio.to_thread(collections.list),
+        "resident_bytes": collections.resident_bytes()
+    }
+
+@app.get("/jobs")
+async def list_jobs(collection_id: Optional[str] = None):
+    """
+    List recent ingestion jobs, optionally only those of one collection.
+    """
+    return {
+        "jobs": [
+            job.to_dict() for job in ingestion_queue.list()
+            if collection_id is None or job.collection_id == collection_id
+        ]
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Get the status and progress of an ingestion job.
+    """
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel an ingestion job. Chunks it already indexed are removed.
+    """
+    job = ingestion_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
 if __name__ == "__main__":
     uvicorn.run("src.api.server:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
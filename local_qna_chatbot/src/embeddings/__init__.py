@@ -1,5 +1,7 @@
-from .embedder import get_embedding
+from .embedder import get_embedding, get_embeddings, get_client, Embedder, EmbeddingClient
+from .embedding_cache import EmbeddingCache
+from .chunk_table import ChunkTable
 from .build_faiss import build_faiss
 from .search_faiss import search
 
-__all__ = ['get_embedding', 'build_faiss', 'search']
+__all__ = ['get_embedding', 'get_embeddings', 'get_client', 'Embedder', 'EmbeddingClient', 'EmbeddingCache', 'ChunkTable', 'build_faiss', 'search']
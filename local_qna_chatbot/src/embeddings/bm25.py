@@ -0,0 +1,303 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Postings buffered in Python lists before they are merged into the arrays
+MERGE_POSTINGS = 200_000
+# Longer terms are truncated
+MAX_TERM_LENGTH = 64
+# Term frequencies are stored as uint16
+_MAX_TF = np.iinfo(np.uint16).max
+
+# Words, plus identifiers joined by . - : / such as "v2.3.1" or "e-1042"
+_TERM_RE = re.compile(r"\w+(?:[.\-:/]\w+)*")
+# Runs of letters and digits within a compound term
+_PART_RE = re.compile(r"[^\W_]+")
+
+
+def terms(text: str) -> List[str]:
+    """
+    Lowercased terms of a text, as indexed and queried.
+
+    Compound identifiers ("ERR_CONN_REFUSED", "e-1042") are kept whole so
+    exact lookups match, and their parts are added so partial ones do too.
+    """
+    out = _TERM_RE.findall(text.lower())
+    # Only a few terms need work; test them all at C speed first
+    unusual = [term for term in out if len(term) > MAX_TERM_LENGTH or not term.isalnum()]
+    if unusual:
+        out = [term[:MAX_TERM_LENGTH] for term in out]
+        for term in unusual:
+            out.extend(part[:MAX_TERM_LENGTH] for part in _PART_RE.findall(term))
+    return out
+
+
+class _Segment:
+    """Immutable CSR posting lists: rows[offsets[t]:offsets[t + 1]] hold term t."""
+
+    def __init__(self, offsets: np.ndarray, rows: np.ndarray, tfs: np.ndarray):
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+
+    @classmethod
+    def empty(cls) -> "_Segment":
+        return cls(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint16))
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.offsets) - 1
+
+    def postings(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        if tid >= self.n_terms:
+            return self.rows[:0], self.tfs[:0]
+        start, end = self.offsets[tid], self.offsets[tid + 1]
+        return self.rows[start:end], self.tfs[start:end]
+
+    def term_ids(self) -> np.ndarray:
+        """Term id of every posting."""
+        return np.repeat(np.arange(self.n_terms, dtype=np.int64), np.diff(self.offsets))
+
+    @classmethod
+    def from_postings(cls, tids: np.ndarray, rows: np.ndarray, tfs: np.ndarray, n_terms: int) -> "_Segment":
+        # Stable, so rows stay ascending within each term
+        order = np.argsort(tids, kind="stable")
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tids, minlength=n_terms), out=offsets[1:])
+        return cls(offsets, rows[order].astype(np.int32), tfs[order].astype(np.uint16))
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the chunks of an IndexStore.
+
+    Row i is chunk i, the same numbering as the FAISS index. Postings live
+    in compact CSR arrays (int32 rows, uint16 term frequencies, one offset
+    per term). Rows are only ever appended: new postings go to small Python
+    lists and are merged into fresh arrays once MERGE_POSTINGS have
+    accumulated, so adding a batch of chunks never rewrites the whole index.
+    A search scores only the postings of its query terms.
+
+    Searches run concurrently with `add`; removing rows (`compacted`)
+    returns a new index instead of changing this one.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self._main = _Segment.empty()
+        # Postings not yet merged into _main: term id -> (rows, tfs)
+        self._delta: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._delta_postings = 0
+        # Delta being merged by `add`, still searched until the merge is published
+        self._merging: Optional[Dict[int, Tuple[List[int], List[int]]]] = None
+        self._doc_len = np.empty(1024, dtype=np.float32)
+        self.n_docs = 0
+        self._total_len = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def memory_bytes(self) -> int:
+        main = self._main
+        return (
+            main.offsets.nbytes + main.rows.nbytes + main.tfs.nbytes + self._doc_len.nbytes
+            + self._delta_postings * 64 + len(self.vocab) * 80
+        )
+
+    def add(self, texts: Sequence[str]):
+        """Index texts as the next rows."""
+        with self._lock:
+            for text in texts:
+                counts = Counter(terms(text))
+                row = self.n_docs
+                for term, tf in counts.items():
+                    tid = self.vocab.setdefault(term, len(self.vocab))
+                    postings = self._delta.get(tid)
+                    if postings is None:
+                        postings = self._delta[tid] = ([], [])
+                    postings[0].append(row)
+                    postings[1].append(min(tf, _MAX_TF))
+                self._delta_postings += len(counts)
+
+                if self.n_docs == len(self._doc_len):
+                    # Grow into a new array; searches keep reading the old one
+                    grown = np.empty(2 * len(self._doc_len), dtype=np.float32)
+                    grown[:self.n_docs] = self._doc_len[:self.n_docs]
+                    self._doc_len = grown
+                length = sum(counts.values())
+                self._doc_len[row] = length
+                self._total_len += length
+                self.n_docs += 1
+
+            if self._delta_postings < MERGE_POSTINGS:
+                return
+            frozen, self._merging = self._delta, self._delta
+            self._delta, self._delta_postings = {}, 0
+            main, n_terms = self._main, len(self.vocab)
+
+        # Build the merged arrays without blocking searches
+        merged = self._merge(main, frozen, n_terms)
+        with self._lock:
+            self._main = merged
+            self._merging = None
+
+    @staticmethod
+    def _merge(main: _Segment, delta: Dict[int, Tuple[List[int], List[int]]], n_terms: int) -> _Segment:
+        if not delta:
+            return main
+        delta_tids = np.repeat(
+            np.fromiter(delta.keys(), dtype=np.int64, count=len(delta)),
+            [len(rows) for rows, _ in delta.values()]
+        )
+        delta_rows = np.fromiter((row for rows, _ in delta.values() for row in rows), dtype=np.int32)
+        delta_tfs = np.fromiter((tf for _, tfs in delta.values() for tf in tfs), dtype=np.uint16)
+        # Delta rows all come after the main rows, so main goes first
+        return _Segment.from_postings(
+            np.concatenate((main.term_ids(), delta_tids)),
+            np.concatenate((main.rows, delta_rows)),
+            np.concatenate((main.tfs, delta_tfs)),
+            n_terms
+        )
+
+    def _flush(self):
+        """Merge buffered postings into the arrays. Caller holds the lock."""
+        self._main = self._merge(self._main, self._delta, len(self.vocab))
+        self._delta, self._delta_postings = {}, 0
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the `k` best-scoring rows for a query.
+
+        Returns:
+            Tuple of arrays: rows (int64) and BM25 scores (float32), best first
+        """
+        with self._lock:
+            n_docs = self.n_docs
+            if not n_docs:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            avg_len = self._total_len / n_docs
+            doc_len = self._doc_len
+            lists = []
+            for term in set(terms(query)):
+                tid = self.vocab.get(term)
+                if tid is None:
+                    continue
+                rows, tfs = self._main.postings(tid)
+                parts = [(rows, tfs)]
+                for buffered in (self._merging, self._delta):
+                    if buffered and tid in buffered:
+                        extra_rows, extra_tfs = buffered[tid]
+                        parts.append((np.array(extra_rows, dtype=np.int32), np.array(extra_tfs, dtype=np.uint16)))
+                lists.append(parts)
+
+        all_rows, all_scores = [], []
+        for parts in lists:
+            rows = np.concatenate([p[0] for p in parts]) if len(parts) > 1 else parts[0][0]
+            tfs = np.concatenate([p[1] for p in parts]) if len(parts) > 1 else parts[0][1]
+            if not len(rows):
+                continue
+            df = len(rows)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + self.b * doc_len[rows] / avg_len)
+            all_rows.append(rows)
+            all_scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+
+        if not all_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate(all_rows)
+        scores = np.concatenate(all_scores)
+        if len(all_rows) > 1:
+            if len(rows) * 8 < n_docs:
+                # Few postings: sum per row by sorting
+                order = np.argsort(rows, kind="stable")
+                rows, scores = rows[order], scores[order]
+                starts = np.flatnonzero(np.concatenate(([True], rows[1:] != rows[:-1])))
+                rows, scores = rows[starts], np.add.reduceat(scores, starts)
+            else:
+                dense = np.bincount(rows, weights=scores, minlength=n_docs)
+                rows = np.flatnonzero(dense)
+                scores = dense[rows]
+
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order].astype(np.int64), scores[order].astype(np.float32)
+
+    def compacted(self, keep: Sequence[int]) -> "BM25Index":
+        """
+        Return a new index holding only rows `keep` (ascending), renumbered
+        from 0 like the store's chunks after a removal.
+        """
+        keep = np.asarray(keep, dtype=np.int64)
+        with self._lock:
+            self._flush()
+            main, doc_len, n_docs = self._main, self._doc_len[:self.n_docs], self.n_docs
+            vocab = dict(self.vocab)
+
+        new_row = np.full(n_docs, -1, dtype=np.int64)
+        new_row[keep] = np.arange(len(keep))
+        rows = new_row[main.rows]
+        mask = rows >= 0
+
+        index = BM25Index(self.k1, self.b)
+        index.vocab = vocab
+        index._main = _Segment.from_postings(main.term_ids()[mask], rows[mask], main.tfs[mask], len(vocab))
+        index._doc_len = np.array(doc_len[keep], dtype=np.float32) if len(keep) else np.empty(1024, dtype=np.float32)
+        index.n_docs = len(keep)
+        index._total_len = float(index._doc_len[:index.n_docs].sum())
+        return index
+
+    def save(self, path: Path):
+        """Write the index to `path` (an .npz file) atomically."""
+        with self._lock:
+            self._flush()
+            terms_by_id = [""] * len(self.vocab)
+            for term, tid in self.vocab.items():
+                terms_by_id[tid] = term
+            arrays = {
+                "terms": np.array(terms_by_id, dtype=str),
+                "offsets": self._main.offsets,
+                "rows": self._main.rows,
+                "tfs": self._main.tfs,
+                "doc_len": self._doc_len[:self.n_docs],
+                "params": np.array([self.k1, self.b]),
+            }
+        tmp_path = Path(path).with_name(Path(path).name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1, b)
+            index.vocab = {term: tid for tid, term in enumerate(data["terms"].tolist())}
+            index._main = _Segment(data["offsets"], data["rows"], data["tfs"])
+            doc_len = data["doc_len"]
+        index._doc_len = np.array(doc_len, dtype=np.float32) if len(doc_len) else np.empty(1024, dtype=np.float32)
+        index.n_docs = len(doc_len)
+        index._total_len = float(doc_len.sum())
+        return index
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "BM25Index":
+        index = cls()
+        index.add(texts)
+        with index._lock:
+            index._flush()
+        return index
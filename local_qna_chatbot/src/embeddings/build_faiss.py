@@ -4,9 +4,17 @@ import faiss
 from typing import List, Tuple, Optional
 import logging
 
+from .index_factory import DEFAULT_INDEX_TYPE, build_index
+
 logger = logging.getLogger(__name__)
 
-def build_faiss(embeddings: np.ndarray, ids: Optional[List[int]] = None, save_path: Optional[str] = None):
+def build_faiss(
+    embeddings: np.ndarray,
+    ids: Optional[List[int]] = None,
+    save_path: Optional[str] = None,
+    index_type: str = DEFAULT_INDEX_TYPE,
+    **index_options
+):
     """
     Build a FAISS index from the given embeddings.
     
@@ -14,6 +22,8 @@ def build_faiss(embeddings: np.ndarray, ids: Optional[List[int]] = None, save_pa
         embeddings: Numpy array of shape (n_samples, embedding_dim)
         ids: Optional list of IDs corresponding to the embeddings
         save_path: Optional path to save the FAISS index
+        index_type: "flat", "ivf_flat", "ivf_pq" or "hnsw" (see index_factory)
+        **index_options: Extra options for index_factory.create_index
         
     Returns:
         faiss.Index: The built FAISS index
@@ -23,19 +33,16 @@ def build_faiss(embeddings: np.ndarray, ids: Optional[List[int]] = None, save_pa
         if embeddings.dtype != np.float32:
             embeddings = embeddings.astype(np.float32)
             
-        # Get the dimension of the embeddings
-        dimension = embeddings.shape[1]
-        
-        # Create the FAISS index
-        index = faiss.IndexFlatL2(dimension)
-        
-        # Add vectors to the index
-        index.add(embeddings)
+        # Create, train if needed, and fill the FAISS index
+        index = build_index(embeddings, index_type=index_type, **index_options)
         
         # Save the index if a path is provided
         if save_path:
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            faiss.write_index(index, save_path)
+            # Write then rename, so readers never load a half-written file
+            tmp_path = f"{save_path}.tmp"
+            faiss.write_index(index, tmp_path)
+            os.replace(tmp_path, save_path)
             logger.info(f"FAISS index saved to {save_path}")
             
         return index
@@ -44,12 +51,13 @@ def build_faiss(embeddings: np.ndarray, ids: Optional[List[int]] = None, save_pa
         logger.error(f"Error building FAISS index: {str(e)}")
         raise
 
-def load_faiss_index(load_path: str):
+def load_faiss_index(load_path: str, mmap: bool = False):
     """
     Load a FAISS index from disk.
     
     Args:
         load_path: Path to the saved FAISS index
+        mmap: Memory-map the index file instead of reading it into RAM
         
     Returns:
         faiss.Index: The loaded FAISS index
@@ -58,7 +66,8 @@ def load_faiss_index(load_path: str):
         if not os.path.exists(load_path):
             raise FileNotFoundError(f"FAISS index not found at {load_path}")
             
-        index = faiss.read_index(load_path)
+        flags = faiss.IO_FLAG_MMAP if mmap else 0
+        index = faiss.read_index(load_path, flags)
         logger.info(f"FAISS index loaded from {load_path}")
         return index
         
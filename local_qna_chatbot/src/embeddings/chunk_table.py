@@ -0,0 +1,328 @@
+import bisect
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Metadata stored with every chunk and its type; -1 stands for a missing value
+COLUMNS = {
+    "doc_id": np.int32,
+    "start": np.int64,
+    "end": np.int64,
+    "page": np.int32,
+    "page_end": np.int32,
+}
+# UTF-8 text of all chunks, back to back
+TEXT_FILE = "text.bin"
+# int64 end offset of each chunk's text in TEXT_FILE; written last, so it
+# decides how many rows the files hold
+OFFSETS_FILE = "offsets.i64"
+
+
+def _column_file(name: str) -> str:
+    return f"{name}.{np.dtype(COLUMNS[name]).str[1:]}"
+
+
+def _map(path: Path, dtype, count: Optional[int] = None) -> np.ndarray:
+    """Read-only memory map of (the first `count` items of) a raw array file."""
+    itemsize = np.dtype(dtype).itemsize
+    available = path.stat().st_size // itemsize if path.exists() else 0
+    count = available if count is None else min(count, available)
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class _Segment:
+    """Consecutive rows held in one set of arrays (in memory or mapped from disk)."""
+
+    __slots__ = ("text", "ends", "columns", "_buffer")
+
+    def __init__(self, text: np.ndarray, ends: np.ndarray, columns: Dict[str, np.ndarray]):
+        # Plain ndarray views: indexing an np.memmap is several times slower
+        self.text = text.view(np.ndarray)
+        # End offset of each row's text in `text`
+        self.ends = ends.view(np.ndarray)
+        self.columns = {name: column.view(np.ndarray) for name, column in columns.items()}
+        self._buffer = memoryview(self.text)
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    @property
+    def text_bytes(self) -> int:
+        return int(self.ends[-1]) if len(self.ends) else 0
+
+    def span(self, i: int) -> Tuple[int, int]:
+        return (int(self.ends[i - 1]) if i else 0), int(self.ends[i])
+
+    def text_at(self, i: int) -> str:
+        start, end = self.span(i)
+        # Decodes straight from the (possibly mapped) buffer
+        return str(self._buffer[start:end], "utf-8")
+
+    def take(self, rows: np.ndarray) -> "_Segment":
+        """New in-memory segment holding `rows` (ascending)."""
+        starts = np.concatenate(([0], self.ends[:-1]))[rows]
+        lengths = self.ends[rows] - starts
+        ends = np.cumsum(lengths, dtype=np.int64)
+        # Source byte of every output byte: row start plus position within the row
+        positions = np.arange(int(ends[-1]) if len(ends) else 0, dtype=np.int64)
+        positions += np.repeat(starts - (ends - lengths), lengths)
+        return _Segment(
+            np.asarray(self.text)[positions],
+            ends,
+            {name: np.asarray(column)[rows] for name, column in self.columns.items()}
+        )
+
+
+class ChunkTable:
+    """
+    Columnar store of chunk texts and metadata, one row per FAISS row.
+
+    All texts are kept as one contiguous UTF-8 buffer with an int64 end
+    offset per row, and the metadata as numpy columns (see COLUMNS), instead
+    of a Python dict per chunk. On disk every array is a raw file in one
+    directory, so `open` memory-maps them in constant time and rows are read
+    straight from the page cache.
+
+    Rows are only ever appended. Appended rows live in memory until `save`
+    writes them to the end of the files and maps them back in. A lookup by
+    row is O(1) when the table is a single mapped segment, and O(log s) over
+    the s in-memory segments appended since the last save.
+
+    Searches never take a lock: appends and saves publish a new list of
+    segments in one assignment, and the arrays of a published segment never
+    change.
+    """
+
+    def __init__(self, segments: Sequence[_Segment] = ()):
+        self._publish(tuple(segments))
+
+    def _publish(self, segments: Tuple[_Segment, ...]):
+        starts = [0]
+        for segment in segments:
+            starts.append(starts[-1] + len(segment))
+        self._state = (segments, starts)
+
+    def __len__(self) -> int:
+        return self._state[1][-1]
+
+    def _locate(self, row: int) -> Tuple[_Segment, int]:
+        segments, starts = self._state
+        if row < 0:
+            row += starts[-1]
+        if not 0 <= row < starts[-1]:
+            raise IndexError(f"Chunk row {row} out of range")
+        if len(segments) == 1:
+            return segments[0], row
+        i = bisect.bisect_right(starts, row) - 1
+        return segments[i], row - starts[i]
+
+    def text(self, row: int) -> str:
+        """Text of one chunk."""
+        segment, i = self._locate(row)
+        return segment.text_at(i)
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        """
+        One chunk as a dict: "id" (row + 1), "text" and the metadata columns,
+        with None for missing values.
+        """
+        segment, i = self._locate(row)
+        chunk = {"id": (row % len(self)) + 1, "text": segment.text_at(i)}
+        for name, column in segment.columns.items():
+            value = int(column[i])
+            chunk[name] = None if value < 0 else value
+        return chunk
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def texts(self) -> Iterator[str]:
+        for segment in self._state[0]:
+            for i in range(len(segment)):
+                yield segment.text_at(i)
+
+    def column(self, name: str) -> np.ndarray:
+        """All values of a metadata column (read-only)."""
+        segments = self._state[0]
+        if len(segments) == 1:
+            return segments[0].columns[name]
+        return np.concatenate([s.columns[name] for s in segments] or [np.empty(0, dtype=COLUMNS[name])])
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the arrays, mapped ones included."""
+        return sum(
+            segment.text_bytes + segment.ends.nbytes + sum(c.nbytes for c in segment.columns.values())
+            for segment in self._state[0]
+        )
+
+    def append(self, texts: Sequence[str], metadata: Optional[Sequence[Dict]] = None, **defaults: int):
+        """
+        Append chunks as new rows.
+
+        Args:
+            texts: Chunk texts
+            metadata: Optional dict per chunk with values for COLUMNS
+            **defaults: Column values shared by all the new rows, e.g. doc_id
+
+        Raises:
+            ValueError: If the metadata names a column that does not exist
+        """
+        if metadata is not None and len(metadata) != len(texts):
+            raise ValueError("Number of metadata entries and chunks must match")
+        unknown = set(defaults).union(*(metadata or [])) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown chunk metadata: {', '.join(sorted(unknown))}")
+        if not len(texts):
+            return
+
+        encoded = [text.encode("utf-8") for text in texts]
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            default = defaults.get(name, -1)
+            if metadata is None:
+                columns[name] = np.full(len(texts), default, dtype=dtype)
+            else:
+                values = (m.get(name, default) for m in metadata)
+                columns[name] = np.fromiter((-1 if v is None else v for v in values), dtype=dtype, count=len(texts))
+        segment = _Segment(
+            np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            np.cumsum([len(b) for b in encoded], dtype=np.int64),
+            columns
+        )
+        self._publish(self._state[0] + (segment,))
+
+    def compacted(self, keep: Sequence[int]) -> "ChunkTable":
+        """New in-memory table holding only rows `keep` (ascending), renumbered from 0."""
+        keep = np.asarray(keep, dtype=np.int64)
+        segments, starts = self._state
+        taken = []
+        for segment, start, stop in zip(segments, starts, starts[1:]):
+            lo, hi = np.searchsorted(keep, [start, stop])
+            if hi > lo:
+                taken.append(segment.take(keep[lo:hi] - start))
+        return ChunkTable(taken)
+
+    def save(self, directory: Path, saved_rows: int = 0):
+        """
+        Write the table to `directory` and serve it from the mapped files.
+
+        Args:
+            directory: Directory of the files
+            saved_rows: Rows already in the files (and equal to this table's
+                first rows); only the rows after them are written
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        segments, starts = self._state
+        n_rows = starts[-1]
+
+        # Rows to write as (segment, first, stop), and the byte offset in
+        # the text file where they start
+        pieces = []
+        text_offset = 0
+        for segment, start, stop in zip(segments, starts, starts[1:]):
+            if stop <= saved_rows:
+                text_offset += segment.text_bytes
+            else:
+                first = max(saved_rows - start, 0)
+                if first:
+                    text_offset += segment.span(first - 1)[1]
+                pieces.append((segment, first, stop - start))
+
+        paths = {name: directory / _column_file(name) for name in COLUMNS}
+        text_path = directory / TEXT_FILE
+        offsets_path = directory / OFFSETS_FILE
+        # Drop anything past the saved rows, left by an interrupted save
+        for path, size in [(text_path, text_offset), (offsets_path, saved_rows * 8)] + [
+            (path, saved_rows * np.dtype(COLUMNS[name]).itemsize) for name, path in paths.items()
+        ]:
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+        with open(text_path, "ab") as f:
+            for segment, lo, hi in pieces:
+                first = segment.span(lo)[0]
+                f.write(memoryview(np.ascontiguousarray(segment.text[first:segment.span(hi - 1)[1]])))
+        for name, path in paths.items():
+            with open(path, "ab") as f:
+                for segment, lo, hi in pieces:
+                    f.write(np.ascontiguousarray(segment.columns[name][lo:hi], dtype=COLUMNS[name]).tobytes())
+        # Offsets last: a row exists once its end offset is written
+        with open(offsets_path, "ab") as f:
+            for segment, lo, hi in pieces:
+                first = segment.span(lo)[0]
+                ends = np.asarray(segment.ends[lo:hi], dtype=np.int64) - first + text_offset
+                f.write(ends.tobytes())
+                text_offset = int(ends[-1])
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._publish((self._open_segment(directory, n_rows),))
+
+    @staticmethod
+    def _open_segment(directory: Path, rows: Optional[int] = None) -> _Segment:
+        directory = Path(directory)
+        ends = _map(directory / OFFSETS_FILE, np.int64, rows)
+        columns = {name: _map(directory / _column_file(name), dtype, len(ends)) for name, dtype in COLUMNS.items()}
+        n_rows = min([len(ends)] + [len(column) for column in columns.values()])
+        ends = ends[:n_rows]
+        text = _map(directory / TEXT_FILE, np.uint8, int(ends[-1]) if n_rows else 0)
+        if len(text) < (int(ends[-1]) if n_rows else 0):
+            raise ValueError(f"Chunk text in {directory} is shorter than its offsets")
+        return _Segment(text, ends, {name: column[:n_rows] for name, column in columns.items()})
+
+    @classmethod
+    def open(cls, directory: Path, rows: Optional[int] = None) -> "ChunkTable":
+        """
+        Map a saved table.
+
+        Args:
+            directory: Directory written by `save`
+            rows: Number of rows to use; files with more (from an
+                interrupted save) are read up to this row
+
+        Raises:
+            ValueError: If the files hold fewer than `rows` rows
+        """
+        segment = cls._open_segment(directory, rows)
+        if rows is not None and len(segment) < rows:
+            raise ValueError(f"Chunk table at {directory} has {len(segment)} rows, expected {rows}")
+        return cls([segment])
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "ChunkTable":
+        """Build a table from dicts with a "text" key and optional COLUMNS values."""
+        table = cls()
+        texts, metadata = [], []
+        for record in records:
+            texts.append(record["text"])
+            metadata.append({name: record.get(name) for name in COLUMNS})
+        table.append(texts, metadata)
+        return table
+
+
+def replace_table(table: ChunkTable, directory: Path):
+    """
+    Save `table` as the contents of `directory`, replacing what is there.
+
+    The table is written next to the directory and swapped in with renames;
+    processes that mapped the old files keep reading them until they reload.
+    """
+    directory = Path(directory)
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    old_dir = directory.with_name(directory.name + ".old")
+    for path in (tmp_dir, old_dir):
+        if path.exists():
+            shutil.rmtree(path)
+    table.save(tmp_dir)
+    if directory.exists():
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
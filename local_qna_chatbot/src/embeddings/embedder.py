@@ -1,11 +1,381 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+
+from .embedding_cache import EmbeddingCache
+from ..monitoring import count
+
+# "ollama" sends texts to the Ollama server; "local" runs a sentence-transformers
+# model in this process (see local_embedder.py). A collection must be queried
+# with the backend and model it was indexed with.
+EMBEDDING_BACKEND = "ollama"
 
-OLLAMA_URL = "http://localhost:11434/api/embeddings"
+OLLAMA_HOST = "http://localhost:11434"
+OLLAMA_URL = f"{OLLAMA_HOST}/api/embeddings"
 MODEL_NAME = "nomic-embed-text"
 
+# Texts per /api/embed request and maximum requests in flight at once
+BATCH_SIZE = 32
+MAX_CONCURRENCY = 4
+REQUEST_TIMEOUT = 120
+# How long Ollama keeps the embedding model loaded after a request
+# (a duration such as "30m", or -1 to keep it loaded)
+KEEP_ALIVE = "30m"
+# Serve repeated chunks from the on-disk cache instead of calling the model
+USE_EMBEDDING_CACHE = True
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    # /api/embed returns unit vectors and /api/embeddings does not;
+    # normalize so both endpoints produce comparable vectors
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+class Embedder:
+    """
+    Base class of the embedding backends.
+
+    Subclasses implement `_embed_uncached` (and `_aembed_uncached` if they
+    have a native async path). This class serves repeated texts from the
+    optional cache and returns L2-normalized float32 rows in input order.
+    `model_id` names the backend and model; index stores record it so
+    vectors from different models are never mixed in one index.
+    """
+
+    backend = ""
+
+    def __init__(self, model: str, cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.cache = cache
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.backend}:{self.model}"
+
+    def _lookup_cache(self, texts: List[str]) -> Tuple[list, list, List[int]]:
+        """Return (keys, cached vectors or None, indices of texts to embed)."""
+        if self.cache is None:
+            return [], [None] * len(texts), list(range(len(texts)))
+        keys = [self.cache.key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        count("embedding_cache_hits", len(texts) - len(missing))
+        return keys, cached, missing
+
+    def _merge_cached(self, keys: list, cached: list, missing: List[int], fresh: Optional[np.ndarray]) -> np.ndarray:
+        """Store freshly embedded rows and assemble the full result matrix."""
+        if fresh is None:
+            return np.vstack(cached)
+        if self.cache is not None:
+            self.cache.put_many([keys[i] for i in missing], fresh)
+        if len(missing) == len(cached):
+            return fresh
+
+        embeddings = np.empty((len(cached), fresh.shape[1]), dtype=np.float32)
+        for i, vector in enumerate(cached):
+            if vector is not None:
+                embeddings[i] = vector
+        embeddings[missing] = fresh
+        return embeddings
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> np.ndarray:
+        """
+        Embed a list of texts.
+
+        Args:
+            texts: Texts to embed
+            on_progress: Optional callback receiving the number of texts
+                finished after each completed batch
+
+        Returns:
+            np.ndarray: float32 matrix of shape (len(texts), dimension) with
+            L2-normalized rows, in the same order as `texts`
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys, cached, missing = self._lookup_cache(texts)
+        if on_progress and len(missing) < len(texts):
+            on_progress(len(texts) - len(missing))
+        fresh = self._embed_uncached([texts[i] for i in missing], on_progress) if missing else None
+        return self._merge_cached(keys, cached, missing, fresh)
+
+    def _embed_uncached(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> np.ndarray:
+        raise NotImplementedError
+
+    async def _aembed_uncached(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self._embed_uncached, texts)
+
+    def warm_up(self) -> float:
+        """
+        Load the model by embedding a short text past the cache.
+
+        Returns:
+            float: Seconds the call took
+        """
+        started = time.perf_counter()
+        self._embed_uncached(["warm up"])
+        return time.perf_counter() - started
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """Embed a single text and return a float32 vector."""
+        return self.embed([text])[0]
+
+    async def aembed(self, texts: Sequence[str]) -> np.ndarray:
+        """Async version of `embed`."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys, cached, missing = self._lookup_cache(texts)
+        fresh = await self._aembed_uncached([texts[i] for i in missing]) if missing else None
+        return self._merge_cached(keys, cached, missing, fresh)
+
+    async def aembed_one(self, text: str) -> np.ndarray:
+        """Async version of `embed_one`."""
+        return (await self.aembed([text]))[0]
+
+    async def aclose(self):
+        """Release resources tied to the running event loop."""
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.flush()
+
+
+class EmbeddingClient(Embedder):
+    """
+    Batched embedding client for Ollama.
+
+    Reuses one keep-alive HTTP session, sends texts in batches to the
+    `/api/embed` endpoint and bounds the number of concurrent requests.
+    Falls back to the single-text `/api/embeddings` endpoint on Ollama
+    versions that do not provide the batch endpoint. When a cache is given,
+    only texts missing from it are sent to the model.
+
+    `embed` blocks the calling thread; `aembed` is its asyncio counterpart
+    and goes through a pooled `httpx.AsyncClient` instead.
+    """
+
+    backend = "ollama"
+
+    def __init__(
+        self,
+        model: str = MODEL_NAME,
+        host: str = OLLAMA_HOST,
+        batch_size: int = BATCH_SIZE,
+        max_concurrency: int = MAX_CONCURRENCY,
+        timeout: float = REQUEST_TIMEOUT,
+        cache: Optional[EmbeddingCache] = None,
+        keep_alive=KEEP_ALIVE,
+    ):
+        super().__init__(model, cache)
+        self.keep_alive = keep_alive
+        self.batch_url = f"{host}/api/embed"
+        self.single_url = f"{host}/api/embeddings"
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Shared by every thread using this client, so the limit is global
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # None until the first request tells us whether /api/embed exists
+        self._batch_supported: Optional[bool] = None
+
+        # Async client and semaphore belong to the event loop that created them
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._async_slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="embed",
+                )
+            return self._executor
+
+    def _payload(self, **fields) -> dict:
+        return {"model": self.model, "keep_alive": self.keep_alive, **fields}
+
+    def _post(self, url: str, payload: dict) -> requests.Response:
+        with self._slots:
+            return self.session.post(url, json=payload, timeout=self.timeout)
+
+    def _embed_single(self, text: str) -> List[float]:
+        res = self._post(self.single_url, self._payload(prompt=text))
+        res.raise_for_status()
+        return res.json()["embedding"]
+
+    def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        if self._batch_supported is not False:
+            res = self._post(self.batch_url, self._payload(input=list(texts)))
+            if res.status_code != 404:
+                res.raise_for_status()
+                self._batch_supported = True
+                return np.asarray(res.json()["embeddings"], dtype=np.float32)
+            self._batch_supported = False
+
+        # Older Ollama: one request per text, still over the pooled session
+        vectors = [self._embed_single(text) for text in texts]
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _embed_uncached(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> np.ndarray:
+        batches = self._batches(texts)
+
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+            if on_progress:
+                on_progress(len(texts))
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(self._embed_batch, batch) for batch in batches]
+            results = []
+            # Collect in submission order so rows stay aligned with texts
+            for future in futures:
+                results.append(future.result())
+                if on_progress:
+                    on_progress(len(results[-1]))
+
+        return _normalize(np.vstack(results))
+
+    def _get_async_http(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_loop = loop
+            self._async_http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        return self._async_http, self._async_slots
+
+    async def _apost(self, url: str, payload: dict) -> httpx.Response:
+        http, slots = self._get_async_http()
+        async with slots:
+            return await http.post(url, json=payload)
+
+    async def _aembed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        if self._batch_supported is not False:
+            res = await self._apost(self.batch_url, self._payload(input=list(texts)))
+            if res.status_code != 404:
+                res.raise_for_status()
+                self._batch_supported = True
+                return np.asarray(res.json()["embeddings"], dtype=np.float32)
+            self._batch_supported = False
+
+        vectors = []
+        for text in texts:
+            res = await self._apost(self.single_url, self._payload(prompt=text))
+            res.raise_for_status()
+            vectors.append(res.json()["embedding"])
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def _aembed_uncached(self, texts: List[str]) -> np.ndarray:
+        # Batches run concurrently on the event loop
+        results = await asyncio.gather(*(self._aembed_batch(batch) for batch in self._batches(texts)))
+        return _normalize(np.vstack(results))
+
+    async def aclose(self):
+        """Close the async HTTP client of the running event loop."""
+        if self._async_http is not None and self._async_loop is asyncio.get_running_loop():
+            await self._async_http.aclose()
+            self._async_http = None
+            self._async_loop = None
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        super().close()
+        self.session.close()
+
+
+_default_client: Optional[Embedder] = None
+_default_client_lock = threading.Lock()
+
+
+def create_embedder(backend: str = EMBEDDING_BACKEND, use_cache: bool = USE_EMBEDDING_CACHE) -> Embedder:
+    """
+    Create an embedder for a backend name ("ollama" or "local").
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend == "ollama":
+        return EmbeddingClient(cache=EmbeddingCache(MODEL_NAME) if use_cache else None)
+    if backend == "local":
+        from .local_embedder import LocalEmbedder
+        embedder = LocalEmbedder()
+        if use_cache:
+            embedder.cache = EmbeddingCache(embedder.cache_name)
+        return embedder
+    raise ValueError(f"Unknown embedding backend '{backend}', expected 'ollama' or 'local'")
+
+
+def get_client() -> Embedder:
+    """Return the process-wide embedder of the configured EMBEDDING_BACKEND."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = create_embedder()
+        return _default_client
+
+
+def get_embeddings(
+    texts: Sequence[str],
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> np.ndarray:
+    """Embed many texts at once. Returns a float32 matrix."""
+    return get_client().embed(texts, on_progress=on_progress)
+
+
 def get_embedding(text):
-    res = requests.post(
-        OLLAMA_URL,
-        json={"model": MODEL_NAME, "prompt": text}
-    ).json()
-    return res["embedding"]
+    return get_client().embed_one(text).tolist()
+
+
+async def aget_embeddings(texts: Sequence[str]) -> np.ndarray:
+    """Async version of `get_embeddings`."""
+    return await get_client().aembed(texts)
+
+
+async def aget_embedding(text: str) -> np.ndarray:
+    """Async version of `get_embedding`, returning a float32 vector."""
+    return await get_client().aembed_one(text)
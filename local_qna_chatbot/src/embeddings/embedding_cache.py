@@ -0,0 +1,251 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).parent.parent.parent / "data" / "cache" / "embeddings"
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+INITIAL_CAPACITY = 1024
+# Persist the hash index after this many inserts (and always at exit)
+FLUSH_EVERY = 256
+# Share of entries dropped at once when the cache is full
+EVICT_FRACTION = 0.1
+
+KEY_BYTES = 16
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, on-disk embedding cache for a single model.
+
+    Vectors live in a memory-mapped float32 matrix (`vectors.f32`). A hash
+    index (`keys.npy`) maps each slot to the digest of (model, normalized
+    text) and `last_used.npy` holds a logical clock used for LRU eviction
+    once the matrix reaches `max_bytes`. A slot whose clock is 0 is free.
+
+    The cache is safe to share between threads but assumes a single
+    writing process per cache directory.
+    """
+
+    def __init__(self, model: str, cache_dir: Path = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.model = model
+        self.dir = Path(cache_dir) / re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        self.max_bytes = max_bytes
+
+        self.dim: Optional[int] = None
+        self.capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._keys: Optional[np.ndarray] = None
+        self._last_used: Optional[np.ndarray] = None
+        self._slots: Dict[bytes, int] = {}
+        self._free: List[int] = []
+        self._clock = 0
+        self._dirty = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._load()
+        atexit.register(self.flush)
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.dir / "vectors.f32"
+
+    def key(self, text: str) -> bytes:
+        """Digest of the model name and whitespace-normalized text."""
+        normalized = " ".join(text.split())
+        return hashlib.blake2b(
+            f"{self.model}\0{normalized}".encode("utf-8"),
+            digest_size=KEY_BYTES,
+        ).digest()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _load(self):
+        meta_path = self.dir / "meta.json"
+        if not meta_path.exists():
+            return
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.capacity = meta["capacity"]
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r+",
+                shape=(self.capacity, self.dim),
+            )
+            self._keys = np.load(self.dir / "keys.npy")
+            self._last_used = np.load(self.dir / "last_used.npy")
+        except Exception as e:
+            logger.warning(f"Discarding unreadable embedding cache at {self.dir}: {e}")
+            self._reset()
+            return
+
+        used = np.flatnonzero(self._last_used)
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in used}
+        self._free = np.flatnonzero(self._last_used == 0)[::-1].tolist()
+        self._clock = int(self._last_used.max()) if len(used) else 0
+        logger.info(f"Embedding cache loaded from {self.dir} ({len(self._slots)} entries)")
+
+    def _reset(self):
+        self.dim = None
+        self.capacity = 0
+        self._vectors = None
+        self._keys = None
+        self._last_used = None
+        self._slots = {}
+        self._free = []
+        self._clock = 0
+        self._dirty = 0
+
+    def _max_entries(self) -> int:
+        per_entry = self.dim * 4 + KEY_BYTES + 8
+        return max(1, self.max_bytes // per_entry)
+
+    def _resize(self, capacity: int):
+        """Grow the backing files to `capacity` slots and remap them."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+",
+            shape=(capacity, self.dim),
+        )
+
+        keys = np.zeros((capacity, KEY_BYTES), dtype=np.uint8)
+        last_used = np.zeros(capacity, dtype=np.int64)
+        if self._keys is not None:
+            keys[:self.capacity] = self._keys
+            last_used[:self.capacity] = self._last_used
+        self._keys = keys
+        self._last_used = last_used
+
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+        self._write_index()
+
+    def _evict(self):
+        """Drop the least recently used share of entries."""
+        n = max(1, int(len(self._slots) * EVICT_FRACTION))
+        used = np.flatnonzero(self._last_used)
+        victims = used[np.argpartition(self._last_used[used], n - 1)[:n]]
+        for slot in victims:
+            del self._slots[self._keys[slot].tobytes()]
+        self._keys[victims] = 0
+        self._last_used[victims] = 0
+        # Persist the removal before the slots are reused, so a crash can
+        # never leave an old key pointing at a new vector
+        self._write_index()
+        self._free.extend(int(slot) for slot in victims)
+        logger.info(f"Evicted {n} entries from embedding cache {self.dir}")
+
+    def _allocate(self) -> int:
+        if not self._free:
+            max_entries = self._max_entries()
+            if self.capacity < max_entries:
+                self._resize(min(max(self.capacity * 2, INITIAL_CAPACITY), max_entries))
+            else:
+                self._evict()
+        return self._free.pop()
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """
+        Look up cached vectors.
+
+        Returns:
+            List with a float32 vector for every hit and None for every miss
+        """
+        with self._lock:
+            results: List[Optional[np.ndarray]] = []
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is None:
+                    results.append(None)
+                    self.misses += 1
+                    continue
+                self._clock += 1
+                self._last_used[slot] = self._clock
+                results.append(np.array(self._vectors[slot]))
+                self.hits += 1
+            return results
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        """Store vectors (one row per key)."""
+        if len(keys) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim != vectors.shape[1]:
+                if self.dim is not None:
+                    logger.warning(
+                        f"Embedding dimension changed ({self.dim} -> {vectors.shape[1]}), clearing cache {self.dir}"
+                    )
+                self._reset()
+                self.dim = vectors.shape[1]
+
+            # Never insert more than fits; keep the most recent rows
+            max_entries = self._max_entries()
+            if len(keys) > max_entries:
+                keys, vectors = keys[-max_entries:], vectors[-max_entries:]
+
+            for key, vector in zip(keys, vectors):
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._allocate()
+                    self._slots[key] = slot
+                    self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._vectors[slot] = vector
+                self._clock += 1
+                self._last_used[slot] = self._clock
+                self._dirty += 1
+
+            if self._dirty >= FLUSH_EVERY:
+                self._write_index()
+
+    def _write_index(self):
+        if self._keys is None:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+        # Write to temporary files and swap them in, so readers never see
+        # a half-written index
+        for name, array in (("keys.npy", self._keys), ("last_used.npy", self._last_used)):
+            tmp_path = self.dir / f"{name}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, self.dir / name)
+        tmp_path = self.dir / "meta.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": self.dim, "capacity": self.capacity}, f)
+        os.replace(tmp_path, self.dir / "meta.json")
+        self._dirty = 0
+
+    def flush(self):
+        """Persist pending inserts to disk."""
+        with self._lock:
+            if self._dirty:
+                self._write_index()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._slots),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from .embedder import Embedder
+
+# Chunks embedded and checkpointed together; a crash loses at most one shard
+SHARD_SIZE = 2048
+# Attempts per shard before the job gives up (it can be resumed later)
+MAX_ATTEMPTS = 6
+# Seconds before the first retry, doubled after each failed attempt up to RETRY_MAX_DELAY
+RETRY_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+MANIFEST_FILE = "manifest.json"
+ROWS_FILE = "rows.npy"
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether an embedding error is worth retrying (network trouble or a busy/failing server)."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
+
+def embed_with_retry(
+    embedder: Embedder,
+    texts: List[str],
+    attempts: int = MAX_ATTEMPTS,
+    delay: float = RETRY_DELAY,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> np.ndarray:
+    """
+    Embed texts, retrying transient failures with exponential backoff.
+
+    `on_progress` gets each text once: a retry only reports the texts it
+    gets past the furthest point an earlier attempt reported.
+
+    Raises:
+        The last error if every attempt failed, or the first error that
+        is not transient
+    """
+    reported = done = 0
+
+    def progress(n: int):
+        nonlocal reported, done
+        done += n
+        if done > reported:
+            on_progress(done - reported)
+            reported = done
+
+    for attempt in range(1, attempts + 1):
+        done = 0
+        try:
+            return embedder.embed(texts, on_progress=progress if on_progress else None)
+        except Exception as e:
+            if attempt == attempts or not is_transient(e):
+                raise
+            wait = min(delay * 2 ** (attempt - 1), RETRY_MAX_DELAY)
+            print(f"Embedding failed ({e}), retrying in {wait:.0f}s (attempt {attempt + 1}/{attempts})")
+            time.sleep(wait)
+
+
+class EmbeddingJob:
+    """
+    Embeddings of a set of chunk rows, computed shard by shard into a directory.
+
+    Every shard of SHARD_SIZE rows is written as its own .npy file and then
+    recorded in the manifest, so an interrupted job resumes after its last
+    completed shard. A job is identified by its rows, their chunk hashes and
+    the embedding model: if any of these changed, the old shards are
+    discarded and the job starts over.
+
+    Layout: manifest.json, rows.npy (the rows in job order) and
+    shard_<n>.npy (float32 vectors of rows[n * shard_size:(n + 1) * shard_size]).
+    """
+
+    def __init__(self, directory: Path, rows: np.ndarray, hashes: np.ndarray, model_id: str, shard_size: int = SHARD_SIZE):
+        self.directory = Path(directory)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.model_id = model_id
+        self.shard_size = max(1, shard_size)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.rows.tobytes())
+        digest.update(np.ascontiguousarray(hashes, dtype=np.uint64).tobytes())
+        self.fingerprint = digest.hexdigest()
+        self.completed = 0
+        self.dimension: Optional[int] = None
+        self._resume()
+
+    @property
+    def n_shards(self) -> int:
+        return -(-len(self.rows) // self.shard_size)
+
+    @property
+    def done(self) -> bool:
+        return self.completed == self.n_shards
+
+    def _shard_path(self, shard: int) -> Path:
+        return self.directory / f"shard_{shard:05d}.npy"
+
+    def _resume(self):
+        manifest_path = self.directory / MANIFEST_FILE
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if (
+                manifest.get("fingerprint") == self.fingerprint
+                and manifest.get("embedding_model") == self.model_id
+                and manifest.get("shard_size") == self.shard_size
+            ):
+                self.completed = manifest["completed"]
+                self.dimension = manifest.get("dimension")
+                if self.completed:
+                    print(f"Resuming embedding job: {self.completed} of {self.n_shards} shards already done")
+                return
+        # No job, or one for other rows: start over
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+        self.directory.mkdir(parents=True)
+        np.save(self.directory / ROWS_FILE, self.rows)
+        self._write_manifest()
+
+    def _write_manifest(self):
+        tmp_path = self.directory / (MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "fingerprint": self.fingerprint,
+                "embedding_model": self.model_id,
+                "shard_size": self.shard_size,
+                "rows": len(self.rows),
+                "dimension": self.dimension,
+                "completed": self.completed,
+            }, f)
+        os.replace(tmp_path, self.directory / MANIFEST_FILE)
+
+    def run(
+        self,
+        embedder: Embedder,
+        text: Callable[[int], str],
+        on_progress: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Embed the shards that are not done yet.
+
+        Args:
+            embedder: Embedding backend (its model must be `model_id`)
+            text: Returns the text of a chunk row
+            on_progress: Called with the number of texts embedded so far in each step
+        """
+        if on_progress and self.completed:
+            on_progress(min(self.completed * self.shard_size, len(self.rows)))
+        for shard in range(self.completed, self.n_shards):
+            rows = self.rows[shard * self.shard_size:(shard + 1) * self.shard_size]
+            vectors = embed_with_retry(embedder, [text(int(row)) for row in rows], on_progress=on_progress)
+            tmp_path = self.directory / f"shard_{shard:05d}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._shard_path(shard))
+            # The shard counts once the manifest says so
+            self.dimension = int(vectors.shape[1])
+            self.completed = shard + 1
+            self._write_manifest()
+
+    def shards(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield (rows, vectors) of each completed shard; vectors are memory-mapped."""
+        for shard in range(self.completed):
+            rows = self.rows[shard * self.shard_size:(shard + 1) * self.shard_size]
+            yield rows, np.load(self._shard_path(shard), mmap_mode="r")
+
+    def training_sample(self, max_vectors: int) -> np.ndarray:
+        """Up to `max_vectors` vectors spread evenly over all shards."""
+        stride = max(1, -(-len(self.rows) // max(1, max_vectors)))
+        sample = [np.asarray(vectors[::stride]) for _, vectors in self.shards()]
+        return np.vstack(sample)[:max_vectors]
+
+    def remove(self):
+        """Delete the shards once their vectors are in the index."""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -1,6 +1,8 @@
-import os
+import argparse
 import json
+import os
 import numpy as np
+import faiss
 from pathlib import Path
 from tqdm import tqdm
 
@@ -11,46 +13,168 @@ import sys
 # Add project root to path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from src.embeddings.embedder import get_embedding
-from src.embeddings.build_faiss import build_faiss
+from src.embeddings.embedder import get_client
+from src.embeddings.embedding_job import EmbeddingJob
+from src.embeddings.build_faiss import load_faiss_index
+from src.embeddings.chunk_table import ChunkTable
+from src.embeddings.index_factory import INDEX_TYPES, DEFAULT_INDEX_TYPE, create_index, index_kind
+from src.ingestion.incremental import CHUNK_HASHES_FILE, DELETED, StageTimer, hashes_fingerprint
+
+# Chunk hash each index id was embedded from, aligned with the chunk rows
+EMBEDDED_HASHES_FILE = "embedded_hashes.npy"
+# Embedding model and index type of the index, and the chunk table version
+# it was built from
+INDEX_STATE_FILE = "index_state.json"
+# IVF training sample per list; larger samples only slow k-means down
+MAX_TRAINING_POINTS_PER_LIST = 256
+
+
+def load_existing(index_path: Path, index_type: str, embedding_model: str):
+    """
+    Load the index of a previous run and the chunk hash of every id in it.
+
+    Returns:
+        (index, embedded hashes), or (None, None) if there is no usable
+        index: missing, built before ids were tracked, of another type or
+        from another embedding model
+    """
+    state_path = index_path.parent / INDEX_STATE_FILE
+    hashes_path = index_path.parent / EMBEDDED_HASHES_FILE
+    if not (index_path.exists() and state_path.exists() and hashes_path.exists()):
+        return None, None
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("index_type") != index_type or state.get("embedding_model") != embedding_model:
+        print(f"Index was built as {state.get('index_type')} with {state.get('embedding_model')}, rebuilding")
+        return None, None
+    index = load_faiss_index(str(index_path))
+    if not isinstance(index, faiss.IndexIDMap2):
+        return None, None
+    return index, np.load(hashes_path)
+
+
+def remove_ids(index: faiss.IndexIDMap2, ids: np.ndarray) -> faiss.IndexIDMap2:
+    """Remove vectors by id, rebuilding from the stored vectors if the index cannot remove in place."""
+    if not len(ids):
+        return index
+    try:
+        index.remove_ids(faiss.IDSelectorBatch(ids.astype(np.int64)))
+        return index
+    except RuntimeError:
+        # HNSW graphs do not support removal
+        pass
+    stored_ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(stored_ids, ids)
+    vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)[keep]
+    rebuilt = faiss.IndexIDMap2(create_index(index.d, index_kind(index), n_vectors=len(vectors)))
+    rebuilt.add_with_ids(vectors, stored_ids[keep])
+    return rebuilt
+
+
+def save_index(index: faiss.Index, index_path: Path, embedded: np.ndarray, state: dict):
+    """Write the index, then the hashes and state that describe it, each atomically."""
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    faiss.write_index(index, str(tmp_path))
+    os.replace(tmp_path, index_path)
+
+    tmp_path = index_path.parent / (EMBEDDED_HASHES_FILE + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, embedded)
+    os.replace(tmp_path, index_path.parent / EMBEDDED_HASHES_FILE)
+
+    tmp_path = index_path.parent / (INDEX_STATE_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, index_path.parent / INDEX_STATE_FILE)
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Embed new and changed chunks and update the FAISS index.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=DEFAULT_INDEX_TYPE,
+                        help="FAISS index type (IVF types fall back to flat on small corpora)")
+    parser.add_argument("--full", action="store_true",
+                        help="Embed every chunk and build the index from scratch (retrains IVF indexes)")
+    args = parser.parse_args()
+    timer = StageTimer()
+
     DATA_DIR = Path(__file__).parent.parent.parent / "data"
-    PROCESSED_DATA_PATH = DATA_DIR / "processed" / "processed_data.json"
+    PROCESSED_DIR = DATA_DIR / "processed"
+    PROCESSED_DATA_PATH = PROCESSED_DIR / "chunks"
     INDEX_PATH = DATA_DIR / "embeddings" / "index.faiss"
+    JOB_DIR = DATA_DIR / "embeddings" / "job"
 
-    if not PROCESSED_DATA_PATH.exists():
-        print(f"Error: {PROCESSED_DATA_PATH} not found.")
+    if not PROCESSED_DATA_PATH.exists() or not (PROCESSED_DIR / CHUNK_HASHES_FILE).exists():
+        print(f"Error: {PROCESSED_DATA_PATH} not found. Run src/ingestion/process_data.py first.")
         return
 
     print("Loading processed data...")
-    with open(PROCESSED_DATA_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    embeddings = []
-    print(f"Generating embeddings for {len(data)} chunks...")
-    
-    for item in tqdm(data):
-        try:
-            emb = get_embedding(item["text"])
-            embeddings.append(emb)
-        except Exception as e:
-            print(f"Error generating embedding: {e}")
-            # If we fail, we might want to skip or stop. 
-            # For now, let's append a zero vector or stop? 
-            # Appending zero vector might mess up search. 
-            # Let's just stop or continue. If I stop, I can't build.
-            # I will continue but this index will be misaligned if I don't handle it.
-            # But wait, index i corresponds to data i. If I skip, alignment breaks.
-            # So I must have an embedding.
-            # I'll just raise for now.
-            raise e
-
-    embeddings_np = np.array(embeddings, dtype=np.float32)
-    
-    print("Building FAISS index...")
-    build_faiss(embeddings_np, save_path=str(INDEX_PATH))
-    print("Done!")
+    with timer.stage("load"):
+        hashes = np.load(PROCESSED_DIR / CHUNK_HASHES_FILE)
+        data = ChunkTable.open(PROCESSED_DATA_PATH, rows=len(hashes))
+
+        embedding_model = get_client().model_id
+        index, embedded = (None, None) if args.full else load_existing(INDEX_PATH, args.index_type, embedding_model)
+        if embedded is None:
+            embedded = np.zeros(0, dtype=np.uint64)
+        # Hash each row was embedded from, 0 for rows not in the index
+        previous = np.zeros(len(hashes), dtype=np.uint64)
+        previous[:min(len(embedded), len(hashes))] = embedded[:len(hashes)]
+
+    with timer.stage("remove"):
+        # Vectors of deleted or changed chunks, and of rows past the table, go
+        indexed = faiss.vector_to_array(index.id_map) if index is not None else np.empty(0, dtype=np.int64)
+        in_table = indexed < len(hashes)
+        current = in_table.copy()
+        current[in_table] = previous[indexed[in_table]] == hashes[indexed[in_table]]
+        stale = indexed[~current]
+        if index is not None:
+            index = remove_ids(index, stale)
+        # Only rows that still have a vector count as embedded
+        embedded_rows = np.zeros(len(hashes), dtype=bool)
+        embedded_rows[indexed[current]] = True
+        previous[~embedded_rows] = DELETED
+
+    # Live rows without a vector of their current text are embedded
+    new_rows = np.flatnonzero((hashes != DELETED) & (previous != hashes))
+    print(f"{len(new_rows)} of {int((hashes != DELETED).sum())} chunks to embed, {len(stale)} vectors to remove")
+
+    if len(new_rows):
+        # Embedded in checkpointed shards: an interrupted run resumes after
+        # the last completed shard instead of starting over
+        with timer.stage("embed"):
+            embedder = get_client()
+            job = EmbeddingJob(JOB_DIR, new_rows, hashes[new_rows], embedding_model)
+            with tqdm(total=len(new_rows)) as progress:
+                job.run(embedder, data.text, on_progress=progress.update)
+
+        with timer.stage("index"):
+            if index is None:
+                print(f"Building FAISS index ({args.index_type})...")
+                base = create_index(job.dimension, args.index_type, n_vectors=len(new_rows))
+                if not base.is_trained:
+                    # Faiss samples at most this many points per list anyway
+                    nlist = faiss.extract_index_ivf(base).nlist
+                    base.train(job.training_sample(nlist * MAX_TRAINING_POINTS_PER_LIST))
+                index = faiss.IndexIDMap2(base)
+            # One shard in memory at a time
+            for rows, vectors in job.shards():
+                index.add_with_ids(np.ascontiguousarray(vectors), rows)
+            previous[new_rows] = hashes[new_rows]
+
+    if index is None:
+        print("No chunks to index.")
+        return
+    with timer.stage("save"):
+        save_index(index, INDEX_PATH, previous, {
+            "index_type": args.index_type,
+            "embedding_model": embedding_model,
+            "chunks": len(hashes),
+            "chunks_fingerprint": hashes_fingerprint(hashes),
+        })
+        if len(new_rows):
+            job.remove()
+    print(f"{index.ntotal} vectors in {INDEX_PATH}: {timer.report()}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,252 @@
+import math
+from typing import Optional
+
+import numpy as np
+import faiss
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+DEFAULT_INDEX_TYPE = "flat"
+
+# FAISS wants roughly 39 training points per IVF list and per PQ centroid
+TRAINING_POINTS_PER_LIST = 39
+# Below this size an exhaustive scan is fast enough and IVF recall suffers
+MIN_TRAINED_INDEX_VECTORS = 10000
+PQ_NBITS = 8
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+
+
+def suggest_nlist(n_vectors: int) -> int:
+    """Number of IVF lists for a corpus of `n_vectors` (about 4 * sqrt(n), trainable on n)."""
+    nlist = min(65536, int(4 * math.sqrt(max(n_vectors, 1))), n_vectors // TRAINING_POINTS_PER_LIST)
+    return max(1, nlist)
+
+
+def suggest_pq_m(dimension: int) -> int:
+    """Largest number of PQ sub-quantizers dividing `dimension` with at least 4 dims each."""
+    for m in range(max(1, dimension // 4), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def min_training_points(index_type: str, nlist: int) -> int:
+    """Smallest corpus that gives a trainable index of the given type."""
+    if index_type == "ivf_flat":
+        return max(MIN_TRAINED_INDEX_VECTORS, nlist * TRAINING_POINTS_PER_LIST)
+    if index_type == "ivf_pq":
+        return max(
+            MIN_TRAINED_INDEX_VECTORS,
+            nlist * TRAINING_POINTS_PER_LIST,
+            (1 << PQ_NBITS) * TRAINING_POINTS_PER_LIST,
+        )
+    return 0
+
+
+def create_index(
+    dimension: int,
+    index_type: str = DEFAULT_INDEX_TYPE,
+    n_vectors: int = 0,
+    nlist: Optional[int] = None,
+    pq_m: Optional[int] = None,
+    hnsw_m: int = HNSW_M,
+) -> faiss.Index:
+    """
+    Create an empty FAISS index of the requested type.
+
+    IVF indexes need training data; if `n_vectors` is too small to train
+    them, a flat index is returned instead.
+
+    Args:
+        dimension: Embedding dimension
+        index_type: One of "flat", "ivf_flat", "ivf_pq", "hnsw"
+        n_vectors: Number of vectors the index will be trained on
+        nlist: Number of IVF lists (default: derived from n_vectors)
+        pq_m: Number of PQ sub-quantizers (default: derived from dimension)
+        hnsw_m: Neighbours per HNSW node
+
+    Returns:
+        faiss.Index: The (untrained) index
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from {', '.join(INDEX_TYPES)}")
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or suggest_nlist(n_vectors)
+        required = min_training_points(index_type, nlist)
+        if n_vectors < required:
+            logger.info(
+                f"{n_vectors} vectors are too few to train {index_type} (need {required}), using flat index"
+            )
+            return faiss.IndexFlatL2(dimension)
+
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat":
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        pq_m = pq_m or suggest_pq_m(dimension)
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, PQ_NBITS)
+
+    return faiss.IndexFlatL2(dimension)
+
+
+def build_index(embeddings: np.ndarray, index_type: str = DEFAULT_INDEX_TYPE, **options) -> faiss.Index:
+    """
+    Create, train (when needed) and fill an index with `embeddings`.
+
+    Args:
+        embeddings: float32 matrix of shape (n_samples, dimension)
+        index_type: One of INDEX_TYPES
+        **options: Passed through to create_index
+
+    Returns:
+        faiss.Index: The populated index
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index = create_index(embeddings.shape[1], index_type, n_vectors=len(embeddings), **options)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+
+class TailedIndex:
+    """
+    A FAISS index and vectors appended after it, searched as one index.
+
+    `tail` is a view of the first rows of an append-only buffer: the owner
+    only writes rows past it, so a search needs no lock. Tail rows get the
+    ids following the index's and are compared exactly, with the index's
+    metric. Only `search`, `d` and `ntotal` are offered; `index_kind` and
+    `search_parameters` look through to `index`.
+    """
+
+    def __init__(self, index: faiss.Index, tail: np.ndarray):
+        self.index = index
+        self.tail = tail
+        self.d = index.d
+        self.ntotal = index.ntotal + len(tail)
+
+    def search(self, queries: np.ndarray, k: int, params: Optional[faiss.SearchParameters] = None):
+        distances, ids = self.index.search(queries, k, params=params)
+        tail_distances, tail_ids = faiss.knn(queries, self.tail, min(k, len(self.tail)), metric=self.index.metric_type)
+        distances = np.hstack([distances, tail_distances])
+        ids = np.hstack([ids, tail_ids + self.index.ntotal])
+        # Similarities rank high to low, distances low to high; missing
+        # results carry the worst value either way
+        keys = -distances if self.index.metric_type == faiss.METRIC_INNER_PRODUCT else distances
+        order = np.argsort(keys, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def index_kind(index: faiss.Index) -> str:
+    """Return the INDEX_TYPES name of an index (looking through ID maps and tails)."""
+    if isinstance(index, TailedIndex):
+        index = index.index
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_memory_bytes(index: Optional[faiss.Index]) -> int:
+    """Approximate RAM held by an index's vectors and graph/list structures."""
+    if index is None or index.ntotal == 0:
+        return 0
+    kind = index_kind(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        overhead = index.ntotal * 8
+        index = faiss.downcast_index(index.index)
+    else:
+        overhead = 0
+    if kind in ("ivf_flat", "ivf_pq"):
+        ivf = faiss.extract_index_ivf(index)
+        return overhead + index.ntotal * (ivf.code_size + 8) + ivf.nlist * index.d * 4
+    if kind == "hnsw":
+        # Vectors plus roughly 2 * M neighbour ids per node on level 0
+        return overhead + index.ntotal * (index.d * 4 + index.hnsw.nb_neighbors(0) * 4)
+    return overhead + index.ntotal * index.d * 4
+
+
+def truncate_index(index: faiss.Index, n_rows: int) -> faiss.Index:
+    """
+    Keep only the first `n_rows` rows of an index (in place when it can).
+
+    HNSW graphs cannot remove nodes, so an HNSW index is rebuilt from its
+    stored vectors, which it keeps exactly.
+    """
+    if n_rows >= index.ntotal:
+        return index
+    if index_kind(index) == "hnsw":
+        return build_index(index.reconstruct_n(0, n_rows), index_type="hnsw", hnsw_m=index.hnsw.nb_neighbors(1))
+    index.remove_ids(faiss.IDSelectorRange(n_rows, index.ntotal))
+    return index
+
+
+def remove_rows(index: faiss.Index, rows: np.ndarray) -> faiss.Index:
+    """
+    Copy of an index without the given rows; the rows after them move up,
+    so ids stay row numbers in the original order.
+
+    Flat and IVF indexes drop the rows from a clone, so IVF-PQ keeps the
+    other rows' codes rather than quantizing reconstructions again. HNSW
+    graphs cannot remove nodes and are rebuilt from their exact vectors.
+    """
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    if index_kind(index) == "hnsw":
+        vectors = np.delete(index.reconstruct_n(0, index.ntotal), rows, axis=0)
+        return build_index(vectors, index_type="hnsw", hnsw_m=index.hnsw.nb_neighbors(1))
+    index = faiss.clone_index(index)
+    index.remove_ids(faiss.IDSelectorBatch(rows))
+    if index_kind(index) in ("ivf_flat", "ivf_pq"):
+        # IVF lists store ids rather than positions: close the gaps
+        ivf = faiss.extract_index_ivf(index)
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if not size:
+                continue
+            ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy()
+            codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+            ids -= np.searchsorted(rows, ids)
+            invlists.update_entries(list_no, 0, size, faiss.swig_ptr(ids), faiss.swig_ptr(codes))
+    return index
+
+
+def search_parameters(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> Optional[faiss.SearchParameters]:
+    """
+    Per-query search parameters for `index`.
+
+    Passed to `index.search(..., params=...)` so concurrent queries can use
+    different settings without mutating the shared index.
+
+    Args:
+        index: The index that will be searched
+        nprobe: IVF lists to visit (ignored for non-IVF indexes)
+        ef_search: HNSW candidate list size (ignored for non-HNSW indexes)
+
+    Returns:
+        faiss.SearchParameters or None if nothing applies
+    """
+    kind = index_kind(index)
+    if nprobe and kind in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    if ef_search and kind == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
@@ -0,0 +1,534 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import faiss
+import numpy as np
+import logging
+
+from .bm25 import BM25Index
+from .chunk_table import ChunkTable
+from .build_faiss import load_faiss_index
+from .index_factory import (
+    DEFAULT_INDEX_TYPE, TailedIndex, build_index, index_kind, index_memory_bytes, min_training_points,
+    remove_rows, suggest_nlist, truncate_index
+)
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = Path(__file__).parent.parent.parent / "data" / "store"
+
+# Seconds between disk writes while a document is being appended in batches
+PERSIST_INTERVAL = 30.0
+# Stores written before the embedding model was recorded were all embedded by Ollama
+LEGACY_EMBEDDING_MODEL = "ollama:nomic-embed-text"
+# Appended vectors are kept in a tail buffer, searched exactly, and folded
+# into the index once they exceed this share of it (and MIN_TAIL_ROWS), so
+# each index copy is paid for by a proportional number of appended rows
+MAX_TAIL_FRACTION = 0.25
+MIN_TAIL_ROWS = 4096
+
+
+class StoreSnapshot(NamedTuple):
+    # A faiss.Index, or a TailedIndex while appended rows are not folded in
+    index: Optional[faiss.Index]
+    chunks: ChunkTable
+    lexical: BM25Index
+
+
+class IndexStore:
+    """
+    Durable FAISS index and chunk store holding many documents.
+
+    Layout of `store_dir`:
+        index[.<gen>].faiss     FAISS index, one row per chunk
+        bm25[.<gen>].npz        BM25 inverted index over the same rows
+        chunks[.<gen>]/         Columnar chunk table (see ChunkTable), row i describes index row i
+        manifest.json           Committed documents, generation and the embedding
+                                model of the vectors
+
+    Stores written with the older chunks[.<gen>].jsonl files are converted
+    to the columnar table the first time they are loaded.
+
+    The manifest is written last, so it is the commit point of every write.
+    Anything past what it records (left by a crash mid-upload) is discarded
+    on load. Searches never see a half-updated index: appended vectors go
+    to a tail buffer past the rows any search reads, and the tail is folded
+    into a clone of the index (compaction) only when it grows past
+    MAX_TAIL_FRACTION of the index, before the store is written, or when a
+    document is removed. Removing a document compacts the store into a new
+    generation of files.
+
+    A document can be built up in batches (`begin_document`, `append_chunks`,
+    `finish_document`); its chunks are searchable as soon as each batch is
+    appended, and only finished documents are used for duplicate detection.
+
+    The store starts with a flat index. If `index_type` needs training, the
+    index is rebuilt as that type once the corpus is large enough to train it.
+
+    The first chunks appended fix `embedding_model`; appending vectors of a
+    different model is refused until the store is empty again.
+    """
+
+    def __init__(self, store_dir: Path = STORE_DIR, index_type: str = DEFAULT_INDEX_TYPE):
+        self.dir = Path(store_dir)
+        self.index_type = index_type
+        self.index: Optional[faiss.Index] = None
+        # Appended vectors not yet in `index`: rows [0, _tail_rows) of the
+        # buffer, ids following the index's
+        self._tail: Optional[np.ndarray] = None
+        self._tail_rows = 0
+        self._tailed: Optional[TailedIndex] = None
+        self.lexical = BM25Index()
+        self.chunks = ChunkTable()
+        self.documents: List[Dict] = []
+        self.generation = 0
+        self.embedding_model: Optional[str] = None
+        # Bumped whenever the searchable content changes; lets caches of
+        # query results tell that they are stale
+        self.version = 0
+        self._persisted_rows = 0
+        self._last_persist = time.monotonic()
+        self._lock = threading.RLock()
+
+    def _index_path(self, generation: int) -> Path:
+        return self.dir / ("index.faiss" if generation == 0 else f"index.{generation}.faiss")
+
+    def _lexical_path(self, generation: int) -> Path:
+        return self.dir / ("bm25.npz" if generation == 0 else f"bm25.{generation}.npz")
+
+    def _chunks_path(self, generation: int) -> Path:
+        return self.dir / ("chunks" if generation == 0 else f"chunks.{generation}")
+
+    def _legacy_chunks_path(self, generation: int) -> Path:
+        return self.dir / ("chunks.jsonl" if generation == 0 else f"chunks.{generation}.jsonl")
+
+    @property
+    def index_path(self) -> Path:
+        return self._index_path(self.generation)
+
+    @property
+    def chunks_path(self) -> Path:
+        return self._chunks_path(self.generation)
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.dir / "manifest.json"
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def memory_bytes(self) -> int:
+        """Approximate RAM used by the loaded index and chunks."""
+        with self._lock:
+            return (
+                index_memory_bytes(self.index)
+                + (self._tail.nbytes if self._tail is not None else 0)
+                + self.lexical.memory_bytes()
+                + self.chunks.memory_bytes()
+            )
+
+    def snapshot(self) -> StoreSnapshot:
+        """
+        Return the index, chunks and lexical index for searching.
+
+        Every row either index returns has its chunk in `chunks`. The lexical
+        index may already hold rows appended later; skip rows past the end.
+        """
+        with self._lock:
+            index = self.index
+            if self._tail_rows:
+                # The same object until the next append, so concurrent
+                # searches share a key in the search batcher
+                tailed = self._tailed
+                if tailed is None or tailed.index is not index or tailed.ntotal != index.ntotal + self._tail_rows:
+                    tailed = self._tailed = TailedIndex(index, self._tail[:self._tail_rows])
+                index = tailed
+            return StoreSnapshot(index, self.chunks, self.lexical)
+
+    def load(self) -> bool:
+        """
+        Load the store from disk.
+
+        Returns:
+            bool: True if a stored index was found and loaded
+        """
+        if not self.manifest_path.exists():
+            return False
+
+        with self._lock:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            generation = manifest.get("generation", 0)
+            documents = manifest["documents"]
+            n_rows = sum(doc["chunks"] for doc in documents)
+            embedding_model = manifest.get("embedding_model", LEGACY_EMBEDDING_MODEL) if n_rows else None
+            index_path = self._index_path(generation)
+            chunks_path = self._chunks_path(generation)
+            legacy_path = self._legacy_chunks_path(generation)
+
+            index = None
+            chunks = ChunkTable()
+            convert = False
+            lexical = BM25Index()
+            if n_rows:
+                # Read-only queries work straight off the mapped file
+                index = load_faiss_index(str(index_path), mmap=True)
+                if index_kind(index) in ("ivf_flat", "ivf_pq"):
+                    # Mapped inverted lists are read-only: they cannot be
+                    # cloned, so appended rows could never be folded in
+                    index = load_faiss_index(str(index_path))
+                if index.ntotal < n_rows:
+                    raise ValueError(
+                        f"Index at {index_path} has {index.ntotal} rows, manifest expects {n_rows}"
+                    )
+                if index.ntotal > n_rows:
+                    logger.warning(f"Dropping {index.ntotal - n_rows} uncommitted rows from {index_path}")
+                    index = truncate_index(load_faiss_index(str(index_path)), n_rows)
+
+                if chunks_path.exists():
+                    # Mapped, not read: constant time whatever the corpus size
+                    chunks = ChunkTable.open(chunks_path, rows=n_rows)
+                else:
+                    chunks = self._read_legacy_chunks(legacy_path, manifest["chunks_bytes"], n_rows)
+                    convert = True
+
+                lexical = self._load_lexical(generation, chunks)
+
+            # Documents still being indexed when the process stopped
+            for doc in documents:
+                if doc.get("status") == "indexing":
+                    doc["status"] = "incomplete"
+
+            self.index = index
+            self._tail = None
+            self._tail_rows = 0
+            self._tailed = None
+            self.lexical = lexical
+            self.chunks = chunks
+            self.documents = documents
+            self.generation = generation
+            self.embedding_model = embedding_model
+            self.version += 1
+            self._persisted_rows = 0 if convert else n_rows
+            if convert:
+                self._persist()
+                legacy_path.unlink()
+                logger.info(f"Converted {legacy_path} to a columnar chunk table")
+
+        logger.info(f"Index store loaded from {self.dir}: {len(documents)} documents, {n_rows} chunks")
+        return True
+
+    @staticmethod
+    def _read_legacy_chunks(path: Path, chunks_bytes: int, n_rows: int) -> ChunkTable:
+        """Read the committed records of a chunks.jsonl file into a table."""
+        with open(path, "rb") as f:
+            data = f.read(chunks_bytes)
+        records = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+        if len(records) != n_rows:
+            raise ValueError(f"Chunk store at {path} has {len(records)} rows, manifest expects {n_rows}")
+        return ChunkTable.from_records(records)
+
+    def _load_lexical(self, generation: int, chunks: ChunkTable) -> BM25Index:
+        """Load the BM25 index for `chunks`, rebuilding it if it is missing or out of step."""
+        path = self._lexical_path(generation)
+        if path.exists():
+            try:
+                lexical = BM25Index.load(path)
+                if len(lexical) > len(chunks):
+                    lexical = lexical.compacted(range(len(chunks)))
+                if len(lexical) == len(chunks):
+                    return lexical
+            except Exception as e:
+                logger.warning(f"Could not load {path}: {e}")
+        logger.info(f"Building BM25 index for {len(chunks)} chunks in {self.dir}")
+        return BM25Index.build(list(chunks.texts()))
+
+    def _maybe_upgrade(self, index: faiss.Index) -> faiss.Index:
+        """Rebuild a flat index as `index_type` once there is enough data to train it."""
+        if self.index_type == "flat" or index_kind(index) != "flat":
+            return index
+        if index.ntotal < min_training_points(self.index_type, suggest_nlist(index.ntotal)):
+            return index
+        logger.info(f"Rebuilding {index.ntotal}-vector index in {self.dir} as {self.index_type}")
+        return build_index(index.reconstruct_n(0, index.ntotal), index_type=self.index_type)
+
+    def _append_tail(self, embeddings: np.ndarray):
+        """Append vectors past the rows searches read. Caller holds the lock."""
+        rows = self._tail_rows + len(embeddings)
+        if self._tail is None or rows > len(self._tail):
+            # Grown geometrically; searches holding the old buffer keep it
+            capacity = max(rows, 2 * (len(self._tail) if self._tail is not None else 0))
+            tail = np.empty((capacity, embeddings.shape[1]), dtype=np.float32)
+            if self._tail_rows:
+                tail[:self._tail_rows] = self._tail[:self._tail_rows]
+            self._tail = tail
+        self._tail[self._tail_rows:rows] = embeddings
+        self._tail_rows = rows
+
+    def _fold_tail(self):
+        """Add the tail to a clone of the index and publish it. Caller holds the lock."""
+        if not self._tail_rows:
+            return
+        index = faiss.clone_index(self.index)
+        index.add(self._tail[:self._tail_rows])
+        self.index = self._maybe_upgrade(index)
+        self._tail = None
+        self._tail_rows = 0
+        self._tailed = None
+
+    def check_embedding_model(self, embedding_model: Optional[str]):
+        """
+        Check that vectors of `embedding_model` can be added to or searched in this store.
+
+        Raises:
+            ValueError: If the store holds vectors of another model
+        """
+        if embedding_model and self.embedding_model and embedding_model != self.embedding_model:
+            raise ValueError(
+                f"Documents in {self.dir} were embedded with {self.embedding_model}, "
+                f"not {embedding_model}; switch the embedding backend back or re-index them"
+            )
+
+    def get_document(self, doc_id: int) -> Optional[Dict]:
+        for doc in self.documents:
+            if doc["doc_id"] == doc_id:
+                return doc
+        return None
+
+    def find_document(self, content_hash: str) -> Optional[Dict]:
+        """Return the fully indexed document with the given content hash, if any."""
+        for doc in self.documents:
+            if doc.get("content_hash") == content_hash and doc.get("status", "ready") == "ready":
+                return doc
+        return None
+
+    def begin_document(self, name: str) -> Dict:
+        """
+        Register a new, empty document whose chunks will be appended in batches.
+
+        Returns:
+            Dict: The manifest entry of the document
+        """
+        with self._lock:
+            doc = {
+                "doc_id": max((d["doc_id"] for d in self.documents), default=0) + 1,
+                "name": name,
+                "content_hash": None,
+                "status": "indexing",
+                "start_row": len(self.chunks),
+                "chunks": 0,
+                "added_at": time.time(),
+            }
+            self.documents = self.documents + [doc]
+            return doc
+
+    def append_chunks(
+        self,
+        doc_id: int,
+        embeddings: np.ndarray,
+        texts: List[str],
+        persist: Optional[bool] = None,
+        metadata: Optional[List[Dict]] = None,
+        embedding_model: Optional[str] = None,
+    ):
+        """
+        Append chunks of a document to the index.
+
+        Args:
+            doc_id: Document registered with `begin_document`
+            embeddings: float32 matrix, one row per chunk
+            texts: Chunk texts aligned with `embeddings`
+            persist: Write to disk now (True), not at all (False), or when
+                PERSIST_INTERVAL has passed since the last write (None)
+            metadata: Extra fields stored with each chunk, e.g. its offsets
+            embedding_model: Id of the model that produced `embeddings`
+        """
+        if len(embeddings) != len(texts):
+            raise ValueError("Number of embeddings and chunks must match")
+        if metadata is not None and len(metadata) != len(texts):
+            raise ValueError("Number of metadata entries and chunks must match")
+        if len(texts) == 0:
+            return
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        with self._lock:
+            doc = self.get_document(doc_id)
+            if doc is None:
+                raise KeyError(f"Unknown document id {doc_id}")
+            self.check_embedding_model(embedding_model)
+
+            index = None
+            if self.index is None:
+                index = self._maybe_upgrade(build_index(embeddings, index_type=self.index_type))
+            elif self.index.d != embeddings.shape[1]:
+                raise ValueError(
+                    f"Embedding dimension {embeddings.shape[1]} does not match index dimension {self.index.d}"
+                )
+
+            # Extend the chunk table before publishing the vectors, so any
+            # row a search can return already has its text
+            self.chunks.append(texts, metadata, doc_id=doc_id)
+            self.lexical.add(texts)
+            if index is not None:
+                self.index = index
+            else:
+                self._append_tail(embeddings)
+                if self._tail_rows > max(MIN_TAIL_ROWS, MAX_TAIL_FRACTION * self.index.ntotal):
+                    self._fold_tail()
+            if self.embedding_model is None:
+                self.embedding_model = embedding_model
+            self.version += 1
+            doc["chunks"] += len(texts)
+
+            if persist is None:
+                persist = time.monotonic() - self._last_persist >= PERSIST_INTERVAL
+            if persist:
+                self._persist()
+
+    def finish_document(self, doc_id: int, content_hash: Optional[str] = None) -> Dict:
+        """Mark a document as fully indexed and write the store to disk."""
+        with self._lock:
+            doc = self.get_document(doc_id)
+            if doc is None:
+                raise KeyError(f"Unknown document id {doc_id}")
+            doc["status"] = "ready"
+            doc["content_hash"] = content_hash
+            self._persist()
+        logger.info(f"Added document '{doc['name']}' ({doc['chunks']} chunks) to {self.dir}")
+        return doc
+
+    def add_document(
+        self,
+        name: str,
+        embeddings: np.ndarray,
+        texts: List[str],
+        content_hash: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+    ) -> Dict:
+        """
+        Append a document's chunks to the index and persist them.
+
+        Args:
+            name: Display name of the document (e.g. the uploaded filename)
+            embeddings: float32 matrix, one row per chunk
+            texts: Chunk texts aligned with `embeddings`
+            content_hash: Optional fingerprint used to skip duplicate uploads
+            embedding_model: Id of the model that produced `embeddings`
+
+        Returns:
+            Dict: The manifest entry of the stored document
+        """
+        if len(embeddings) != len(texts):
+            raise ValueError("Number of embeddings and chunks must match")
+
+        with self._lock:
+            if content_hash:
+                existing = self.find_document(content_hash)
+                if existing is not None:
+                    return existing
+            doc = self.begin_document(name)
+            try:
+                self.append_chunks(
+                    doc["doc_id"], embeddings, texts, persist=False, embedding_model=embedding_model
+                )
+            except Exception:
+                self.remove_document(doc["doc_id"])
+                raise
+            return self.finish_document(doc["doc_id"], content_hash)
+
+    def remove_document(self, doc_id: int) -> bool:
+        """
+        Remove a document and its chunks, compacting the store.
+
+        Returns:
+            bool: False if no such document exists
+        """
+        with self._lock:
+            if self.get_document(doc_id) is None:
+                return False
+            self._fold_tail()
+
+            doc_ids = self.chunks.column("doc_id")
+            keep = np.flatnonzero(doc_ids != doc_id)
+            if not len(keep):
+                index = None
+            elif len(keep) == len(self.chunks):
+                index = self.index
+            else:
+                # The other rows keep their order, and IVF-PQ their codes
+                index = remove_rows(self.index, np.flatnonzero(doc_ids == doc_id))
+
+            chunks = self.chunks.compacted(keep)
+            documents = [dict(doc) for doc in self.documents if doc["doc_id"] != doc_id]
+            remaining, first = np.unique(chunks.column("doc_id"), return_index=True)
+            first_rows = dict(zip(remaining.tolist(), first.tolist()))
+            for doc in documents:
+                doc["start_row"] = first_rows.get(doc["doc_id"], 0)
+
+            # Write a fresh generation of files; the manifest switches to it
+            old_generation = self.generation
+            self.generation += 1
+            self._persisted_rows = 0
+            self.index = index
+            self.lexical = self.lexical.compacted(keep)
+            self.chunks = chunks
+            self.documents = documents
+            if not chunks:
+                self.embedding_model = None
+            self.version += 1
+            self._persist()
+
+            for path in (
+                self._index_path(old_generation),
+                self._lexical_path(old_generation),
+                self._legacy_chunks_path(old_generation),
+            ):
+                if path.exists():
+                    path.unlink()
+            # Searches still holding the old table keep reading the unlinked files
+            shutil.rmtree(self._chunks_path(old_generation), ignore_errors=True)
+
+        logger.info(f"Removed document {doc_id} from {self.dir}")
+        return True
+
+    def flush(self):
+        """Write any chunks not yet on disk."""
+        with self._lock:
+            if self._persisted_rows != len(self.chunks):
+                self._persist()
+
+    def _persist(self):
+        """Write chunks, indexes and manifest (in that order). Caller holds the lock."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._fold_tail()
+
+        # 1. Chunks, appended past the committed rows
+        self.chunks.save(self.chunks_path, self._persisted_rows)
+
+        # 2. Indexes, swapped in atomically
+        if self.index is not None:
+            tmp_path = self.dir / "index.faiss.tmp"
+            faiss.write_index(self.index, str(tmp_path))
+            os.replace(tmp_path, self.index_path)
+            self.lexical.save(self._lexical_path(self.generation))
+
+        # 3. Manifest, the commit point
+        tmp_path = self.dir / "manifest.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "generation": self.generation,
+                    "documents": self.documents,
+                    "embedding_model": self.embedding_model,
+                },
+                f, indent=2
+            )
+        os.replace(tmp_path, self.manifest_path)
+
+        self._persisted_rows = len(self.chunks)
+        self._last_persist = time.monotonic()
@@ -0,0 +1,116 @@
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .embedder import Embedder
+from .embedding_cache import EmbeddingCache
+
+# sentence-transformers model run by the "local" backend
+LOCAL_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# "torch", or "onnx" to run the model with onnxruntime (needs `optimum[onnxruntime]`)
+LOCAL_RUNTIME = "torch"
+# Use int8 weights: dynamic quantization of the linear layers with torch,
+# the quantized export from the model repository with onnx
+LOCAL_QUANTIZE = False
+# Quantized ONNX file in the model repository, used when LOCAL_QUANTIZE is set
+LOCAL_ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+# CPU threads used by the model; None leaves the runtime default (all cores)
+LOCAL_THREADS: Optional[int] = None
+# Texts encoded per forward pass
+LOCAL_BATCH_SIZE = 32
+
+
+class LocalEmbedder(Embedder):
+    """
+    Embeds texts in this process with a sentence-transformers model.
+
+    Avoids the HTTP round trip and JSON encoding of every batch that the
+    Ollama backend pays, and needs no running server. The model is loaded
+    on first use. Calls are serialized: the runtime already spreads one
+    batch over `threads` cores, and concurrent batches would only compete
+    for them.
+
+    Quantized (int8) weights change the vectors slightly, so `model_id`
+    includes them: a collection indexed at one precision refuses vectors of
+    the other instead of mixing them in one index.
+    """
+
+    backend = "sentence-transformers"
+
+    def __init__(
+        self,
+        model: str = LOCAL_MODEL_NAME,
+        runtime: str = LOCAL_RUNTIME,
+        quantize: bool = LOCAL_QUANTIZE,
+        threads: Optional[int] = LOCAL_THREADS,
+        batch_size: int = LOCAL_BATCH_SIZE,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        if runtime not in ("torch", "onnx"):
+            raise ValueError(f"Unknown runtime '{runtime}', expected 'torch' or 'onnx'")
+        super().__init__(model, cache)
+        self.runtime = runtime
+        self.quantize = quantize
+        self.threads = threads
+        self.batch_size = max(1, batch_size)
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return super().model_id + ("-int8" if self.quantize else "")
+
+    @property
+    def cache_name(self) -> str:
+        """Name of the on-disk cache; quantized vectors are cached apart."""
+        return f"{super().model_id}-{self.runtime}" + ("-int8" if self.quantize else "")
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.runtime == "onnx":
+            model_kwargs = {"provider": "CPUExecutionProvider"}
+            if self.quantize:
+                model_kwargs["file_name"] = LOCAL_ONNX_INT8_FILE
+            if self.threads:
+                import onnxruntime
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = self.threads
+                model_kwargs["session_options"] = options
+            model = SentenceTransformer(self.model, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        else:
+            import torch
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            model = SentenceTransformer(self.model, device="cpu")
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        print(f"Loaded local embedding model {self.model} ({self.runtime}{', int8' if self.quantize else ''})")
+        return model
+
+    def _get_model(self):
+        if self._model is None:
+            self._model = self._load()
+        return self._model
+
+    def _embed_uncached(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> np.ndarray:
+        results = []
+        with self._lock:
+            model = self._get_model()
+            for start in range(0, len(texts), self.batch_size):
+                batch = texts[start:start + self.batch_size]
+                results.append(model.encode(
+                    batch,
+                    batch_size=len(batch),
+                    normalize_embeddings=True,
+                    convert_to_numpy=True,
+                    show_progress_bar=False,
+                ))
+                if on_progress:
+                    on_progress(len(batch))
+        return np.ascontiguousarray(np.vstack(results), dtype=np.float32)
@@ -3,13 +3,18 @@ import faiss
 from typing import Tuple, Optional
 import logging
 
+from .index_factory import search_parameters
+from ..monitoring import span
+
 logger = logging.getLogger(__name__)
 
 def search(
     index,
     query_embedding: np.ndarray,
     k: int = 5,
-    return_distances: bool = True
+    return_distances: bool = True,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None
 ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
     """
     Search the FAISS index for similar vectors.
@@ -19,6 +24,8 @@ def search(
         query_embedding: Query embedding to search with
         k: Number of nearest neighbors to return
         return_distances: Whether to return distances along with indices
+        nprobe: IVF lists to visit per query (IVF indexes only)
+        ef_search: HNSW search breadth (HNSW indexes only)
         
     Returns:
         If return_distances is True, returns a tuple of (distances, indices)
@@ -34,7 +41,9 @@ def search(
             query_embedding = query_embedding.reshape(1, -1)
             
         # Search the index
-        distances, indices = index.search(query_embedding, k)
+        params = search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+        with span("faiss_search"):
+            distances, indices = index.search(query_embedding, k, params=params)
         
         if return_distances:
             return distances[0], indices[0]
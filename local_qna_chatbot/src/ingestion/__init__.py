@@ -1,6 +1,10 @@
-from .load_data import load_dataset
+from .load_data import iter_dataset, load_dataset
 from .cleaner import clean_text
-from .chunker import chunk_text, process_records
+from .chunker import Chunk, chunk_document, chunk_text, process_records
+from .extract import DocumentText
 from .process_data import main as process_data
 
-__all__ = ['load_dataset', 'clean_text', 'chunk_text', 'process_records', 'process_data']
+__all__ = [
+    'iter_dataset', 'load_dataset', 'clean_text', 'Chunk', 'chunk_document', 'chunk_text',
+    'process_records', 'process_data', 'DocumentText'
+]
@@ -1,3 +1,204 @@
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .cleaner import clean_text
+from ..embeddings.chunk_table import ChunkTable
+
+# Chunk length and overlap between consecutive chunks, in tokens
+CHUNK_TOKENS = 512
+CHUNK_OVERLAP = 64
+# End chunks at a paragraph or sentence break in the second half of the window
+RESPECT_BOUNDARIES = True
+
+# Tokens are runs of word characters and single punctuation marks (the
+# matches of r"\w+|[^\w\s]"), a close stand-in for the word pieces an
+# embedding model counts
+_WORD_CHAR_RE = re.compile(r"\w")
+_PARAGRAPH_RE = re.compile(r"\n[^\S\n]*\n")
+_SENTENCE_RE = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+
+# Character classes of ASCII text, indexed by byte value
+_ASCII_WORD = np.array([bool(_WORD_CHAR_RE.match(chr(i))) for i in range(128)])
+_ASCII_SPACE = np.array([chr(i).isspace() for i in range(128)])
+
+
+class Chunk(NamedTuple):
+    text: str
+    # Character offsets of the chunk in the document text
+    start: int
+    end: int
+    # 1-based pages of the first and last character, None for unpaged text
+    page: Optional[int]
+    page_end: Optional[int]
+
+    def metadata(self) -> Dict[str, Optional[int]]:
+        return {"start": self.start, "end": self.end, "page": self.page, "page_end": self.page_end}
+
+
+@lru_cache(maxsize=None)
+def _bmp_classes() -> Tuple[np.ndarray, np.ndarray]:
+    """Word and whitespace lookup tables for the Basic Multilingual Plane, built on first use."""
+    chars = [chr(i) for i in range(0x10000)]
+    word = np.array([bool(_WORD_CHAR_RE.match(char)) for char in chars], dtype=bool)
+    space = np.array([char.isspace() for char in chars], dtype=bool)
+    return word, space
+
+
+def _char_classes(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Boolean arrays marking word characters and whitespace in `text`."""
+    if text.isascii():
+        codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        return _ASCII_WORD[codes], _ASCII_SPACE[codes]
+    # One code point per element, so array indices match string indices
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    bmp_word, bmp_space = _bmp_classes()
+    word = bmp_word[np.minimum(codes, 0xFFFF)]
+    space = bmp_space[np.minimum(codes, 0xFFFF)]
+    astral = np.flatnonzero(codes > 0xFFFF)
+    if len(astral):
+        # Emoji and rare scripts, classified one by one
+        word[astral] = [bool(_WORD_CHAR_RE.match(chr(code))) for code in codes[astral].tolist()]
+        space[astral] = False
+    return word, space
+
+
+def tokenize(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Locate the tokens of a text.
+
+    Characters are classified with numpy lookups (per distinct character
+    for non-ASCII text) rather than by running a regex over every token.
+
+    Returns:
+        Tuple of int64 arrays: start and end character offset of each token
+    """
+    if not text:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    word, space = _char_classes(text)
+    punct = ~(word | space)
+    word_start = word & ~np.concatenate(([False], word[:-1]))
+    word_end = word & ~np.concatenate((word[1:], [False]))
+    starts = np.flatnonzero(punct | word_start)
+    ends = np.flatnonzero(punct | word_end) + 1
+    return starts.astype(np.int64), ends.astype(np.int64)
+
+
+def chunk_document(
+    pieces: Iterable[str],
+    size: int = CHUNK_TOKENS,
+    overlap: int = CHUNK_OVERLAP,
+    respect_boundaries: bool = RESPECT_BOUNDARIES,
+    paged: bool = False
+) -> Iterator[Chunk]:
+    """
+    Split text arriving in pieces into overlapping chunks of at most `size` tokens.
+
+    Each chunk starts `overlap` tokens before the end of the previous one.
+    With `respect_boundaries`, a chunk ends at the last paragraph break in
+    the second half of its window, else at the last sentence end there,
+    else after exactly `size` tokens. Chunk text is whitespace-normalized
+    with `clean_text`; offsets refer to the concatenated, uncleaned pieces.
+
+    Only the current piece and the tokens not yet chunked are held in
+    memory, so documents of any size can be streamed through.
+
+    Args:
+        pieces: The document text in order, e.g. one piece per page
+        size: Maximum tokens per chunk
+        overlap: Tokens shared by consecutive chunks
+        respect_boundaries: Prefer paragraph and sentence breaks as chunk ends
+        paged: Each piece is a page; record page numbers on the chunks
+
+    Yields:
+        Chunk: Chunks in document order
+    """
+    if size < 1:
+        raise ValueError("Chunk size must be at least 1 token")
+    if not 0 <= overlap < size:
+        raise ValueError("Chunk overlap must be at least 0 and smaller than the chunk size")
+
+    buf = ""
+    buf_offset = 0      # document offset of buf[0]
+    tokenized = 0       # buf[:tokenized] has been tokenized
+    starts = np.empty(0, dtype=np.int64)
+    ends = np.empty(0, dtype=np.int64)
+    emitted = 0         # leading tokens that were already in the previous chunk
+    page_starts = []    # document offset at which each page begins
+
+    def make_chunk(last: int) -> Chunk:
+        start, end = buf_offset + int(starts[0]), buf_offset + int(ends[last])
+        page = page_end = None
+        if paged:
+            page = bisect_right(page_starts, start)
+            page_end = bisect_right(page_starts, end - 1)
+        return Chunk(clean_text(buf[starts[0]:ends[last]]), start, end, page, page_end)
+
+    def find_cut() -> int:
+        """Index of the last token of the next full chunk."""
+        last = size - 1
+        lo = max(size // 2, emitted)
+        if not respect_boundaries or lo >= last:
+            return last
+        # Breaks between token lo and the token after the window
+        segment_start = int(ends[lo]) - 1
+        segment = buf[segment_start:starts[size]]
+        for pattern in (_PARAGRAPH_RE, _SENTENCE_RE):
+            positions = np.fromiter((m.end() for m in pattern.finditer(segment)), dtype=np.int64)
+            if len(positions):
+                # The token ending at or before each break
+                candidates = np.searchsorted(ends, positions + segment_start, side="right") - 1
+                candidates = candidates[(candidates >= lo) & (candidates <= last)]
+                if len(candidates):
+                    return int(candidates[-1])
+        return last
+
+    def append(text: str, final: bool):
+        nonlocal buf, buf_offset, tokenized, starts, ends
+        # Drop text that every remaining token lies past
+        drop = min(int(starts[0]), tokenized) if len(starts) else tokenized
+        if paged and not final:
+            page_starts.append(buf_offset + len(buf))
+        buf = buf[drop:] + text
+        buf_offset += drop
+        tokenized -= drop
+        starts, ends = starts - drop, ends - drop
+
+        new_starts, new_ends = tokenize(buf[tokenized:])
+        new_starts += tokenized
+        new_ends += tokenized
+        end_of_tokens = len(buf)
+        # The last token may continue in the next piece
+        if not final and len(new_ends) and new_ends[-1] == len(buf):
+            end_of_tokens = int(new_starts[-1])
+            new_starts, new_ends = new_starts[:-1], new_ends[:-1]
+        starts = np.concatenate((starts, new_starts))
+        ends = np.concatenate((ends, new_ends))
+        tokenized = end_of_tokens
+
+    def full_chunks() -> Iterator[Chunk]:
+        nonlocal starts, ends, emitted
+        # One token past the window must be known to see the break after it
+        while len(starts) > size:
+            last = find_cut()
+            yield make_chunk(last)
+            next_start = max(last + 1 - overlap, 1)
+            emitted = last + 1 - next_start
+            starts, ends = starts[next_start:], ends[next_start:]
+
+    for piece in pieces:
+        append(piece, final=False)
+        yield from full_chunks()
+
+    append("", final=True)
+    yield from full_chunks()
+    if len(starts) > emitted:
+        yield make_chunk(len(starts) - 1)
+
+
 def chunk_text(text, size=500):
     words = text.split()
     chunks = []
@@ -6,12 +207,21 @@ def chunk_text(text, size=500):
         chunks.append(chunk)
     return chunks
 
-def process_records(records):
-    dataset = []
-    chunk_id = 1
+def process_records(records, batch_size: int = 4096) -> ChunkTable:
+    """
+    Chunk dataset records into a columnar chunk table, row i being chunk id i + 1.
+
+    Chunks are added to the table `batch_size` at a time, so no per-chunk
+    dicts are kept around.
+    """
+    table = ChunkTable()
+    texts, metadata = [], []
     for r in records:
-        chunks = chunk_text(r["text"])
-        for c in chunks:
-            dataset.append({"id": chunk_id, "text": c})
-            chunk_id += 1
-    return dataset
+        for c in chunk_document([r["text"]]):
+            texts.append(c.text)
+            metadata.append({"start": c.start, "end": c.end})
+            if len(texts) >= batch_size:
+                table.append(texts, metadata)
+                texts, metadata = [], []
+    table.append(texts, metadata)
+    return table
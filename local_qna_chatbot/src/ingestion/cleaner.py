@@ -1,6 +1,3 @@
-import re
-
 def clean_text(text):
-    text = text.strip()
-    text = re.sub(r"\s+", " ", text)
-    return text
+    # Same result as stripping and collapsing r"\s+" to one space, several times faster
+    return " ".join(text.split())
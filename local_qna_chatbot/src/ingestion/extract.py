@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+# Pages parsed per task sent to a worker process
+PAGES_PER_TASK = 4
+# Worker processes parsing one PDF; None uses every core
+EXTRACT_WORKERS: Optional[int] = None
+# PDFs with fewer pages are parsed in the calling process
+MIN_PARALLEL_PAGES = 16
+# Characters read at a time from text files
+TEXT_BLOCK_SIZE = 1 << 20
+
+# Set in each worker process by _init_worker
+_worker_reader = None
+
+
+def _init_worker(path: str):
+    global _worker_reader
+    from pypdf import PdfReader
+    _worker_reader = PdfReader(path)
+
+
+def _extract_pages(start: int, stop: int) -> List[str]:
+    return [_worker_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+class DocumentText:
+    """
+    Text of an uploaded document, produced piece by piece.
+
+    Iterating yields the text in order: one piece per PDF page, or one
+    block at a time for text files, so the whole document is never held in
+    memory. Large PDFs are parsed by a pool of worker processes that stay
+    a bounded number of pages ahead of the consumer; pages are still
+    yielded in order, and the consumer can embed earlier pages while later
+    ones are being parsed.
+
+    `paged` tells whether each piece is a page. `progress` is the
+    fraction of the document read so far. Use as a
+    context manager (or call `close`) to stop the workers early.
+    """
+
+    def __init__(self, file_path: str, workers: Optional[int] = EXTRACT_WORKERS):
+        self.path = Path(file_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.paged = self.path.suffix.lower() == ".pdf"
+        self.progress = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "DocumentText":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            if self.paged:
+                yield from self._pdf_pages()
+            else:
+                yield from self._text_blocks()
+        except Exception as e:
+            raise ValueError(f"Could not read file {self.path.name}: {e}")
+        self.progress = 1.0
+
+    def _text_blocks(self) -> Iterator[str]:
+        size = max(1, self.path.stat().st_size)
+        with open(self.path, "r", encoding="utf-8") as f:
+            for block in iter(lambda: f.read(TEXT_BLOCK_SIZE), ""):
+                # Position is in bytes, close enough for a progress estimate
+                self.progress = min(f.buffer.tell() / size, 1.0)
+                yield block
+
+    def _pdf_pages(self) -> Iterator[str]:
+        from pypdf import PdfReader
+        reader = PdfReader(self.path)
+        total = len(reader.pages)
+
+        if total < MIN_PARALLEL_PAGES or self.workers < 2:
+            for i, page in enumerate(reader.pages):
+                self.progress = (i + 1) / total
+                yield (page.extract_text() or "") + "\n"
+            return
+
+        # Each worker opens the file once and parses page ranges from it
+        del reader
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(str(self.path),)
+        )
+        ranges = deque(
+            (start, min(start + PAGES_PER_TASK, total))
+            for start in range(0, total, PAGES_PER_TASK)
+        )
+        pending = deque()
+        done = 0
+        try:
+            while ranges or pending:
+                # Stay two tasks per worker ahead, bounding parsed-but-unused text
+                while ranges and len(pending) < 2 * self.workers:
+                    pending.append(self._executor.submit(_extract_pages, *ranges.popleft()))
+                for text in pending.popleft().result():
+                    done += 1
+                    self.progress = done / total
+                    yield text + "\n"
+        except BrokenProcessPool as e:
+            print(f"PDF worker pool failed ({e}), parsing the remaining pages in-process")
+        else:
+            return
+        finally:
+            self.close()
+
+        reader = PdfReader(self.path)
+        for i in range(done, total):
+            self.progress = (i + 1) / total
+            yield (reader.pages[i].extract_text() or "") + "\n"
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .chunker import chunk_document
+from .cleaner import clean_text
+from ..embeddings.chunk_table import ChunkTable
+
+# Files next to the chunk table in the processed directory
+RECORDS_FILE = "records.json"
+CHUNK_HASHES_FILE = "chunk_hashes.npy"
+# Chunk hash of rows whose chunk no longer exists
+DELETED = 0
+# Records sent to a worker process at once; fewer, larger tasks keep the
+# pickling overhead low
+RECORDS_PER_TASK = 64
+# Records read, cleaned and chunked per step of the pipeline
+BATCH_RECORDS = 2048
+# New chunks held in memory before they are written to the table
+FLUSH_ROWS = 16384
+
+
+def content_hash(text: str) -> str:
+    """Fingerprint of a source record's text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def chunk_hash(text: str) -> int:
+    """64-bit fingerprint of a chunk's text; never DELETED."""
+    value = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class StageTimer:
+    """Wall-clock time of the stages of a build, reported at the end."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+
+    def report(self) -> str:
+        total = sum(self.seconds.values())
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.seconds.items()) + f" (total {total:.2f}s)"
+
+
+class ChunkState(NamedTuple):
+    """Processed chunks and the fingerprints they were made from."""
+    table: ChunkTable
+    # Chunk hash of every table row, DELETED for rows no record uses anymore
+    hashes: np.ndarray
+    # Record key -> {"hash": record content hash, "rows": table rows of its chunks}
+    records: Dict[str, Dict]
+
+
+class UpdateStats(NamedTuple):
+    unchanged: int
+    changed: int
+    added: int
+    removed: int
+    new_chunks: int
+    deleted_chunks: int
+
+
+def load_state(processed_dir: Path) -> Optional[ChunkState]:
+    """
+    Load the chunks and fingerprints of the previous run.
+
+    Returns:
+        ChunkState, or None if there is no complete previous run
+    """
+    processed_dir = Path(processed_dir)
+    records_path = processed_dir / RECORDS_FILE
+    hashes_path = processed_dir / CHUNK_HASHES_FILE
+    if not (records_path.exists() and hashes_path.exists() and (processed_dir / "chunks").exists()):
+        return None
+    with open(records_path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    hashes = np.load(hashes_path)
+    # Rows past the hashes were written by a run that did not finish
+    table = ChunkTable.open(processed_dir / "chunks", rows=len(hashes))
+    return ChunkState(table, np.array(hashes, dtype=np.uint64), records)
+
+
+def hashes_fingerprint(hashes: np.ndarray) -> str:
+    """Digest of a chunk hashes array, naming one version of the chunk table."""
+    return hashlib.blake2b(np.ascontiguousarray(hashes, dtype=np.uint64).tobytes(), digest_size=16).hexdigest()
+
+
+def _prepare(text: str, known_hash: Optional[str]) -> Tuple[str, Optional[List[Tuple[str, int, int, int]]]]:
+    """
+    Clean one record and chunk it unless its content is `known_hash`; runs in worker processes.
+
+    Returns:
+        (content hash of the cleaned text, chunks as (text, start, end, chunk hash) or None)
+    """
+    text = clean_text(text)
+    digest = content_hash(text)
+    if digest == known_hash:
+        return digest, None
+    return digest, [(c.text, c.start, c.end, chunk_hash(c.text)) for c in chunk_document([text])]
+
+
+def _batches(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def update_chunks(
+    records: Iterable[Dict],
+    state: Optional[ChunkState],
+    executor: Optional[Executor] = None,
+    on_batch: Optional[Callable[[ChunkTable], None]] = None,
+    batch_records: int = BATCH_RECORDS,
+    timer: Optional[StageTimer] = None,
+) -> Tuple[ChunkState, UpdateStats]:
+    """
+    Bring the chunks up to date with the source records.
+
+    Records are consumed lazily, `batch_records` at a time: each batch is
+    cleaned, fingerprinted and chunked (in the pool if there is one), its
+    new chunks are appended to the table and `on_batch` is called, which
+    can write them out. Only the per-record fingerprints and one hash per
+    chunk accumulate.
+
+    Records whose content hash is unchanged keep their rows untouched.
+    Changed and new records are chunked again; a chunk with the same text
+    and offsets as one the record had before keeps that row (and so its
+    id and embedding), the others are appended as new rows. Rows are never
+    renumbered: the rows of chunks that disappeared are marked DELETED.
+
+    Args:
+        records: Raw source records with "text" and optional "id"
+        state: Result of the previous run, or None to start from scratch
+        executor: Process pool to clean and chunk the records in; rows are
+            assigned in record order either way, so the result does not
+            depend on it
+        on_batch: Called with the table after each batch has been appended
+        batch_records: Records per batch
+        timer: Records time spent loading, cleaning and chunking, and in `on_batch`
+
+    Returns:
+        The updated state and counts of what changed
+    """
+    if state is None:
+        state = ChunkState(ChunkTable(), np.empty(0, dtype=np.uint64), {})
+    timer = timer or StageTimer()
+    table, old_hashes, previous = state
+    starts, ends = table.column("start"), table.column("end")
+
+    new_records = {}
+    hash_batches = [old_hashes]
+    unchanged = changed = added = new_chunks = 0
+    batches = _batches(records, batch_records)
+    while True:
+        with timer.stage("load"):
+            batch = next(batches, None)
+        if batch is None:
+            break
+        # Records with an id are checked against their previous version in
+        # the worker, which then skips chunking unchanged ones
+        id_keys = []
+        for record in batch:
+            key = None
+            if record.get("id") is not None:
+                key = f"id:{record['id']}"
+                while key in new_records or key in id_keys:
+                    # Duplicate ids still need distinct keys
+                    key += "+"
+            id_keys.append(key)
+        raw_texts = [record["text"] for record in batch]
+        known = [previous.get(key, {}).get("hash") for key in id_keys]
+        if executor is not None:
+            prepared = executor.map(_prepare, raw_texts, known, chunksize=RECORDS_PER_TASK)
+        else:
+            prepared = map(_prepare, raw_texts, known)
+
+        texts, metadata, new_hashes = [], [], []
+        with timer.stage("clean and chunk"):
+            for key, (digest, chunks) in zip(id_keys, prepared):
+                # Records without an id are keyed by their cleaned content
+                if key is None:
+                    key = f"hash:{digest}"
+                    while key in new_records:
+                        key += "+"
+                old = previous.get(key)
+                if old is not None and old["hash"] == digest:
+                    new_records[key] = old
+                    unchanged += 1
+                    continue
+
+                # Chunks of the old version that can be kept, by (hash, start, end)
+                reusable: Dict[Tuple[int, int, int], List[int]] = {}
+                if old is not None:
+                    changed += 1
+                    for row in old["rows"]:
+                        reusable.setdefault((int(old_hashes[row]), int(starts[row]), int(ends[row])), []).append(row)
+                else:
+                    added += 1
+
+                rows = []
+                for text, start, end, digest_chunk in chunks:
+                    kept = reusable.get((digest_chunk, start, end))
+                    if kept:
+                        rows.append(kept.pop(0))
+                        continue
+                    rows.append(len(table) + len(texts))
+                    texts.append(text)
+                    metadata.append({"start": start, "end": end})
+                    new_hashes.append(digest_chunk)
+                new_records[key] = {"hash": digest, "rows": rows}
+
+        table.append(texts, metadata)
+        hash_batches.append(np.asarray(new_hashes, dtype=np.uint64))
+        new_chunks += len(texts)
+        if on_batch is not None:
+            with timer.stage("write"):
+                on_batch(table)
+
+    hashes = np.concatenate(hash_batches)
+    live = np.zeros(len(hashes), dtype=bool)
+    for entry in new_records.values():
+        live[entry["rows"]] = True
+    deleted = np.flatnonzero(~live & (hashes != DELETED))
+    hashes[deleted] = DELETED
+
+    stats = UpdateStats(
+        unchanged=unchanged,
+        changed=changed,
+        added=added,
+        removed=len(previous.keys() - new_records.keys()),
+        new_chunks=new_chunks,
+        deleted_chunks=len(deleted),
+    )
+    return ChunkState(table, hashes, new_records), stats
+
+
+def _write_atomic(path: Path, write: Callable):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def update_processed(
+    records: Iterable[Dict],
+    processed_dir: Path,
+    full: bool = False,
+    executor: Optional[Executor] = None,
+    flush_rows: int = FLUSH_ROWS,
+    timer: Optional[StageTimer] = None,
+) -> UpdateStats:
+    """
+    Update the processed data in `processed_dir` from a stream of raw records.
+
+    New chunks are written to the chunk table whenever `flush_rows` of them
+    are pending, so memory does not grow with the input. The table is
+    appended to in place (readers only see rows covered by the chunk
+    hashes, which are written at the end); a full rebuild is written next
+    to the old table and swapped in once complete.
+
+    Args:
+        records: Raw source records with "text" and optional "id"
+        processed_dir: Directory of the processed data
+        full: Rechunk everything into a fresh, compact table
+        executor: Process pool to clean and chunk in (see `update_chunks`)
+        flush_rows: New chunks kept in memory before they are written
+        timer: Records the time spent in each stage
+
+    Returns:
+        Counts of what changed
+    """
+    processed_dir = Path(processed_dir)
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    chunks_dir = processed_dir / "chunks"
+    state = None if full else load_state(processed_dir)
+    if state is None:
+        table_dir = chunks_dir.with_name(chunks_dir.name + ".tmp")
+        if table_dir.exists():
+            shutil.rmtree(table_dir)
+    else:
+        table_dir = chunks_dir
+    saved_rows = len(state.table) if state is not None else 0
+
+    def flush(table: ChunkTable, force: bool = False):
+        nonlocal saved_rows
+        # The first save creates the table files, even for an empty table
+        if len(table) - saved_rows >= flush_rows or (force and len(table) > saved_rows) or not table_dir.exists():
+            table.save(table_dir, saved_rows)
+            saved_rows = len(table)
+
+    timer = timer or StageTimer()
+    state, stats = update_chunks(records, state, executor, on_batch=flush, timer=timer)
+    with timer.stage("write"):
+        flush(state.table, force=True)
+        _finish(state, processed_dir, table_dir)
+    return stats
+
+
+def _finish(state: ChunkState, processed_dir: Path, table_dir: Path):
+    """Swap a rebuilt table in, then write the chunk hashes and record fingerprints."""
+    chunks_dir = processed_dir / "chunks"
+    if table_dir != chunks_dir:
+        old_dir = chunks_dir.with_name(chunks_dir.name + ".old")
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+        if chunks_dir.exists():
+            os.replace(chunks_dir, old_dir)
+        os.replace(table_dir, chunks_dir)
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+    # Table first (readers map it up to their own row count), then the
+    # hashes that make its new rows count, then the records
+    _write_atomic(processed_dir / CHUNK_HASHES_FILE, lambda f: np.save(f, state.hashes))
+    _write_atomic(
+        processed_dir / RECORDS_FILE,
+        lambda f: f.write(json.dumps(state.records).encode("utf-8"))
+    )
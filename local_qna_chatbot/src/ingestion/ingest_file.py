@@ -1,74 +1,72 @@
-import os
-from pathlib import Path
-from typing import Tuple, List, Dict
+import hashlib
+from typing import Iterator, Tuple, List
 import numpy as np
-import faiss
-from ..ingestion.cleaner import clean_text
-from ..ingestion.chunker import chunk_text
-from ..embeddings.embedder import get_embedding
+from ..ingestion.chunker import Chunk, chunk_document
+from ..ingestion.extract import DocumentText
+from ..embeddings.embedder import get_embeddings
+from ..monitoring import count, span
 
-def process_uploaded_file(file_path: str) -> Tuple[faiss.Index, List[Dict]]:
+def file_fingerprint(file_path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def iter_chunks(document: DocumentText) -> Iterator[Chunk]:
+    """
+    Chunk a document as its text is read.
+    
+    Args:
+        document: The document to read
+        
+    Yields:
+        Chunk: Cleaned chunk text with character and page offsets, each as
+        soon as it is complete
+    """
+    return chunk_document(document, paged=document.paged)
+
+def chunk_uploaded_file(file_path: str) -> List[str]:
     """
-    Process an uploaded file: read, clean, chunk, embed, and build FAISS index.
+    Read, clean and chunk an uploaded file.
     
     Args:
         file_path: Path to the uploaded file
         
     Returns:
-        Tuple containing:
-            - faiss.Index: The built FAISS index
-            - List[Dict]: List of chunks with metadata [{"id": 1, "text": "..."}]
+        List[str]: The chunk texts
     """
-    path = Path(file_path)
-    text = ""
-    
-    # Read file based on extension
-    try:
-        if path.suffix.lower() == ".txt":
-            with open(path, "r", encoding="utf-8") as f:
-                text = f.read()
-        elif path.suffix.lower() == ".pdf":
-            from pypdf import PdfReader
-            reader = PdfReader(path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        else:
-             # Try reading as text
-            with open(path, "r", encoding="utf-8") as f:
-                text = f.read()
-    except Exception as e:
-        raise ValueError(f"Could not read file {path.name}: {e}")
+    with span("chunk_document"), DocumentText(file_path) as document:
+        chunks = [chunk.text for chunk in iter_chunks(document)]
 
-    if not text.strip():
+    count("document_chunks", len(chunks))
+    if not chunks:
         raise ValueError("File is empty")
+    return chunks
 
-    # Clean
-    cleaned_text = clean_text(text)
-    
-    # Chunk
-    chunks = chunk_text(cleaned_text)
+def embed_uploaded_file(file_path: str) -> Tuple[np.ndarray, List[str]]:
+    """
+    Read, clean, chunk and embed an uploaded file.
     
-    # Create dataset structure
-    dataset = []
-    embeddings = []
+    Args:
+        file_path: Path to the uploaded file
+        
+    Returns:
+        Tuple containing:
+            - np.ndarray: float32 embeddings, one row per chunk
+            - List[str]: The chunk texts, aligned with the embedding rows
+    """
+    chunks = chunk_uploaded_file(file_path)
     
     print(f"Generating embeddings for {len(chunks)} chunks...")
-    for i, chunk in enumerate(chunks):
-        try:
-            emb = get_embedding(chunk)
-            embeddings.append(emb)
-            dataset.append({"id": i + 1, "text": chunk})
-        except Exception as e:
-            print(f"Error embedding chunk {i}: {e}")
-            
-    if not embeddings:
+    try:
+        with span("embed_document"):
+            embeddings_np = get_embeddings(chunks)
+    except Exception as e:
+        raise ValueError(f"Could not generate embeddings: {e}")
+
+    if len(embeddings_np) == 0:
         raise ValueError("No embeddings were generated")
-        
-    # Build FAISS Index
-    embeddings_np = np.array(embeddings, dtype=np.float32)
-    dimension = embeddings_np.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings_np)
-    
-    return index, dataset
+
+    return embeddings_np, chunks
@@ -0,0 +1,216 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# Uploads waiting for a worker; further uploads are rejected until one starts
+MAX_PENDING_JOBS = 16
+# Documents ingested at the same time (each already embeds concurrently)
+INGEST_WORKERS = 1
+# Finished jobs kept around for status queries
+MAX_FINISHED_JOBS = 100
+
+
+class IngestionCancelled(Exception):
+    """Raised inside an ingestion when its job has been cancelled."""
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has no room for another job."""
+
+
+class IngestionJob:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(
+        self,
+        pipeline,
+        file_path: str,
+        filename: str,
+        cleanup: bool = True,
+        collection_id: Optional[str] = None,
+        on_done: Optional[Callable[[], None]] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.pipeline = pipeline
+        self.file_path = file_path
+        self.filename = filename
+        self.cleanup = cleanup
+        self.collection_id = collection_id
+        self.on_done = on_done
+        self.status = self.QUEUED
+        self.total_chunks: Optional[int] = None
+        self.total_exact = False
+        self.embedded_chunks = 0
+        self.error: Optional[str] = None
+        self.document: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.COMPLETED, self.FAILED, self.CANCELLED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status and progress as a JSON-serializable dict."""
+        throughput = None
+        eta = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            if elapsed > 0 and self.embedded_chunks:
+                throughput = self.embedded_chunks / elapsed
+                if self.total_chunks is not None and not self.finished:
+                    eta = (self.total_chunks - self.embedded_chunks) / throughput
+
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "collection_id": self.collection_id,
+            "status": self.status,
+            "total_chunks": self.total_chunks,
+            "total_is_estimate": self.total_chunks is not None and not self.total_exact,
+            "embedded_chunks": self.embedded_chunks,
+            "progress": (
+                self.embedded_chunks / self.total_chunks if self.total_chunks else None
+            ),
+            "chunks_per_second": round(throughput, 2) if throughput else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionQueue:
+    """
+    Bounded background queue that ingests uploaded documents.
+
+    `submit` returns immediately with a job; worker threads run
+    `pipeline.ingest_document` for each job in turn, reporting progress on
+    the job object. Queued and running jobs can be cancelled.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_JOBS, workers: int = INGEST_WORKERS):
+        self._queue: "queue.Queue[IngestionJob]" = queue.Queue(maxsize=max_pending)
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"ingest-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        pipeline,
+        file_path: str,
+        filename: str,
+        cleanup: bool = True,
+        collection_id: Optional[str] = None,
+        on_done: Optional[Callable[[], None]] = None
+    ) -> IngestionJob:
+        """
+        Queue a document for ingestion.
+
+        Args:
+            pipeline: RAGPipeline the document is added to
+            file_path: Path of the (temporary) uploaded file
+            filename: Original name of the document
+            cleanup: Delete `file_path` once the job has finished
+            collection_id: Collection the document belongs to, for reporting
+            on_done: Called once the job has finished, however it ended.
+                Not called if the job is rejected.
+
+        Raises:
+            QueueFullError: If MAX_PENDING_JOBS jobs are already waiting
+        """
+        job = IngestionJob(
+            pipeline, file_path, filename,
+            cleanup=cleanup, collection_id=collection_id, on_done=on_done
+        )
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError("Too many uploads are waiting to be processed. Please try again later.")
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Cancel a job. A queued job never starts; a running job stops before
+        its next batch and its partially indexed chunks are removed.
+        """
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_event.set()
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: IngestionJob):
+        def on_total(total: int, exact: bool):
+            job.total_chunks = total
+            job.total_exact = exact
+
+        def on_progress(count: int):
+            job.embedded_chunks += count
+
+        job.started_at = time.time()
+        try:
+            if job.cancel_event.is_set():
+                raise IngestionCancelled()
+            job.status = IngestionJob.RUNNING
+            print(f"Ingesting '{job.filename}' (job {job.id})")
+            job.document = job.pipeline.ingest_document(
+                job.file_path,
+                document_name=job.filename,
+                on_total=on_total,
+                on_progress=on_progress,
+                cancel_event=job.cancel_event
+            )
+            job.status = IngestionJob.COMPLETED
+        except IngestionCancelled:
+            job.status = IngestionJob.CANCELLED
+            print(f"Ingestion of '{job.filename}' cancelled (job {job.id})")
+        except Exception as e:
+            job.status = IngestionJob.FAILED
+            job.error = str(e)
+            print(f"Error ingesting '{job.filename}' (job {job.id}): {e}")
+        finally:
+            job.finished_at = time.time()
+            if job.cleanup and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            if job.on_done is not None:
+                job.on_done()
@@ -1,5 +1,15 @@
 import json
 import os
+from typing import Dict, Iterator
+
+# Characters read from the file at a time when streaming a JSON array
+READ_SIZE = 1 << 20
+# Most characters one array item may take; text that still does not decode
+# at this length is reported as invalid instead of being read on into memory
+MAX_ITEM_SIZE = 64 << 20
+# Characters that can continue a number cut off at the end of the buffer
+# ("1." of "1.5", "2e+" of "2e+10"); a number decodes without them
+_NUMBER_TAIL = frozenset(".eE+-")
 
 def load_json(path):
     if not os.path.exists(path):
@@ -7,14 +17,96 @@ def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def iter_json(path) -> Iterator:
+    """
+    Yield the items of a top-level JSON array, or the lines of a JSON Lines
+    file, one at a time without reading the whole file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If the file is not valid JSON or JSON Lines, or an
+            array item is longer than MAX_ITEM_SIZE characters
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(READ_SIZE).lstrip("\ufeff")
+        start = len(buffer) - len(buffer.lstrip())
+        if buffer[start:start + 1] != "[":
+            # JSON Lines: one value per non-empty line
+            # Split on "\n" only, like reading the file line by line:
+            # splitlines() also breaks at U+2028 and other characters JSON
+            # strings may hold unescaped
+            lines = (buffer + f.readline()).split("\n")
+            if not lines[-1]:
+                lines.pop()
+            for number, line in enumerate(_lines(lines, f), 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"{path}, line {number}: {e}") from e
+            return
+
+        pos = start + 1
+        eof = False
+        expect_item = True
+        while True:
+            # Skip to the next item, the separating comma or the closing bracket
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file inside the top-level array")
+                buffer, pos, eof = _refill(f, buffer, pos)
+                continue
+            if buffer[pos] == "]":
+                return
+            if not expect_item:
+                if buffer[pos] != ",":
+                    raise ValueError(f"{path}: expected ',' or ']' between array items")
+                pos += 1
+                expect_item = True
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof or len(buffer) - pos > MAX_ITEM_SIZE:
+                    raise ValueError(f"{path}: {e}") from e
+                buffer, pos, eof = _refill(f, buffer, pos)
+                continue
+            if not eof and len(buffer) - end <= 2 and _NUMBER_TAIL.issuperset(buffer[end:]):
+                # A value cut off at the end of the buffer (a number, say)
+                # can decode as a shorter one; decode it again with more text
+                buffer, pos, eof = _refill(f, buffer, pos)
+                continue
+            yield item
+            pos = end
+            expect_item = False
+
+def _lines(first: list, f) -> Iterator[str]:
+    yield from first
+    yield from f
+
+def _refill(f, buffer: str, pos: int):
+    """Drop the consumed text and read more; reads grow with the pending text so long items stay linear."""
+    pending = buffer[pos:]
+    more = f.read(min(max(READ_SIZE, len(pending)), MAX_ITEM_SIZE + 1))
+    return pending + more, 0, not more
+
+def _to_record(item: Dict) -> Dict:
+    text = ""
+    if "question" in item:
+        text += item["question"] + " "
+    if "answer" in item:
+        text += item["answer"]
+    return {"id": item.get("id"), "text": text}
+
+def iter_dataset(raw_path="../data/raw/dataset.json") -> Iterator[Dict]:
+    """Yield {"id", "text"} records from a JSON array or JSON Lines Q&A dump, one at a time."""
+    for item in iter_json(raw_path):
+        yield _to_record(item)
+
 def load_dataset(raw_path="../data/raw/dataset.json"):
-    data = load_json(raw_path)
-    records = []
-    for item in data:
-        text = ""
-        if "question" in item:
-            text += item["question"] + " "
-        if "answer" in item:
-            text += item["answer"]
-        records.append({"id": item.get("id"), "text": text})
-    return records
+    return list(iter_dataset(raw_path))
@@ -1,39 +1,43 @@
-import sys
+import argparse
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Add the project root to the Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from src.ingestion.load_data import load_dataset
-from src.ingestion.cleaner import clean_text
-from src.ingestion.chunker import process_records
+from src.ingestion.load_data import iter_dataset
+from src.ingestion.incremental import StageTimer, update_processed
 
 def main():
-    # Ensure the processed directory exists
+    parser = argparse.ArgumentParser(description="Clean and chunk the dataset, updating only changed records.")
+    parser.add_argument("--input", default="../data/raw/dataset.json",
+                        help="Q&A dataset as a JSON array or JSON Lines")
+    parser.add_argument("--full", action="store_true",
+                        help="Rechunk every record and write a compact table with fresh chunk ids")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes that clean and chunk records (1 runs everything in this process)")
+    args = parser.parse_args()
+    timer = StageTimer()
+
     processed_dir = Path("data/processed")
-    processed_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Load and process the dataset
-    print("Loading dataset...")
-    records = load_dataset()
-    
-    # Clean the text
-    print("Cleaning text...")
-    for record in records:
-        record["text"] = clean_text(record["text"])
-    
-    # Chunk the text
-    print("Chunking text...")
-    processed_data = process_records(records)
-    
-    # Save the processed data
-    output_path = processed_dir / "processed_data.json"
-    import json
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(processed_data, f, indent=2)
+
+    # Records stream from the file through cleaning and chunking into the
+    # chunk table; unchanged records keep their chunks and ids
+    print(f"Processing {args.input}...")
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    try:
+        stats = update_processed(iter_dataset(args.input), processed_dir, args.full, executor, timer=timer)
+    finally:
+        if executor is not None:
+            executor.shutdown()
     
-    print(f"Processed data saved to {output_path}")
+    print(
+        f"Records: {stats.unchanged} unchanged, {stats.changed} changed, {stats.added} added, "
+        f"{stats.removed} removed. Chunks: {stats.new_chunks} new, {stats.deleted_chunks} deleted."
+    )
+    print(f"Processed data saved to {processed_dir} with {args.workers} worker(s): {timer.report()}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,9 @@
+from .metrics import (
+    Trace, count, current_trace, event, finish_trace, latency_summary, record, render_prometheus, span, start_trace,
+    trace_request, use_trace
+)
+
+__all__ = [
+    'Trace', 'count', 'current_trace', 'event', 'finish_trace', 'latency_summary', 'record', 'render_prometheus',
+    'span', 'start_trace', 'trace_request', 'use_trace'
+]
@@ -0,0 +1,289 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+
+# Record stage timings and counts; when off, `span` and `count` return at once
+ENABLE_METRICS = True
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upper bounds of the histogram buckets of per-request counts (chunks, tokens)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, one series per label value.
+
+    An observation is a bisect and three additions under a lock, cheap
+    enough for every request.
+    """
+
+    def __init__(self, name: str, help: str, label: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # Bucket counts (the last one is +Inf), sum, count
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def summary(self, quantiles: Sequence[float] = (0.5, 0.95)) -> Dict[str, Dict[str, float]]:
+        """
+        Count and quantiles of every series, estimated from the buckets as
+        Prometheus' histogram_quantile does (linear within a bucket).
+        """
+        with self._lock:
+            series = {key: (list(counts), n) for key, (counts, _, n) in self._series.items()}
+        result = {}
+        for label_value, (counts, n) in sorted(series.items()):
+            row = {"count": n}
+            for q in quantiles:
+                row[f"p{round(q * 100)}"] = _bucket_quantile(self.buckets, counts, n, q)
+            result[label_value] = row
+        return result
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {key: (list(counts), total, n) for key, (counts, total, n) in self._series.items()}
+        for label_value, (counts, total, n) in sorted(series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}'
+            yield f"{self.name}_sum{{{label}}} {total}"
+            yield f"{self.name}_count{{{label}}} {n}"
+
+
+class Counter:
+    """Monotonic counter, one series per label value."""
+
+    def __init__(self, name: str, help: str, label: str):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for label_value, value in sorted(values.items()):
+            yield f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}'
+
+
+def _bucket_quantile(buckets: Sequence[float], counts: list, n: int, q: float) -> float:
+    rank = q * n
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            if i == len(buckets):
+                # In the +Inf bucket: the largest finite bound is all we know
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return 0.0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent in each pipeline stage.", "stage", LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end time of API requests.", "endpoint", LATENCY_BUCKETS)
+ITEMS = Histogram("rag_items", "Items handled per operation (chunks, tokens, batch sizes).", "item", COUNT_BUCKETS)
+EVENTS = Counter("rag_events_total", "Events such as cache hits and errors.", "event")
+_METRICS = (REQUEST_SECONDS, STAGE_SECONDS, ITEMS, EVENTS)
+
+
+class Trace:
+    """Stage timings and counts of one request, for its timing breakdown."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+        self.events: Dict[str, int] = {}
+
+    def merge(self, other: "Trace"):
+        """Add the stages, counts and events of `other`, e.g. of a batch this request took part in."""
+        for mine, theirs in ((self.stages, other.stages), (self.counts, other.counts), (self.events, other.events)):
+            for key, value in theirs.items():
+                mine[key] = mine.get(key, 0) + value
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()},
+            "counts": dict(self.counts),
+            "events": dict(self.events),
+        }
+
+
+# Trace of the request being handled; copied into asyncio tasks and
+# asyncio.to_thread workers, so stages run there are recorded too
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("rag_trace", default=None)
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage: str):
+    """
+    Context manager timing a pipeline stage into `rag_stage_seconds` and
+    the current request's trace. Stages entered repeatedly in a request
+    add up.
+    """
+    if not ENABLE_METRICS:
+        return _NO_SPAN
+    return _Span(stage)
+
+
+def record(stage: str, seconds: float):
+    """Record a stage timed elsewhere, e.g. durations reported by Ollama."""
+    if not ENABLE_METRICS:
+        return
+    STAGE_SECONDS.observe(stage, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.stages[stage] = trace.stages.get(stage, 0.0) + seconds
+
+
+def count(item: str, value: float):
+    """
+    Record how many items an operation handled (e.g. chunks retrieved,
+    tokens generated). Zero is not recorded, so it does not pull the
+    quantiles down or show up in a trace as a count.
+    """
+    if not ENABLE_METRICS or not value:
+        return
+    ITEMS.observe(item, value)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.counts[item] = trace.counts.get(item, 0) + value
+
+
+def event(name: str):
+    """Count an event such as a cache hit."""
+    if not ENABLE_METRICS:
+        return
+    EVENTS.inc(name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.events[name] = trace.events.get(name, 0) + 1
+
+
+def current_trace() -> Optional[Trace]:
+    """Trace of the request being handled, None outside a request or when metrics are off."""
+    return _current_trace.get() if ENABLE_METRICS else None
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]) -> Iterator[None]:
+    """Record into `trace` inside the block, e.g. on a worker thread serving a request."""
+    token = _current_trace.set(trace)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+
+def start_trace() -> Optional[Trace]:
+    """
+    New Trace for a request (None when metrics are off), for requests whose
+    work outlives the handler, such as streamed answers: record into it with
+    `use_trace` around each step and call `finish_trace` when done.
+    """
+    return Trace() if ENABLE_METRICS else None
+
+
+def finish_trace(endpoint: str, trace: Optional[Trace]):
+    """Record the total time of a request traced with `start_trace` in `rag_request_seconds`."""
+    if trace is not None:
+        REQUEST_SECONDS.observe(endpoint, time.perf_counter() - trace.started)
+
+
+@contextmanager
+def trace_request(endpoint: str) -> Iterator[Optional[Trace]]:
+    """
+    Trace one API request: yields its Trace (None when metrics are off)
+    and records its total time in `rag_request_seconds`.
+
+    Not for async generators: the block must not span a `yield`, since the
+    context can differ when the generator resumes or is closed.
+    """
+    trace = start_trace()
+    try:
+        with use_trace(trace):
+            yield trace
+    finally:
+        finish_trace(endpoint, trace)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def latency_summary() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Request and stage latency quantiles in milliseconds, e.g. the p50 of
+    cold-start and warm generation (stages generate_cold, generate_warm).
+    """
+    def in_ms(rows):
+        return {
+            label: {key: value if key == "count" else round(value * 1000, 1) for key, value in row.items()}
+            for label, row in rows.items()
+        }
+    return {"requests": in_ms(REQUEST_SECONDS.summary()), "stages": in_ms(STAGE_SECONDS.summary())}
@@ -1,5 +1,6 @@
 from .retriever import retrieve_relevant_context
 from .generator import generate_response
 from .pipeline import RAGPipeline
+from .collections import CollectionRegistry
 
-__all__ = ['retrieve_relevant_context', 'generate_response', 'RAGPipeline']
+__all__ = ['retrieve_relevant_context', 'generate_response', 'RAGPipeline', 'CollectionRegistry']
@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+# Cache answers to repeated questions instead of generating them again
+USE_ANSWER_CACHE = True
+# Answers kept per collection, least recently used evicted first
+MAX_CACHED_ANSWERS = 1024
+# Seconds an answer stays valid
+ANSWER_TTL = 60 * 60.0
+# Cosine similarity above which a different wording counts as the same question
+SIMILARITY_THRESHOLD = 0.95
+# Temperatures closer than this share cached answers
+TEMPERATURE_STEP = 0.1
+# Neighbours checked in the semantic tier before giving up
+SEMANTIC_CANDIDATES = 4
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a question."""
+    return " ".join(query.casefold().split())
+
+
+class CachedAnswer:
+    def __init__(self, key: Tuple, embedding: Optional[np.ndarray], response: str, context: List[str], cost: float):
+        self.key = key
+        self.embedding = embedding
+        # Id of the embedding in the semantic index, if it was added
+        self.entry_id: Optional[int] = None
+        self.response = response
+        self.context = context
+        # Seconds the answer took to produce, i.e. saved by every hit
+        self.cost = cost
+        self.created_at = time.monotonic()
+
+
+class AnswerCache:
+    """
+    Two-tier cache of generated answers for one collection.
+
+    The exact tier is keyed on (normalized query, collection version,
+    temperature bucket) and needs no embedding at all. The semantic tier is
+    a flat inner-product FAISS index over the (unit length) embeddings of
+    cached questions; a new question whose embedding has cosine similarity
+    of at least `similarity_threshold` with a cached one of the same
+    temperature bucket gets that answer.
+
+    Entries expire after `ttl` seconds and the least recently used are
+    evicted beyond `max_entries`. Any change of the collection version
+    clears the cache, so answers never outlive the documents they came from.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = MAX_CACHED_ANSWERS,
+        ttl: float = ANSWER_TTL,
+        similarity_threshold: float = SIMILARITY_THRESHOLD,
+        temperature_step: float = TEMPERATURE_STEP,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.temperature_step = temperature_step
+        self.version: Optional[int] = None
+        self._entries: "OrderedDict[Tuple, CachedAnswer]" = OrderedDict()
+        self._ids: Dict[int, Tuple] = {}
+        self._index: Optional[faiss.IndexIDMap2] = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _bucket(self, temperature: float) -> int:
+        return round(temperature / self.temperature_step) if self.temperature_step > 0 else 0
+
+    def _key(self, query: str, version: int, temperature: float) -> Tuple:
+        return (normalize_query(query), version, self._bucket(temperature))
+
+    def _check_version(self, version: int) -> bool:
+        """Clear the cache on a newer version. False if `version` is outdated."""
+        if self.version is not None and version < self.version:
+            return False
+        if version != self.version:
+            self._clear()
+            self.version = version
+        return True
+
+    def _clear(self):
+        self._entries.clear()
+        self._ids.clear()
+        self._index = None
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl
+
+    def _remove(self, keys: List[Tuple]):
+        ids = []
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry.entry_id is not None:
+                ids.append(entry.entry_id)
+                del self._ids[entry.entry_id]
+        if ids and self._index is not None:
+            self._index.remove_ids(faiss.IDSelectorBatch(np.asarray(ids, dtype=np.int64)))
+
+    def _hit(self, entry: CachedAnswer, tier: str) -> CachedAnswer:
+        self._entries.move_to_end(entry.key)
+        if tier == "exact":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.saved_seconds += entry.cost
+        return entry
+
+    def get(self, query: str, version: int, temperature: float) -> Optional[CachedAnswer]:
+        """Exact-tier lookup. Does not count a miss; call `get_similar` next."""
+        with self._lock:
+            if not self._check_version(version):
+                return None
+            key = self._key(query, version, temperature)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._remove([key])
+                return None
+            return self._hit(entry, "exact")
+
+    def get_similar(self, embedding: np.ndarray, version: int, temperature: float) -> Optional[CachedAnswer]:
+        """Semantic-tier lookup by query embedding. Counts a miss if nothing matches."""
+        with self._lock:
+            current = self._check_version(version)
+            if current and self._index is not None and self._index.ntotal:
+                query = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+                if query.shape[1] == self._index.d:
+                    bucket = self._bucket(temperature)
+                    scores, ids = self._index.search(query, min(SEMANTIC_CANDIDATES, self._index.ntotal))
+                    for score, entry_id in zip(scores[0], ids[0]):
+                        if entry_id < 0 or score < self.similarity_threshold:
+                            break
+                        key = self._ids.get(int(entry_id))
+                        entry = self._entries.get(key) if key is not None else None
+                        if entry is None or key[2] != bucket:
+                            continue
+                        if self._expired(entry):
+                            self._remove([key])
+                            continue
+                        return self._hit(entry, "semantic")
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        query: str,
+        version: int,
+        temperature: float,
+        response: str,
+        context: List[str],
+        embedding: Optional[np.ndarray] = None,
+        cost: float = 0.0,
+    ):
+        """
+        Cache an answer.
+
+        Args:
+            query: The question as asked
+            version: Collection version the answer was generated against
+            temperature: Generation temperature
+            response: The generated answer
+            context: Retrieved chunks the answer is based on
+            embedding: Unit-length query embedding, enables the semantic tier
+            cost: Seconds it took to produce the answer
+        """
+        with self._lock:
+            # Generated against documents that have changed since
+            if not self._check_version(version):
+                return
+            key = self._key(query, version, temperature)
+            self._remove([key])
+
+            entry = CachedAnswer(key, embedding, response, list(context), cost)
+            if embedding is not None:
+                vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+                if self._index is None or self._index.d != vector.shape[1]:
+                    self._remove(list(self._ids.values()))
+                    self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                entry.entry_id = self._next_id
+                self._next_id += 1
+                self._index.add_with_ids(vector, np.asarray([entry.entry_id], dtype=np.int64))
+                self._ids[entry.entry_id] = key
+            self._entries[key] = entry
+
+            stale = [k for k, cached in self._entries.items() if self._expired(cached)]
+            self._remove(stale)
+            # Oldest first, so the front of the dict is least recently used
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._remove(list(self._entries)[:overflow])
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit counts, hit rate and seconds of retrieval and generation saved."""
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
@@ -0,0 +1,233 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from ..embeddings.embedder import get_client
+from ..embeddings.index_factory import search_parameters
+from ..embeddings.search_faiss import search
+from ..monitoring import Trace, count, current_trace, span, use_trace
+
+# Collect concurrent queries into one embedding call and one multi-row
+# FAISS search instead of one call per query
+USE_QUERY_BATCHING = True
+# Seconds a batch waits for more queries once requests overlap; a query
+# arriving alone is sent at once
+BATCH_WINDOW = 0.003
+# Most queries per batch
+MAX_BATCH_SIZE = 32
+# Embedding batches in flight at once (the Ollama client sends each as one
+# request)
+EMBED_WORKERS = 2
+# Search batches in flight at once: batches of different indexes (one per
+# collection) and overlapping batches of a busy one run side by side
+SEARCH_WORKERS = os.cpu_count() or 1
+# Searches of at least this many queries use FAISS's BLAS (matrix-multiply)
+# distance path, which reads the vectors once for all queries; below it the
+# per-query kernels are faster. Set once, process-wide, by `configure_blas`
+BLAS_MIN_BATCH = 4
+
+
+class MicroBatcher:
+    """
+    Groups calls that arrive within a short window into one batched call.
+
+    `submit(key, item)` returns a Future. A collector thread takes the
+    queued items, waits up to `window` seconds for more (only when the
+    previous batch had company or more items are already queued, so a lone
+    request is not delayed), groups them by key and calls
+    `process(key, items)` on a worker pool. `process` returns one result
+    per item; if it raises, every item of the group gets the error.
+
+    Stages and counts recorded while a batch is processed go to the
+    metrics once, and into the request trace of every caller in the batch
+    before its future resolves.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[Hashable, List[Any]], Sequence[Any]],
+        window: float = BATCH_WINDOW,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        workers: int = 1,
+        name: str = "batcher",
+    ):
+        self.process = process
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+        self._queue: "queue.SimpleQueue[Tuple[Hashable, Any, Future, Optional[Trace]]]" = queue.SimpleQueue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                    self._thread.start()
+
+    def submit(self, key: Hashable, item: Any) -> Future:
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((key, item, future, current_trace()))
+        return future
+
+    def call(self, key: Hashable, item: Any) -> Any:
+        """Submit and wait for the result."""
+        return self.submit(key, item).result()
+
+    async def acall(self, key: Hashable, item: Any) -> Any:
+        """Submit and await the result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(key, item))
+
+    def _collect(self):
+        last_size = 1
+        while True:
+            batch = [self._queue.get()]
+            deadline = None
+            if last_size > 1 or not self._queue.empty():
+                deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic() if deadline is not None else 0
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            last_size = len(batch)
+
+            groups: Dict[Hashable, List[Tuple[Any, Future, Optional[Trace]]]] = {}
+            for key, item, future, trace in batch:
+                groups.setdefault(key, []).append((item, future, trace))
+            for key, entries in groups.items():
+                self._executor.submit(self._run, key, entries)
+
+    def _run(self, key: Hashable, entries: List[Tuple[Any, Future, Optional[Trace]]]):
+        # Skip callers that gave up (e.g. a cancelled request)
+        entries = [entry for entry in entries if entry[1].set_running_or_notify_cancel()]
+        if not entries:
+            return
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(entries)
+            self.largest = max(self.largest, len(entries))
+        traced = any(trace is not None for _, _, trace in entries)
+        batch_trace = Trace() if traced else None
+        try:
+            with use_trace(batch_trace):
+                results = self.process(key, [item for item, _, _ in entries])
+            error = None
+        except Exception as e:
+            results, error = [None] * len(entries), e
+        for (_, future, trace), result in zip(entries, results):
+            if trace is not None:
+                trace.merge(batch_trace)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "queries": self.items,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest,
+            }
+
+
+def _embed_batch(_, texts: List[str]) -> np.ndarray:
+    count("embed_batch_size", len(texts))
+    with span("embed_batch"):
+        return get_client().embed(texts)
+
+
+def _search_batch(key: Tuple[Any, Optional[int], Optional[int]], requests: List[Tuple[np.ndarray, int]]):
+    index, nprobe, ef_search = key
+    queries = np.vstack([np.asarray(vector, dtype=np.float32).reshape(1, -1) for vector, _ in requests])
+    k = max(k for _, k in requests)
+    params = search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+    # One multi-row search; each caller gets its own row, cut to its k
+    count("search_batch_size", len(requests))
+    with span("faiss_search"):
+        distances, indices = index.search(queries, k, params=params)
+    return [(distances[i, :k_i], indices[i, :k_i]) for i, (_, k_i) in enumerate(requests)]
+
+
+def configure_blas(min_batch: int = BLAS_MIN_BATCH):
+    """
+    Make FAISS searches of at least `min_batch` queries use BLAS.
+
+    The threshold is process-wide; call this once at startup, before
+    searches run. Single-query searches keep the per-query kernels.
+    """
+    faiss.cvar.distance_compute_blas_threshold = min_batch
+
+
+_embed_batcher: Optional[MicroBatcher] = None
+_search_batcher: Optional[MicroBatcher] = None
+_batchers_lock = threading.Lock()
+
+
+def _batchers() -> Tuple[MicroBatcher, MicroBatcher]:
+    global _embed_batcher, _search_batcher
+    with _batchers_lock:
+        if _embed_batcher is None:
+            _embed_batcher = MicroBatcher(_embed_batch, workers=EMBED_WORKERS, name="embed-batch")
+            _search_batcher = MicroBatcher(_search_batch, workers=SEARCH_WORKERS, name="search-batch")
+        return _embed_batcher, _search_batcher
+
+
+def embed_query(query: str) -> np.ndarray:
+    """Embedding of one query, batched with concurrent ones."""
+    if not USE_QUERY_BATCHING:
+        return get_client().embed_one(query)
+    return _batchers()[0].call(None, query)
+
+
+async def aembed_query(query: str) -> np.ndarray:
+    if not USE_QUERY_BATCHING:
+        return await get_client().aembed_one(query)
+    return await _batchers()[0].acall(None, query)
+
+
+def search_query(index, query_embedding: np.ndarray, k: int, nprobe: Optional[int] = None,
+                 ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(distances, indices) of one query's k nearest rows, searched together with concurrent queries."""
+    if not USE_QUERY_BATCHING:
+        return search(index, query_embedding, k=k, nprobe=nprobe, ef_search=ef_search)
+    return _batchers()[1].call((index, nprobe, ef_search), (query_embedding, k))
+
+
+async def asearch_query(index, query_embedding: np.ndarray, k: int, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    if not USE_QUERY_BATCHING:
+        return await asyncio.to_thread(search, index, query_embedding, k=k, nprobe=nprobe, ef_search=ef_search)
+    return await _batchers()[1].acall((index, nprobe, ef_search), (query_embedding, k))
+
+
+def batching_stats() -> Dict[str, Any]:
+    """Batches formed so far by the query embedding and search batchers."""
+    if not USE_QUERY_BATCHING:
+        return {"enabled": False}
+    embed, search = _batchers()
+    return {"enabled": True, "embed": embed.stats(), "search": search.stats()}
@@ -0,0 +1,217 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .pipeline import RAGPipeline
+from ..embeddings.index_store import STORE_DIR
+
+COLLECTIONS_DIR = STORE_DIR.parent / "collections"
+# Requests that name no collection share this one, stored in the original store directory
+DEFAULT_COLLECTION = "default"
+
+# Approximate memory the loaded collections may use before idle ones are unloaded
+MAX_RESIDENT_BYTES = 1024 * 1024 * 1024
+# Maximum number of collections kept loaded at once
+MAX_RESIDENT_COLLECTIONS = 32
+# Collections unused for this many seconds are unloaded
+IDLE_TIMEOUT = 30 * 60.0
+
+_COLLECTION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def validate_collection_id(collection_id: str) -> str:
+    """
+    Check that a collection id is safe to use as a directory name.
+
+    Raises:
+        ValueError: If the id is empty, too long or has characters other
+            than letters, digits, '-' and '_'
+    """
+    if not _COLLECTION_ID_RE.match(collection_id or ""):
+        raise ValueError(
+            "Collection id must be 1-64 characters of letters, digits, '-' or '_'"
+        )
+    return collection_id
+
+
+class _Entry:
+    def __init__(self, pipeline: RAGPipeline):
+        self.pipeline = pipeline
+        self.last_used = time.monotonic()
+        self.pins = 0
+        self.memory_bytes = pipeline.store.memory_bytes()
+
+
+class CollectionRegistry:
+    """
+    Loads one RAGPipeline per document collection on demand.
+
+    Every collection has its own persistent index store, so users of one
+    collection never see another's documents. Pipelines are loaded the
+    first time a collection is used and kept in LRU order. When the loaded
+    collections exceed MAX_RESIDENT_BYTES or MAX_RESIDENT_COLLECTIONS, or a
+    collection stays unused for IDLE_TIMEOUT, it is flushed and dropped from
+    memory; its store stays on disk and is loaded again on the next request.
+
+    Collections that are being written to (see `pin`) are never unloaded,
+    so a background ingestion and a reloaded copy never share the files.
+
+    A collection is loaded from disk outside the registry lock: requests for
+    other collections go ahead meanwhile, and concurrent requests for the
+    same one wait for a single load.
+    """
+
+    def __init__(
+        self,
+        root: Path = COLLECTIONS_DIR,
+        max_bytes: int = MAX_RESIDENT_BYTES,
+        max_collections: int = MAX_RESIDENT_COLLECTIONS,
+        idle_timeout: float = IDLE_TIMEOUT,
+        **pipeline_options: Any
+    ):
+        """
+        Args:
+            root: Directory holding one store directory per collection
+            max_bytes: Memory budget of the loaded collections
+            max_collections: Maximum number of loaded collections
+            idle_timeout: Seconds after which an unused collection is unloaded
+            **pipeline_options: Keyword arguments for every RAGPipeline
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_collections = max(1, max_collections)
+        self.idle_timeout = idle_timeout
+        self.pipeline_options = pipeline_options
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Collections being loaded, resolved with their pipeline
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def store_dir(self, collection_id: str) -> Path:
+        if collection_id == DEFAULT_COLLECTION:
+            return STORE_DIR
+        return self.root / collection_id
+
+    def get(self, collection_id: str = DEFAULT_COLLECTION) -> RAGPipeline:
+        """
+        Return the pipeline of a collection, loading it if needed.
+
+        Raises:
+            ValueError: If the collection id is invalid
+        """
+        return self._acquire(collection_id, pin=False)
+
+    def pin(self, collection_id: str = DEFAULT_COLLECTION) -> RAGPipeline:
+        """
+        Like `get`, but keep the collection loaded until `unpin` is called.
+        Used around writes such as ingestion jobs.
+        """
+        return self._acquire(collection_id, pin=True)
+
+    def unpin(self, collection_id: str):
+        with self._lock:
+            entry = self._entries.get(collection_id)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+                entry.last_used = time.monotonic()
+                entry.memory_bytes = entry.pipeline.store.memory_bytes()
+            self._evict()
+
+    def _acquire(self, collection_id: str, pin: bool) -> RAGPipeline:
+        validate_collection_id(collection_id)
+        while True:
+            with self._lock:
+                entry = self._entries.get(collection_id)
+                if entry is not None:
+                    self._entries.move_to_end(collection_id)
+                    return self._use(entry, pin)
+                loading = self._loading.get(collection_id)
+                if loading is None:
+                    loading = self._loading[collection_id] = Future()
+                    break
+            # Another request is loading it; look it up again once loaded
+            loading.result()
+
+        try:
+            pipeline = RAGPipeline(store_dir=self.store_dir(collection_id), **self.pipeline_options)
+            entry = _Entry(pipeline)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[collection_id]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[collection_id]
+            self._entries[collection_id] = entry
+            self._use(entry, pin)
+        loading.set_result(pipeline)
+        return pipeline
+
+    def _use(self, entry: _Entry, pin: bool) -> RAGPipeline:
+        """Mark a collection as just used (and pinned). Caller holds the lock."""
+        entry.last_used = time.monotonic()
+        if pin:
+            entry.pins += 1
+        self._evict()
+        return entry.pipeline
+
+    def _evict(self):
+        """Unload idle collections and least recently used ones over budget."""
+        now = time.monotonic()
+        resident = sum(entry.memory_bytes for entry in self._entries.values())
+        # The most recently used collection is the one being requested
+        candidates = list(self._entries.items())[:-1]
+        for collection_id, entry in candidates:
+            if entry.pins:
+                continue
+            over_budget = resident > self.max_bytes or len(self._entries) > self.max_collections
+            if not over_budget and now - entry.last_used < self.idle_timeout:
+                continue
+            try:
+                entry.pipeline.store.flush()
+            except Exception as e:
+                print(f"Error flushing collection '{collection_id}': {e}")
+                continue
+            del self._entries[collection_id]
+            resident -= entry.memory_bytes
+            print(f"Unloaded collection '{collection_id}' ({entry.memory_bytes // 1024} KiB)")
+
+    def list(self) -> List[Dict[str, Any]]:
+        """List the collections on disk and whether they are loaded."""
+        ids = set()
+        if STORE_DIR.exists():
+            ids.add(DEFAULT_COLLECTION)
+        if self.root.exists():
+            ids.update(
+                path.name for path in self.root.iterdir()
+                if path.is_dir() and _COLLECTION_ID_RE.match(path.name)
+            )
+        with self._lock:
+            ids.update(self._entries)
+            resident = {collection_id: entry for collection_id, entry in self._entries.items()}
+
+        collections = []
+        for collection_id in sorted(ids):
+            entry = resident.get(collection_id)
+            collections.append({
+                "collection_id": collection_id,
+                "loaded": entry is not None,
+                "documents": len(entry.pipeline.store.documents) if entry else None,
+                "memory_bytes": entry.memory_bytes if entry else None,
+            })
+        return collections
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.memory_bytes for entry in self._entries.values())
+
+    def flush(self):
+        """Write every loaded collection to disk."""
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            entry.pipeline.store.flush()
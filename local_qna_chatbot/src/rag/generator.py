@@ -1,18 +1,85 @@
+import asyncio
+import json
+import httpx
 import requests
-from typing import List
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from ..monitoring import count, event, record, span
+from .prompt import CONTEXT_TOKEN_BUDGET, estimate_tokens, pack_context
 
 OLLAMA_API_URL = "http://localhost:11434/api/chat"
 MODEL_NAME = "phi3"
+# Context window requested from Ollama (num_ctx), in tokens. Kept fixed:
+# Ollama reloads the model whenever it changes
+CONTEXT_WINDOW = 4096
+# Most tokens generated per answer (num_predict)
+MAX_ANSWER_TOKENS = 512
+# Room for the chat template and the "Context:"/"Question:" labels
+PROMPT_OVERHEAD_TOKENS = 32
+# How long Ollama keeps the model loaded after a request (a duration such
+# as "30m", or -1 to keep it loaded); reloading costs seconds
+KEEP_ALIVE = "30m"
+# Load the model and prefill the system instruction when the API starts
+WARM_UP_ON_STARTUP = True
+# A request whose model load took longer than this counts as a cold start
+COLD_LOAD_SECONDS = 0.5
 
-def generate_response(prompt: str, context: List[str] = None, temperature: float = 0.1) -> str:
+SYSTEM_INSTRUCTION = (
+    "You are a helpful assistant. Read the following context and answer the user's question directly and concisely. "
+    "Do not start with 'The context provided...' or similar phrases. Just state the answer based on the context. "
+    "Generate only 2-3 lines unless the user asked to explain it in detail."
+)
+# Every prompt starts with this same message, byte for byte, so Ollama can
+# reuse the cached prefill of the instruction instead of recomputing it
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_INSTRUCTION}
+
+EMPTY_RESPONSE = "I couldn't generate a response (empty output)."
+UNEXPECTED_RESPONSE = "Unexpected response format from Ollama."
+ERROR_RESPONSE_PREFIX = "I'm sorry, I encountered an error while generating a response"
+
+# Reuse connections to Ollama across requests
+_session = requests.Session()
+_async_client: Optional[httpx.AsyncClient] = None
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Pooled async client, created for the running event loop."""
+    global _async_client, _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_loop is not loop:
+        # Generation can take minutes; only bound the connect phase
+        _async_client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=10.0))
+        _async_loop = loop
+    return _async_client
+
+async def aclose():
+    """Close the async client of the running event loop."""
+    global _async_client, _async_loop
+    if _async_client is not None and _async_loop is asyncio.get_running_loop():
+        await _async_client.aclose()
+        _async_client = None
+        _async_loop = None
+
+def context_budget(prompt: str) -> int:
+    """Tokens of context that fit in the window next to the instructions, the question and the answer."""
+    fixed = estimate_tokens(SYSTEM_INSTRUCTION) + estimate_tokens(prompt) + PROMPT_OVERHEAD_TOKENS
+    return max(0, min(CONTEXT_TOKEN_BUDGET, CONTEXT_WINDOW - MAX_ANSWER_TOKENS - fixed))
+
+def build_messages(prompt: str, context: List[str] = None) -> List[Dict[str, str]]:
     """
-    Generate a response using Ollama's Chat API.
+    Build the chat messages for a question and its retrieved context.
+
+    The context is packed into the token budget (see `prompt.pack_context`):
+    near-duplicate chunks are left out and lower-ranked chunks are cut down
+    to their most relevant sentences or dropped once the budget is used up.
     """
-    system_instruction = (
-        "You are a helpful assistant. Read the following context and answer the user's question directly and concisely. "
-        "Do not start with 'The context provided...' or similar phrases. Just state the answer based on the context. "
-        "Generate only 2-3 lines unless the user asked to explain it in detail."
-    )
+    if context:
+        packed = pack_context(prompt, context, context_budget(prompt))
+        count("context_tokens", packed.tokens)
+        for name, value in (("duplicate", packed.duplicates), ("trimmed", packed.trimmed), ("dropped", packed.dropped)):
+            if value:
+                count(f"context_chunks_{name}", value)
+        context = packed.chunks
 
     if context:
         context_text = "\n\n".join(context)
@@ -20,31 +87,219 @@ def generate_response(prompt: str, context: List[str] = None, temperature: float
     else:
         user_content = prompt
 
-    messages = [
-        {"role": "system", "content": system_instruction},
+    return [
+        dict(SYSTEM_MESSAGE),
         {"role": "user", "content": user_content}
     ]
-    
+
+def is_failed_response(text: str) -> bool:
+    """True for the placeholder answers returned when generation fails."""
+    return text in (EMPTY_RESPONSE, UNEXPECTED_RESPONSE) or text.startswith(ERROR_RESPONSE_PREFIX)
+
+class ErrorToken(str):
+    """
+    Last piece of a streamed answer that failed or came out empty.
+
+    It is shown like any other piece, but answers it ends (after any
+    pieces produced before the failure) must not be reused.
+    """
+
+def _chat_payload(messages: List[Dict[str, str]], temperature: float, stream: bool) -> dict:
+    return {
+        "model": MODEL_NAME,
+        "messages": messages,
+        "stream": stream,
+        "keep_alive": KEEP_ALIVE,
+        # Ollama reads sampling and runtime settings from "options" only
+        "options": {
+            "temperature": temperature,
+            "num_ctx": CONTEXT_WINDOW,
+            "num_predict": MAX_ANSWER_TOKENS
+        }
+    }
+
+def _parse_chat_result(result: dict) -> str:
+    if "message" in result and "content" in result["message"]:
+        answer = result["message"]["content"].strip()
+        return answer if answer else EMPTY_RESPONSE
+    else:
+        return UNEXPECTED_RESPONSE
+
+def _record_usage(result: dict, seconds: float):
+    """
+    Record the token counts and timings Ollama reports with a finished
+    answer, and the generation time as a cold start or a warm request.
+    """
+    cold = result.get("load_duration", 0) / 1e9 >= COLD_LOAD_SECONDS
+    if cold:
+        event("model_cold_start")
+    record("generate_cold" if cold else "generate_warm", seconds)
+    if "prompt_eval_count" in result:
+        count("prompt_tokens", result["prompt_eval_count"])
+    if "eval_count" in result:
+        count("completion_tokens", result["eval_count"])
+    # Reported in nanoseconds
+    for stage, key in (("model_load", "load_duration"), ("prompt_eval", "prompt_eval_duration"), ("decode", "eval_duration")):
+        if key in result:
+            record(stage, result[key] / 1e9)
+
+def _parse_stream_line(line) -> Optional[dict]:
+    if not line:
+        return None
+    chunk = json.loads(line)
+    if "error" in chunk:
+        raise RuntimeError(chunk["error"])
+    return chunk
+
+def warm_up() -> float:
+    """
+    Load the chat model and prefill the system instruction, so the first
+    question neither waits for the model to load nor recomputes the
+    shared prefix.
+
+    Returns:
+        float: Seconds the call took
+    """
+    started = time.perf_counter()
+    payload = _chat_payload([dict(SYSTEM_MESSAGE)], 0.0, stream=False)
+    payload["options"]["num_predict"] = 1
+    response = _session.post(OLLAMA_API_URL, json=payload)
+    response.raise_for_status()
+    seconds = time.perf_counter() - started
+    record("warm_up", seconds)
+    return seconds
+
+def generate_response(prompt: str, context: List[str] = None, temperature: float = 0.1) -> str:
+    """
+    Generate a response using Ollama's Chat API.
+    """
+    with span("build_prompt"):
+        messages = build_messages(prompt, context)
+
+    started = time.perf_counter()
     try:
-        response = requests.post(
-            OLLAMA_API_URL,
-            json={
-                "model": MODEL_NAME,
-                "messages": messages,
-                "stream": False,
-                "temperature": temperature
-            }
-        )
-        response.raise_for_status()
-        
+        with span("generate"):
+            response = _session.post(
+                OLLAMA_API_URL,
+                json=_chat_payload(messages, temperature, stream=False)
+            )
+            response.raise_for_status()
+            result = response.json()
+        _record_usage(result, time.perf_counter() - started)
+
         # Parse the chat response
-        result = response.json()
-        if "message" in result and "content" in result["message"]:
-            answer = result["message"]["content"].strip()
-            return answer if answer else "I couldn't generate a response (empty output)."
-        else:
-            return "Unexpected response format from Ollama."
-        
+        return _parse_chat_result(result)
+
+    except Exception as e:
+        print(f"Error generating response: {str(e)}")
+        event("generation_error")
+        return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+
+def generate_response_stream(prompt: str, context: List[str] = None, temperature: float = 0.1) -> Iterator[str]:
+    """
+    Generate a response using Ollama's Chat API in streaming mode.
+
+    Yields:
+        str: Pieces of the answer as Ollama produces them; if generation
+        fails or produces nothing, the last piece is an ErrorToken
+    """
+    with span("build_prompt"):
+        messages = build_messages(prompt, context)
+    started = time.perf_counter()
+
+    try:
+        with _session.post(
+            OLLAMA_API_URL,
+            json=_chat_payload(messages, temperature, stream=True),
+            stream=True
+        ) as response:
+            response.raise_for_status()
+
+            # Ollama streams one JSON object per line (NDJSON)
+            produced = False
+            for line in response.iter_lines():
+                chunk = _parse_stream_line(line)
+                if chunk is None:
+                    continue
+                token = chunk.get("message", {}).get("content", "")
+                if token:
+                    if not produced:
+                        record("first_token", time.perf_counter() - started)
+                    produced = True
+                    yield token
+                if chunk.get("done"):
+                    _record_usage(chunk, time.perf_counter() - started)
+                    break
+
+            record("generate", time.perf_counter() - started)
+            if not produced:
+                yield ErrorToken(EMPTY_RESPONSE)
+
+    except Exception as e:
+        print(f"Error generating response: {str(e)}")
+        event("generation_error")
+        yield ErrorToken(f"{ERROR_RESPONSE_PREFIX}: {str(e)}")
+
+async def agenerate_response(prompt: str, context: List[str] = None, temperature: float = 0.1) -> str:
+    """
+    Async version of `generate_response`; waits on Ollama without blocking the event loop.
+    """
+    with span("build_prompt"):
+        messages = build_messages(prompt, context)
+
+    started = time.perf_counter()
+    try:
+        with span("generate"):
+            response = await _get_async_client().post(
+                OLLAMA_API_URL,
+                json=_chat_payload(messages, temperature, stream=False)
+            )
+            response.raise_for_status()
+            result = response.json()
+        _record_usage(result, time.perf_counter() - started)
+        return _parse_chat_result(result)
+
+    except Exception as e:
+        print(f"Error generating response: {str(e)}")
+        event("generation_error")
+        return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+
+async def agenerate_response_stream(prompt: str, context: List[str] = None, temperature: float = 0.1) -> AsyncIterator[str]:
+    """
+    Async version of `generate_response_stream`.
+    """
+    with span("build_prompt"):
+        messages = build_messages(prompt, context)
+    started = time.perf_counter()
+
+    try:
+        async with _get_async_client().stream(
+            "POST",
+            OLLAMA_API_URL,
+            json=_chat_payload(messages, temperature, stream=True)
+        ) as response:
+            response.raise_for_status()
+
+            produced = False
+            async for line in response.aiter_lines():
+                chunk = _parse_stream_line(line)
+                if chunk is None:
+                    continue
+                token = chunk.get("message", {}).get("content", "")
+                if token:
+                    if not produced:
+                        record("first_token", time.perf_counter() - started)
+                    produced = True
+                    yield token
+                if chunk.get("done"):
+                    _record_usage(chunk, time.perf_counter() - started)
+                    break
+
+            record("generate", time.perf_counter() - started)
+            if not produced:
+                yield ErrorToken(EMPTY_RESPONSE)
+
     except Exception as e:
         print(f"Error generating response: {str(e)}")
-        return f"I'm sorry, I encountered an error while generating a response: {str(e)}"
+        event("generation_error")
+        yield ErrorToken(f"{ERROR_RESPONSE_PREFIX}: {str(e)}")
@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from ..embeddings.build_faiss import load_faiss_index
+from ..embeddings.chunk_table import ChunkTable, OFFSETS_FILE
+from ..ingestion.incremental import CHUNK_HASHES_FILE, hashes_fingerprint
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+INDEX_PATH = DATA_DIR / "embeddings" / "index.faiss"
+# Chunk table written by process_data.py
+PROCESSED_DATA_PATH = DATA_DIR / "processed" / "chunks"
+# Written by generate_index.py after the index, naming the chunk table
+# version the index was built from
+INDEX_STATE_FILE = "index_state.json"
+
+# Seconds between mtime checks; queries in between touch no files at all
+CHECK_INTERVAL = 2.0
+
+
+class CorpusSnapshot(NamedTuple):
+    index: faiss.Index
+    dataset: ChunkTable
+    version: Tuple[float, ...]
+
+
+class IndexManager:
+    """
+    Process-wide cache of the on-disk FAISS index and processed dataset.
+
+    Both are memory-mapped once and reloaded when their modification times
+    change (e.g. after `generate_index` rebuilds them). A new pair is only
+    taken once the index state names the same chunk hashes as the processed
+    dataset, so an index is never served with a chunk table it was not built
+    from (between `process_data` and `generate_index`, say, the previous pair
+    keeps serving). A reload builds a new snapshot and swaps the reference,
+    so a query that already holds the old snapshot finishes against the
+    pair it started with.
+    """
+
+    def __init__(
+        self,
+        index_path: Path = INDEX_PATH,
+        data_path: Path = PROCESSED_DATA_PATH,
+        check_interval: float = CHECK_INTERVAL,
+    ):
+        self.index_path = Path(index_path)
+        self.data_path = Path(data_path)
+        self.check_interval = check_interval
+        self._snapshot: Optional[CorpusSnapshot] = None
+        # Version of the files that last failed to load; not retried until they change
+        self._rejected: Optional[Tuple[float, ...]] = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _files(self):
+        return (
+            self.index_path,
+            self.index_path.parent / INDEX_STATE_FILE,
+            self.data_path / OFFSETS_FILE,
+            self.data_path.parent / CHUNK_HASHES_FILE,
+        )
+
+    def _current_version(self) -> Optional[Tuple[float, ...]]:
+        try:
+            # The state and the chunk hashes are optional (indexes built
+            # before they existed); the index and the table are not
+            index, state, offsets, hashes = self._files()
+            required = (index.stat().st_mtime, offsets.stat().st_mtime)
+        except FileNotFoundError:
+            return None
+        optional = tuple(path.stat().st_mtime if path.exists() else 0.0 for path in (state, hashes))
+        return required + optional
+
+    def _load(self, version: Tuple[float, ...]) -> CorpusSnapshot:
+        _, state_path, _, hashes_path = self._files()
+        state = {}
+        if state_path.exists():
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        if "chunks_fingerprint" in state:
+            hashes = np.load(hashes_path)
+            if hashes_fingerprint(hashes) != state["chunks_fingerprint"]:
+                raise ValueError(
+                    f"the index was built from another version of {self.data_path.name}; "
+                    "re-run the indexing script"
+                )
+            # Rows past the hashes belong to a run that has not finished
+            dataset = ChunkTable.open(self.data_path, rows=len(hashes))
+        else:
+            dataset = ChunkTable.open(self.data_path)
+        index = load_faiss_index(str(self.index_path), mmap=True)
+        # Vectors are keyed by chunk row; deleted rows have none, so only
+        # more vectors than rows means the two are out of step
+        if index.ntotal > len(dataset):
+            print(
+                f"Warning: FAISS index has {index.ntotal} vectors but {self.data_path.name} "
+                f"has {len(dataset)} chunks. Re-run the indexing script."
+            )
+        # A file replaced while loading may have been read half old, half new
+        if self._current_version() != version:
+            raise ValueError("the corpus changed while loading")
+        return CorpusSnapshot(index, dataset, version)
+
+    def get(self) -> Optional[CorpusSnapshot]:
+        """
+        Return the current snapshot, reloading it if the files changed.
+
+        Returns:
+            CorpusSnapshot or None if the index or dataset file is missing
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._last_check < self.check_interval:
+            return snapshot
+
+        # Only one thread reloads; the others keep serving the old snapshot
+        if not self._reload_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            snapshot = self._snapshot
+            self._last_check = now
+            version = self._current_version()
+            if version is None:
+                if snapshot is None:
+                    print(f"Warning: FAISS index or processed data not found in {DATA_DIR}. Please run the ingestion script.")
+                return snapshot
+            if (snapshot is not None and snapshot.version == version) or version == self._rejected:
+                return snapshot
+            try:
+                self._snapshot = self._load(version)
+                print(f"Loaded corpus from disk: {len(self._snapshot.dataset)} chunks")
+            except Exception as e:
+                # Probably caught mid-rebuild; keep serving the previous view
+                self._rejected = version
+                print(f"Error loading corpus from disk: {e}")
+            return self._snapshot
+        finally:
+            self._reload_lock.release()
+
+    def invalidate(self):
+        """Force an mtime check on the next call to get()."""
+        self._last_check = 0.0
+
+
+_manager: Optional[IndexManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_index_manager() -> IndexManager:
+    """Return the process-wide IndexManager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = IndexManager()
+        return _manager
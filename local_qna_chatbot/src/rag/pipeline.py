@@ -1,48 +1,205 @@
-from typing import Dict, Any, Optional
-from .retriever import retrieve_relevant_context
-from .generator import generate_response
-from ..ingestion.ingest_file import process_uploaded_file
+import asyncio
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional
+from .retriever import retrieve_relevant_context, aretrieve_relevant_context
+from .generator import (
+    ErrorToken, generate_response, generate_response_stream, agenerate_response, agenerate_response_stream,
+    is_failed_response
+)
+from .answer_cache import AnswerCache, USE_ANSWER_CACHE
+from ..monitoring import count, event, span
+from .reranker import get_reranker, RERANK_CANDIDATES, USE_RERANKER
+from .batcher import embed_query, aembed_query
+from ..ingestion.ingest_file import (
+    embed_uploaded_file, file_fingerprint, iter_chunks
+)
+from ..ingestion.extract import DocumentText
+from ..ingestion.jobs import IngestionCancelled
+from ..embeddings.embedder import get_client, get_embeddings
+from ..embeddings.index_store import IndexStore, STORE_DIR
+from ..embeddings.index_factory import DEFAULT_INDEX_TYPE
+
+# Chunks embedded and appended to the index at a time by ingest_document
+INGEST_BATCH_SIZE = 128
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
 class RAGPipeline:
-    def __init__(self, k_context: int = 2, temperature: float = 0.7):
+    def __init__(
+        self,
+        k_context: int = 2,
+        temperature: float = 0.7,
+        store_dir: Path = STORE_DIR,
+        index_type: str = DEFAULT_INDEX_TYPE,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        answer_cache: bool = USE_ANSWER_CACHE,
+        rerank: bool = USE_RERANKER
+    ):
         """
-        Initialize the RAG pipeline.
+        Initialize the RAG pipeline and load any previously stored documents.
         
         Args:
             k_context (int): Number of context chunks to retrieve
             temperature (float): Controls randomness in generation (0.0 to 1.0)
+            store_dir (Path): Directory of the persistent index store
+            index_type (str): FAISS index type ("flat", "ivf_flat", "ivf_pq", "hnsw")
+            nprobe (int, optional): IVF lists to visit per query
+            ef_search (int, optional): HNSW search breadth per query
+            answer_cache (bool): Reuse answers to repeated questions
+            rerank (bool): Retrieve RERANK_CANDIDATES chunks and keep the
+                k_context best according to a cross-encoder
         """
         self.k_context = k_context
         self.temperature = temperature
-        self.initialized = False
-        self.index = None
-        self.dataset = None
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.answer_cache = AnswerCache() if answer_cache else None
+        self.reranker = get_reranker() if rerank else None
+        self.store = IndexStore(store_dir, index_type=index_type)
+        try:
+            if self.store.load():
+                print(f"Loaded {len(self.store.documents)} documents ({len(self.store)} chunks) from {store_dir}")
+        except Exception as e:
+            print(f"Error loading index store from {store_dir}: {e}")
+        self.initialized = len(self.store) > 0
+
+    @property
+    def index(self):
+        return self.store.snapshot().index
+
+    @property
+    def dataset(self):
+        return self.store.chunks
     
-    def initialize(self, documents_path: Optional[str] = None):
+    def initialize(self, documents_path: Optional[str] = None, document_name: Optional[str] = None):
         """
-        Initialize the pipeline with documents.
+        Add a document to the pipeline's persistent store.
         
         Args:
-            documents_path (str, optional): Path to documents for initialization
+            documents_path (str, optional): Path to the document to add
+            document_name (str, optional): Name to record for the document,
+                defaults to the file name
         """
         if documents_path:
              try:
-                 print(f"Initializing RAG pipeline with document: {documents_path}")
-                 self.index, self.dataset = process_uploaded_file(documents_path)
-                 self.initialized = True
-                 print(f"RAG pipeline initialized successfully with {len(self.dataset)} chunks.")
+                 print(f"Adding document to RAG pipeline: {documents_path}")
+                 name = document_name or Path(documents_path).name
+                 content_hash = file_fingerprint(documents_path)
+                 if self.store.find_document(content_hash) is not None:
+                     print(f"Document '{name}' is already indexed, skipping.")
+                 else:
+                     self.store.check_embedding_model(get_client().model_id)
+                     embeddings, chunks = embed_uploaded_file(documents_path)
+                     self.store.add_document(
+                         name, embeddings, chunks, content_hash=content_hash,
+                         embedding_model=get_client().model_id
+                     )
+                 self.initialized = len(self.store) > 0
+                 print(f"RAG pipeline ready with {len(self.store.documents)} documents ({len(self.store)} chunks).")
              except Exception as e:
                  print(f"Error initializing RAG pipeline: {e}")
-                 self.initialized = False
                  raise e
-        else:
-             # If no document provided, we might be in "default" mode using disk index
-             # But for this specific user request, we want to rely on upload.
-             # State remains uninitialized if we strictly require upload.
-             # However, let's allow "default" only if we want to fallback, but previously code didn't load anything.
-             # Let's say we are initialized ONLY if we have data.
-             pass
-    
+
+    def ingest_document(
+        self,
+        documents_path: str,
+        document_name: Optional[str] = None,
+        on_total: Optional[Callable[[int, bool], None]] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Add a document in batches, making it searchable while it is indexed.
+        
+        The document is read, cleaned and chunked as a stream: every
+        INGEST_BATCH_SIZE chunks are embedded and appended to the index as
+        soon as they are ready, while later pages are still being parsed.
+        If the ingestion fails or is cancelled, the chunks added so far are
+        removed again.
+        
+        Args:
+            documents_path (str): Path to the document to add
+            document_name (str, optional): Name to record for the document
+            on_total (callable, optional): Called with the number of chunks
+                and whether it is exact; until the whole document has been
+                read the number is an estimate and is reported again as it improves
+            on_progress (callable, optional): Called with the number of chunks
+                embedded after each batch
+            cancel_event (threading.Event, optional): Set to stop the ingestion
+            
+        Returns:
+            Dict[str, Any]: The stored document's manifest entry
+        """
+        name = document_name or Path(documents_path).name
+        content_hash = file_fingerprint(documents_path)
+        existing = self.store.find_document(content_hash)
+        if existing is not None:
+            print(f"Document '{name}' is already indexed, skipping.")
+            if on_total:
+                on_total(existing["chunks"], True)
+            if on_progress:
+                on_progress(existing["chunks"])
+            return existing
+
+        embedding_model = get_client().model_id
+        self.store.check_embedding_model(embedding_model)
+        doc_id = self.store.begin_document(name)["doc_id"]
+        try:
+            total = 0
+            with DocumentText(documents_path) as document:
+                for batch in _batched(iter_chunks(document), INGEST_BATCH_SIZE):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise IngestionCancelled(f"Ingestion of '{name}' was cancelled")
+                    total += len(batch)
+                    if on_total and document.progress > 0:
+                        on_total(max(total, round(total / document.progress)), False)
+                    texts = [chunk.text for chunk in batch]
+                    with span("embed_document"):
+                        embeddings = get_embeddings(texts)
+                    with span("index_append"):
+                        self.store.append_chunks(
+                            doc_id, embeddings, texts,
+                            metadata=[chunk.metadata() for chunk in batch],
+                            embedding_model=embedding_model
+                        )
+                    self.initialized = True
+                    if on_progress:
+                        on_progress(len(batch))
+            if total == 0:
+                raise ValueError("File is empty")
+            count("document_chunks", total)
+            if on_total:
+                on_total(total, True)
+            doc = self.store.finish_document(doc_id, content_hash)
+        except BaseException:
+            self.store.remove_document(doc_id)
+            self.initialized = len(self.store) > 0
+            raise
+
+        print(f"RAG pipeline ready with {len(self.store.documents)} documents ({len(self.store)} chunks).")
+        return doc
+
+    def remove_document(self, doc_id: int) -> bool:
+        """
+        Remove a stored document.
+        
+        Returns:
+            bool: False if the document does not exist
+        """
+        removed = self.store.remove_document(doc_id)
+        self.initialized = len(self.store) > 0
+        return removed
+
     def process_query(self, query: str, temperature: Optional[float] = None) -> Dict[str, Any]:
         """
         Process a query through the RAG pipeline.
@@ -52,7 +209,8 @@ class RAGPipeline:
             temperature (float, optional): Controls randomness in generation (0.0 to 1.0)
             
         Returns:
-            Dict[str, Any]: Dictionary containing the response and metadata
+            Dict[str, Any]: Dictionary containing the response and metadata;
+            "cached" is "exact" or "semantic" when the answer came from the answer cache
         """
         if not self.initialized:
             return {"error": "RAG pipeline not initialized. Please upload a document first."}
@@ -60,15 +218,16 @@ class RAGPipeline:
         try:
             # Use provided temperature or instance temperature
             temp = temperature if temperature is not None else self.temperature
+            version = self.store.version
+
+            # Reuse the answer to the same (or a near-identical) question
+            hit, tier, query_embedding = self._lookup_answer(query, temp, version)
+            if hit is not None:
+                return {"response": hit.response, "context": hit.context, "query": query, "cached": tier}
+            started = time.perf_counter()
             
             # Retrieve relevant context
-            # Pass the in-memory index and dataset
-            context = retrieve_relevant_context(
-                query, 
-                k=self.k_context,
-                index=self.index,
-                dataset=self.dataset
-            )
+            context = self._retrieve(query, query_embedding)
             
             # Generate response using the context
             response = generate_response(
@@ -76,6 +235,7 @@ class RAGPipeline:
                 context=context,
                 temperature=temp
             )
+            self._store_answer(query, temp, version, response, context, query_embedding, started)
             
             return {
                 "response": response,
@@ -85,3 +245,222 @@ class RAGPipeline:
             
         except Exception as e:
             return {"error": f"Error processing query: {str(e)}"}
+
+    def process_query_stream(self, query: str, temperature: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process a query and stream the answer as it is generated.
+        
+        Args:
+            query (str): The user's question or query
+            temperature (float, optional): Controls randomness in generation (0.0 to 1.0)
+            
+        Yields:
+            Dict[str, Any]: Events in order: {"type": "context", "context": [...]},
+            then {"type": "token", "content": "..."} per piece of the answer,
+            then {"type": "done"}. On failure a single {"type": "error", "error": "..."}.
+            A cached answer arrives as a single token event, and the context
+            event carries "cached": "exact" or "semantic".
+        """
+        if not self.initialized:
+            yield {"type": "error", "error": "RAG pipeline not initialized. Please upload a document first."}
+            return
+
+        try:
+            temp = temperature if temperature is not None else self.temperature
+            version = self.store.version
+            hit, tier, query_embedding = self._lookup_answer(query, temp, version)
+            if hit is None:
+                started = time.perf_counter()
+                context = self._retrieve(query, query_embedding)
+        except Exception as e:
+            yield {"type": "error", "error": f"Error processing query: {str(e)}"}
+            return
+
+        if hit is not None:
+            yield from self._cached_events(hit, tier, query)
+            return
+
+        yield {"type": "context", "context": context, "query": query}
+        pieces = []
+        failed = False
+        for token in generate_response_stream(prompt=query, context=context, temperature=temp):
+            pieces.append(token)
+            failed = isinstance(token, ErrorToken)
+            yield {"type": "token", "content": token}
+        # Pieces produced before a failure are not a whole answer
+        if not failed:
+            self._store_answer(query, temp, version, "".join(pieces), context, query_embedding, started)
+        yield {"type": "done"}
+
+    async def aprocess_query(self, query: str, temperature: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Async version of `process_query`; concurrent queries overlap instead of
+        blocking the event loop.
+        """
+        if not self.initialized:
+            return {"error": "RAG pipeline not initialized. Please upload a document first."}
+
+        try:
+            temp = temperature if temperature is not None else self.temperature
+            version = self.store.version
+            hit, tier, query_embedding = await self._alookup_answer(query, temp, version)
+            if hit is not None:
+                return {"response": hit.response, "context": hit.context, "query": query, "cached": tier}
+            started = time.perf_counter()
+
+            context = await self._aretrieve(query, query_embedding)
+            response = await agenerate_response(
+                prompt=query,
+                context=context,
+                temperature=temp
+            )
+            self._store_answer(query, temp, version, response, context, query_embedding, started)
+            return {
+                "response": response,
+                "context": context,
+                "query": query
+            }
+
+        except Exception as e:
+            return {"error": f"Error processing query: {str(e)}"}
+
+    async def aprocess_query_stream(self, query: str, temperature: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async version of `process_query_stream`, yielding the same events.
+        """
+        if not self.initialized:
+            yield {"type": "error", "error": "RAG pipeline not initialized. Please upload a document first."}
+            return
+
+        try:
+            temp = temperature if temperature is not None else self.temperature
+            version = self.store.version
+            hit, tier, query_embedding = await self._alookup_answer(query, temp, version)
+            if hit is None:
+                started = time.perf_counter()
+                context = await self._aretrieve(query, query_embedding)
+        except Exception as e:
+            yield {"type": "error", "error": f"Error processing query: {str(e)}"}
+            return
+
+        if hit is not None:
+            for event in self._cached_events(hit, tier, query):
+                yield event
+            return
+
+        yield {"type": "context", "context": context, "query": query}
+        pieces = []
+        failed = False
+        async for token in agenerate_response_stream(prompt=query, context=context, temperature=temp):
+            pieces.append(token)
+            failed = isinstance(token, ErrorToken)
+            yield {"type": "token", "content": token}
+        # Pieces produced before a failure are not a whole answer
+        if not failed:
+            self._store_answer(query, temp, version, "".join(pieces), context, query_embedding, started)
+        yield {"type": "done"}
+
+    def _lookup_answer(self, query: str, temperature: float, version: int):
+        """
+        Look a question up in the answer cache.
+
+        The exact tier is checked first, so the query is only embedded when
+        it misses; the embedding is returned for reuse by retrieval.
+
+        Returns:
+            (cached answer or None, "exact"/"semantic" or None, query embedding or None)
+        """
+        if self.answer_cache is None:
+            return None, None, None
+        hit = self.answer_cache.get(query, version, temperature)
+        if hit is not None:
+            event("answer_cache_exact_hit")
+            return hit, "exact", None
+        try:
+            with span("embed_query"):
+                query_embedding = embed_query(query)
+        except Exception as e:
+            # Retrieval tries again and reports the error
+            print(f"Error embedding query for the answer cache: {e}")
+            return None, None, None
+        hit = self.answer_cache.get_similar(query_embedding, version, temperature)
+        return self._answer_lookup_result(hit, query_embedding)
+
+    async def _alookup_answer(self, query: str, temperature: float, version: int):
+        """Async version of `_lookup_answer`."""
+        if self.answer_cache is None:
+            return None, None, None
+        hit = self.answer_cache.get(query, version, temperature)
+        if hit is not None:
+            event("answer_cache_exact_hit")
+            return hit, "exact", None
+        try:
+            with span("embed_query"):
+                query_embedding = await aembed_query(query)
+        except Exception as e:
+            print(f"Error embedding query for the answer cache: {e}")
+            return None, None, None
+        hit = self.answer_cache.get_similar(query_embedding, version, temperature)
+        return self._answer_lookup_result(hit, query_embedding)
+
+    @staticmethod
+    def _answer_lookup_result(hit, query_embedding):
+        event("answer_cache_semantic_hit" if hit is not None else "answer_cache_miss")
+        return hit, "semantic" if hit is not None else None, query_embedding
+
+    def _store_answer(self, query, temperature, version, response, context, query_embedding, started):
+        # Failed generations are not worth repeating
+        if self.answer_cache is None or not response or is_failed_response(response):
+            return
+        self.answer_cache.put(
+            query, version, temperature, response, context,
+            embedding=query_embedding, cost=time.perf_counter() - started
+        )
+
+    @staticmethod
+    def _cached_events(hit, tier: str, query: str) -> Iterator[Dict[str, Any]]:
+        yield {"type": "context", "context": hit.context, "query": query, "cached": tier}
+        yield {"type": "token", "content": hit.response}
+        yield {"type": "done"}
+
+    def _candidates(self) -> int:
+        # Over-fetch when reranking, the reranker keeps k_context
+        return max(self.k_context, RERANK_CANDIDATES) if self.reranker is not None else self.k_context
+
+    def _retrieve(self, query: str, query_embedding=None):
+        # Query vectors must come from the model the collection was indexed with
+        self.store.check_embedding_model(get_client().model_id)
+        # Pass the in-memory indexes and dataset
+        index, dataset, lexical = self.store.snapshot()
+        context = retrieve_relevant_context(
+            query, 
+            k=self._candidates(),
+            index=index,
+            dataset=dataset,
+            lexical=lexical,
+            nprobe=self.nprobe,
+            ef_search=self.ef_search,
+            query_embedding=query_embedding
+        )
+        if self.reranker is not None:
+            with span("rerank"):
+                context = self.reranker.rerank(query, context, self.k_context)
+        return context
+
+    async def _aretrieve(self, query: str, query_embedding=None):
+        self.store.check_embedding_model(get_client().model_id)
+        index, dataset, lexical = self.store.snapshot()
+        context = await aretrieve_relevant_context(
+            query,
+            k=self._candidates(),
+            index=index,
+            dataset=dataset,
+            lexical=lexical,
+            nprobe=self.nprobe,
+            ef_search=self.ef_search,
+            query_embedding=query_embedding
+        )
+        if self.reranker is not None:
+            with span("rerank"):
+                context = await asyncio.to_thread(self.reranker.rerank, query, context, self.k_context)
+        return context
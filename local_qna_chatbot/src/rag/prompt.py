@@ -0,0 +1,104 @@
+import math
+import re
+from typing import List, NamedTuple, Set
+
+from ..ingestion.chunker import tokenize
+
+# Most (estimated) model tokens of retrieved context put in a prompt
+CONTEXT_TOKEN_BUDGET = 1536
+# Model tokens per chunker token: word pieces split long and rare words,
+# so a tokenizer like phi3's produces a few more tokens than words
+TOKENS_PER_WORD = 1.3
+# Drop a chunk when this share of its word 3-grams already appears in a
+# chunk ranked above it (overlapping windows, the same text in two documents)
+DUPLICATE_OVERLAP = 0.8
+# Do not fill a remainder of the budget smaller than this with trimmed chunks
+MIN_TRIMMED_TOKENS = 32
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+_WORD_RE = re.compile(r"\w+")
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class PackedContext(NamedTuple):
+    chunks: List[str]
+    tokens: int
+    # Chunks left out as near-duplicates, cut down to their best sentences,
+    # and left out because the budget was used up
+    duplicates: int
+    trimmed: int
+    dropped: int
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast estimate of the number of model tokens in a text."""
+    # The chunker's tokens; the regex is quicker on short texts such as sentences
+    n = len(_TOKEN_RE.findall(text)) if len(text) < 512 else len(tokenize(text)[0])
+    return math.ceil(n * TOKENS_PER_WORD)
+
+
+def _shingles(text: str) -> Set[tuple]:
+    words = text.lower().split()
+    if len(words) < 3:
+        return {tuple(words)}
+    return set(zip(words, words[1:], words[2:]))
+
+
+def _is_duplicate(shingles: Set[tuple], kept: List[Set[tuple]]) -> bool:
+    return any(len(shingles & other) >= DUPLICATE_OVERLAP * min(len(shingles), len(other)) for other in kept)
+
+
+def _sentences(chunk: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END_RE.split(chunk) if sentence.strip()]
+
+
+def pack_context(query: str, context: List[str], budget: int = CONTEXT_TOKEN_BUDGET) -> PackedContext:
+    """
+    Fit retrieved chunks into a token budget.
+
+    Chunks are taken whole in rank order, skipping near-duplicates of a
+    chunk already taken, until the next one does not fit. The rest of the
+    budget goes to the sentences of the remaining chunks that share most
+    words with the query (ties go to higher-ranked chunks and earlier
+    sentences); each trimmed chunk keeps its sentences in their original order.
+
+    Args:
+        query: The user's question
+        context: Retrieved chunks, best first
+        budget: Most estimated tokens of context
+
+    Returns:
+        PackedContext: The chunks to send, their estimated tokens and how
+        many chunks were skipped or trimmed
+    """
+    chunks, kept_shingles, rest = [], [], []
+    used = duplicates = 0
+    for chunk in context:
+        shingles = _shingles(chunk)
+        if _is_duplicate(shingles, kept_shingles):
+            duplicates += 1
+            continue
+        kept_shingles.append(shingles)
+        tokens = estimate_tokens(chunk)
+        if not rest and used + tokens <= budget:
+            chunks.append(chunk)
+            used += tokens
+        else:
+            rest.append(chunk)
+
+    trimmed = []
+    if rest and budget - used >= MIN_TRIMMED_TOKENS:
+        query_words = {word for word in _WORD_RE.findall(query.lower()) if len(word) > 2}
+        scored = []
+        for rank, chunk in enumerate(rest):
+            for i, sentence in enumerate(_sentences(chunk)):
+                overlap = len(query_words.intersection(_WORD_RE.findall(sentence.lower())))
+                scored.append((-overlap, rank, i, sentence))
+        chosen = {}
+        for _, rank, i, sentence in sorted(scored, key=lambda item: item[:3]):
+            tokens = estimate_tokens(sentence)
+            if used + tokens <= budget:
+                chosen.setdefault(rank, []).append((i, sentence))
+                used += tokens
+        trimmed = [" ".join(sentence for _, sentence in sorted(chosen[rank])) for rank in sorted(chosen)]
+    return PackedContext(chunks + trimmed, used, duplicates, len(trimmed), len(rest) - len(trimmed))
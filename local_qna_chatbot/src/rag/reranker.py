@@ -0,0 +1,160 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Rerank retrieved chunks with a cross-encoder before generating the answer
+USE_RERANKER = False
+# Small CPU cross-encoder trained for passage ranking
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Chunks retrieved and scored per query; the best k_context are kept
+RERANK_CANDIDATES = 20
+# Query-chunk pairs scored per model call, and calls running at once
+RERANK_BATCH_SIZE = 8
+RERANK_WORKERS = 2
+# Tokens per query-chunk pair; longer chunks are truncated, shorter is faster
+RERANK_MAX_LENGTH = 256
+# Seconds a query may spend reranking before the vector order is used instead
+RERANK_BUDGET = 0.5
+
+
+class CrossEncoderReranker:
+    """
+    Reorders retrieved chunks by cross-encoder relevance to the query.
+
+    The model (from `sentence-transformers`) is loaded in a background
+    thread when the reranker is created. Candidates are scored in batches
+    on a small thread pool; the model releases the GIL while it computes,
+    so batches run in parallel. If scoring does not finish within the
+    budget, or the model is not loaded (yet), the candidates are returned
+    in their retrieval order, so reranking never makes an answer fail or
+    wait longer than the budget.
+    """
+
+    def __init__(
+        self,
+        model: str = RERANK_MODEL,
+        batch_size: int = RERANK_BATCH_SIZE,
+        workers: int = RERANK_WORKERS,
+        max_length: int = RERANK_MAX_LENGTH,
+        budget: Optional[float] = RERANK_BUDGET,
+    ):
+        self.model_name = model
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self.budget = budget
+        self._model = None
+        self._load_error: Optional[str] = None
+        self._loaded = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="rerank")
+        self._stats_lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+        self.seconds = 0.0
+        threading.Thread(target=self._load, name="rerank-load", daemon=True).start()
+
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+            print(f"Loaded reranker {self.model_name}")
+        except Exception as e:
+            self._load_error = str(e)
+            print(f"Reranker disabled, could not load {self.model_name}: {e}")
+        finally:
+            self._loaded.set()
+
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """Block until the model has loaded. False if it failed or timed out."""
+        return self._loaded.wait(timeout) and self._model is not None
+
+    def _score(self, pairs: List[List[str]]) -> np.ndarray:
+        return np.asarray(
+            self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+            dtype=np.float32
+        )
+
+    def rerank(self, query: str, candidates: List[str], k: int, budget: Optional[float] = None) -> List[str]:
+        """
+        Return the `k` candidates most relevant to the query, best first.
+
+        Args:
+            query (str): The user's question
+            candidates (List[str]): Retrieved chunks, best first
+            k (int): Number of chunks to keep
+            budget (float, optional): Seconds allowed, defaults to the
+                reranker's budget; None or 0 waits for every score
+
+        Returns:
+            List[str]: The top-k chunks, or the first k candidates if the
+            scores were not ready within the budget
+        """
+        budget = self.budget if budget is None else budget
+        if len(candidates) <= 1 or self._model is None:
+            if len(candidates) > k:
+                self._count(fallback=True)
+            return candidates[:k]
+
+        started = time.perf_counter()
+        pairs = [[query, text] for text in candidates]
+        futures = [
+            self._executor.submit(self._score, pairs[start:start + self.batch_size])
+            for start in range(0, len(pairs), self.batch_size)
+        ]
+        done, pending = wait(futures, timeout=budget or None)
+        if pending:
+            # Batches already running finish in the background and are discarded
+            for future in pending:
+                future.cancel()
+            self._count(fallback=True, seconds=time.perf_counter() - started)
+            return candidates[:k]
+        try:
+            scores = np.concatenate([future.result() for future in futures])
+        except Exception as e:
+            print(f"Error reranking, keeping the retrieval order: {e}")
+            self._count(fallback=True, seconds=time.perf_counter() - started)
+            return candidates[:k]
+
+        # Stable, so ties keep their retrieval order
+        order = np.argsort(-scores, kind="stable")[:k]
+        self._count(fallback=False, seconds=time.perf_counter() - started)
+        return [candidates[i] for i in order]
+
+    def _count(self, fallback: bool, seconds: float = 0.0):
+        with self._stats_lock:
+            if fallback:
+                self.fallbacks += 1
+            else:
+                self.reranked += 1
+            self.seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """Queries reranked, queries left in retrieval order and mean time spent."""
+        with self._stats_lock:
+            queries = self.reranked + self.fallbacks
+            return {
+                "model": self.model_name,
+                "loaded": self._model is not None,
+                "error": self._load_error,
+                "reranked": self.reranked,
+                "fallbacks": self.fallbacks,
+                "mean_seconds": round(self.seconds / queries, 4) if queries else 0.0,
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_default_reranker: Optional[CrossEncoderReranker] = None
+_default_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Return the process-wide reranker, shared by every collection."""
+    global _default_reranker
+    with _default_reranker_lock:
+        if _default_reranker is None:
+            _default_reranker = CrossEncoderReranker()
+        return _default_reranker
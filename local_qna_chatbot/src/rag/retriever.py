@@ -1,66 +1,148 @@
-import os
-import json
+import asyncio
 import numpy as np
-from typing import List
-from pathlib import Path
-from ..embeddings.search_faiss import search
-from ..embeddings.build_faiss import load_faiss_index
-from ..embeddings.embedder import get_embedding
+from typing import List, Optional
+from ..embeddings.chunk_table import ChunkTable
+from ..monitoring import count, span
+from .batcher import aembed_query, asearch_query, embed_query, search_query
+from .index_manager import get_index_manager, DATA_DIR, INDEX_PATH, PROCESSED_DATA_PATH
 
-# Define paths
-DATA_DIR = Path(__file__).parent.parent.parent / "data"
-INDEX_PATH = DATA_DIR / "embeddings" / "index.faiss"
-PROCESSED_DATA_PATH = DATA_DIR / "processed" / "processed_data.json"
+# Fuse BM25 keyword matches with the vector search when a lexical index is given
+USE_HYBRID_SEARCH = True
+# Candidates taken from each side before fusion (at least k)
+HYBRID_CANDIDATES = 20
+# Reciprocal rank fusion constant: higher values flatten the rank weighting
+RRF_K = 60
 
 def retrieve_relevant_context(
     query: str, 
     k: int = 3, 
     index=None, 
-    dataset: List[dict] = None
+    dataset: List[dict] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    query_embedding: Optional[np.ndarray] = None,
+    lexical=None
 ) -> List[str]:
     """
-    Retrieve relevant context for a given query using FAISS semantic search.
+    Retrieve relevant context for a given query using FAISS semantic search,
+    fused with BM25 keyword search when a lexical index is given.
     
     Args:
         query (str): The user's question or query
         k (int): Number of relevant chunks to retrieve
         index: FAISS index object (optional)
-        dataset: List of data dicts with "text" key (optional)
+        dataset: ChunkTable, or list of dicts with a "text" key (optional)
+        nprobe: IVF lists to visit per query (IVF indexes only)
+        ef_search: HNSW search breadth (HNSW indexes only)
+        query_embedding: Embedding of `query`, if the caller already has it
+        lexical: BM25Index over the same rows as `index` (optional)
         
     Returns:
         List[str]: List of relevant text chunks
     """
     try:
-        # Load index if not provided
+        index, processed_data = _resolve_corpus(index, dataset)
         if index is None:
-            if not INDEX_PATH.exists():
-                print(f"Warning: FAISS index not found at {INDEX_PATH}. Please run the ingestion script.")
-                return []
-            index = load_faiss_index(str(INDEX_PATH))
-        
-        # Load dataset if not provided
-        processed_data = dataset
-        if processed_data is None:
-            if not PROCESSED_DATA_PATH.exists():
-                 print(f"Warning: Processed data not found at {PROCESSED_DATA_PATH}.")
-                 return []
-            with open(PROCESSED_DATA_PATH, "r", encoding="utf-8") as f:
-                processed_data = json.load(f)
+            return []
             
         # Generate embedding for the query
-        query_embedding = get_embedding(query)
-        query_embedding = np.array(query_embedding, dtype=np.float32)
+        if query_embedding is None:
+            with span("embed_query"):
+                query_embedding = embed_query(query)
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
 
-        # Search
-        distances, indices = search(index, query_embedding, k=k, return_distances=True)
-        
-        results = []
-        for idx in indices:
-            if 0 <= idx < len(processed_data):
-                results.append(processed_data[idx]["text"])
-                
-        return results
+        return _search_context(query_embedding, k, index, processed_data, nprobe, ef_search, query, lexical)
         
     except Exception as e:
         print(f"Error in retrieval: {str(e)}")
         return []
+
+async def aretrieve_relevant_context(
+    query: str, 
+    k: int = 3, 
+    index=None, 
+    dataset: List[dict] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    query_embedding: Optional[np.ndarray] = None,
+    lexical=None
+) -> List[str]:
+    """
+    Async version of `retrieve_relevant_context`.
+    
+    The query is embedded over the async HTTP client (or in a batch with
+    concurrent queries); loading the on-disk corpus and the FAISS search
+    run in a worker thread or the search batcher.
+    """
+    try:
+        if index is None or dataset is None:
+            index, dataset = await asyncio.to_thread(_resolve_corpus, index, dataset)
+            if index is None:
+                return []
+
+        if query_embedding is None:
+            with span("embed_query"):
+                query_embedding = await aembed_query(query)
+        n_candidates = _n_candidates(k, query, lexical)
+        with span("search"):
+            _, indices = await asearch_query(index, query_embedding, n_candidates, nprobe, ef_search)
+        return await asyncio.to_thread(_collect_context, indices, k, dataset, query, lexical, n_candidates)
+
+    except Exception as e:
+        print(f"Error in retrieval: {str(e)}")
+        return []
+
+def _resolve_corpus(index, dataset):
+    """Fill in a missing index or dataset from the on-disk corpus."""
+    # Fall back to the on-disk corpus, kept loaded by the index manager
+    if index is None or dataset is None:
+        snapshot = get_index_manager().get()
+        if snapshot is None:
+            return None, None
+        if index is None:
+            index = snapshot.index
+        if dataset is None:
+            dataset = snapshot.dataset
+    return index, dataset
+
+def _n_candidates(k, query, lexical) -> int:
+    hybrid = USE_HYBRID_SEARCH and lexical is not None and query
+    return max(k, HYBRID_CANDIDATES) if hybrid else k
+
+def _search_context(query_embedding, k, index, processed_data, nprobe, ef_search, query=None, lexical=None) -> List[str]:
+    n_candidates = _n_candidates(k, query, lexical)
+
+    # Search, together with concurrent queries when batching is enabled
+    with span("search"):
+        _, indices = search_query(index, query_embedding, n_candidates, nprobe, ef_search)
+    return _collect_context(indices, k, processed_data, query, lexical, n_candidates)
+
+def _collect_context(indices, k, processed_data, query, lexical, n_candidates) -> List[str]:
+    """Fuse the vector hits with BM25 (if enabled) and look up the texts."""
+    rows = [int(idx) for idx in indices if 0 <= idx < len(processed_data)]
+
+    if USE_HYBRID_SEARCH and lexical is not None and query:
+        with span("lexical_search"):
+            lexical_rows, _ = lexical.search(query, n_candidates)
+        rows = reciprocal_rank_fusion(
+            [rows, [int(row) for row in lexical_rows if row < len(processed_data)]]
+        )[:k]
+
+    count("chunks_retrieved", len(rows))
+    if isinstance(processed_data, ChunkTable):
+        # Decoded straight from the table, no per-chunk dict
+        return [processed_data.text(row) for row in rows]
+    return [processed_data[row]["text"] for row in rows]
+
+def reciprocal_rank_fusion(rankings: List[List[int]], rrf_k: int = RRF_K) -> List[int]:
+    """
+    Merge ranked lists of rows: each row scores sum(1 / (rrf_k + rank)).
+
+    Returns:
+        List[int]: Rows ordered by fused score, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the app as `src.…`, like the scripts run from local_qna_chatbot/
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,68 @@
+import numpy as np
+
+from src.rag.answer_cache import AnswerCache
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_exact_hit_ignores_case_and_whitespace():
+    cache = AnswerCache()
+    cache.put("What is FAISS?", 1, 0.0, "A library", ["chunk"])
+
+    hit = cache.get("  what is   faiss? ", 1, 0.0)
+
+    assert hit is not None and hit.response == "A library"
+    assert hit.context == ["chunk"]
+
+
+def test_semantic_hit_needs_same_temperature_bucket():
+    cache = AnswerCache()
+    cache.put("What is FAISS?", 1, 0.0, "A library", [], embedding=unit(1, 0, 0))
+
+    assert cache.get_similar(unit(1, 0.01, 0), 1, 0.0).response == "A library"
+    assert cache.get_similar(unit(1, 0.01, 0), 1, 0.7) is None
+    assert cache.get_similar(unit(0, 1, 0), 1, 0.0) is None
+
+
+def test_new_version_clears_cache():
+    cache = AnswerCache()
+    cache.put("What is FAISS?", 1, 0.0, "A library", [], embedding=unit(1, 0, 0))
+
+    assert cache.get("What is FAISS?", 2, 0.0) is None
+    assert cache.get_similar(unit(1, 0, 0), 2, 0.0) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_outdated_version_is_neither_served_nor_stored():
+    cache = AnswerCache()
+    cache.put("What is FAISS?", 2, 0.0, "Current", [])
+
+    # A request that retrieved before the collection changed
+    cache.put("What is FAISS?", 1, 0.0, "Stale", [])
+    assert cache.get("What is FAISS?", 1, 0.0) is None
+
+    assert cache.get("What is FAISS?", 2, 0.0).response == "Current"
+
+
+def test_expired_answers_are_dropped():
+    cache = AnswerCache(ttl=0.0)
+    cache.put("What is FAISS?", 1, 0.0, "A library", [], embedding=unit(1, 0, 0))
+
+    assert cache.get("What is FAISS?", 1, 0.0) is None
+    assert cache.get_similar(unit(1, 0, 0), 1, 0.0) is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("first", 1, 0.0, "1", [], embedding=unit(1, 0, 0))
+    cache.put("second", 1, 0.0, "2", [], embedding=unit(0, 1, 0))
+    cache.get("first", 1, 0.0)
+    cache.put("third", 1, 0.0, "3", [], embedding=unit(0, 0, 1))
+
+    assert cache.get("second", 1, 0.0) is None
+    assert cache.get_similar(unit(0, 1, 0), 1, 0.0) is None
+    assert cache.get("first", 1, 0.0).response == "1"
+    assert cache.get("third", 1, 0.0).response == "3"
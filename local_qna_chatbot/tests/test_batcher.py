@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+import pytest
+
+from src.monitoring import Trace, count, use_trace
+from src.rag import batcher
+from src.rag.batcher import MicroBatcher
+
+
+def test_callers_get_their_own_results():
+    seen = []
+
+    def process(key, items):
+        seen.append((key, list(items)))
+        return [f"{key}:{item}" for item in items]
+
+    micro = MicroBatcher(process, window=0.05, workers=2)
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(lambda i: micro.call(i % 2, i), range(64)))
+
+    assert results == [f"{i % 2}:{i}" for i in range(64)]
+    # Items were grouped by key, and some batches held several
+    assert all(all(item % 2 == key for item in items) for key, items in seen)
+    assert micro.stats()["queries"] == 64
+    assert micro.stats()["largest_batch"] > 1
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    release = threading.Event()
+
+    def process(key, items):
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    micro = MicroBatcher(process, window=0.05)
+    futures = [micro.submit(None, i) for i in range(4)]
+    release.set()
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="boom"):
+            future.result(5)
+
+
+def test_cancelled_callers_are_skipped():
+    started, release = threading.Event(), threading.Event()
+    processed = []
+
+    def process(key, items):
+        started.set()
+        release.wait(5)
+        processed.extend(items)
+        return items
+
+    micro = MicroBatcher(process, window=0.0)
+    first = micro.submit("a", 1)
+    started.wait(5)
+    # Queued behind the running batch, then given up on
+    second = micro.submit("a", 2)
+    assert second.cancel()
+    third = micro.submit("a", 3)
+    release.set()
+
+    assert first.result(5) == 1 and third.result(5) == 3
+    assert processed == [1, 3]
+
+
+def test_batch_stages_are_recorded_in_each_callers_trace():
+    barrier = threading.Barrier(3)
+
+    def process(key, items):
+        count("batch_items", len(items))
+        return items
+
+    micro = MicroBatcher(process, window=0.2)
+
+    def ask(i):
+        trace = Trace()
+        with use_trace(trace):
+            barrier.wait(5)
+            micro.call(None, i)
+        return trace
+
+    with ThreadPoolExecutor(3) as pool:
+        traces = list(pool.map(ask, range(3)))
+
+    assert sum(trace.counts["batch_items"] for trace in traces) >= 3
+    assert all(trace.counts.get("batch_items") for trace in traces)
+
+
+@pytest.mark.parametrize("kind", ["flat", "tailed"])
+def test_search_batch_slices_each_callers_k(kind):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 16), dtype=np.float32)
+    index = faiss.IndexFlatL2(16)
+    if kind == "flat":
+        index.add(vectors)
+    else:
+        from src.embeddings.index_factory import TailedIndex
+        index.add(vectors[:300])
+        index = TailedIndex(index, vectors[300:])
+    requests = [(vectors[i] + 0.01, k) for i, k in ((3, 1), (450, 5), (7, 12), (299, 5))]
+
+    results = batcher._search_batch((index, None, None), requests)
+
+    exact = faiss.IndexFlatL2(16)
+    exact.add(vectors)
+    for (query, k), (distances, ids) in zip(requests, results):
+        expected_distances, expected_ids = exact.search(query.reshape(1, -1), k)
+        assert len(ids) == k
+        np.testing.assert_array_equal(ids, expected_ids[0])
+        np.testing.assert_allclose(distances, expected_distances[0], rtol=1e-4)
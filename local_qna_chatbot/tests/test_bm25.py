@@ -0,0 +1,110 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from src.embeddings import bm25
+from src.embeddings.bm25 import BM25Index, terms
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+
+
+def corpus(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, rng.integers(1, 20))) for _ in range(n)]
+
+
+def reference_scores(texts, query, k1=bm25.BM25_K1, b=bm25.BM25_B):
+    """BM25 computed directly from the texts."""
+    docs = [Counter(terms(text)) for text in texts]
+    avg_len = sum(sum(doc.values()) for doc in docs) / len(docs)
+    scores = np.zeros(len(docs))
+    for term in set(terms(query)):
+        df = sum(term in doc for doc in docs)
+        if not df:
+            continue
+        idf = math.log(1.0 + (len(docs) - df + 0.5) / (df + 0.5))
+        for row, doc in enumerate(docs):
+            tf = doc[term]
+            length = sum(doc.values())
+            scores[row] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+    return scores
+
+
+def assert_matches_reference(index, texts, query, k=10):
+    rows, scores = index.search(query, k)
+    expected = reference_scores(texts, query)
+    assert len(rows) == min(k, int((expected > 0).sum()))
+    np.testing.assert_allclose(scores, expected[rows], rtol=1e-5)
+    # No row left out scores higher than the last one returned
+    assert np.sort(expected)[::-1][len(rows) - 1] == pytest.approx(scores[-1], rel=1e-5)
+
+
+def test_compound_terms_keep_whole_and_parts():
+    assert terms("Error ERR_CONN_REFUSED in v2.3.1") == [
+        "error", "err_conn_refused", "in", "v2.3.1", "err", "conn", "refused", "v2", "3", "1"
+    ]
+
+
+@pytest.mark.parametrize("query", ["alpha", "beta gamma", "kappa mu zeta alpha", "unknown"])
+def test_search_matches_reference(query):
+    texts = corpus(200)
+    index = BM25Index.build(texts)
+    if query == "unknown":
+        assert len(index.search(query, 10)[0]) == 0
+    else:
+        assert_matches_reference(index, texts, query)
+
+
+def test_merged_and_buffered_postings_search_alike(monkeypatch):
+    # Merge every few batches, so searches see main arrays plus a buffered delta
+    monkeypatch.setattr(bm25, "MERGE_POSTINGS", 50)
+    texts = corpus(300)
+    index = BM25Index()
+    for start in range(0, len(texts), 7):
+        index.add(texts[start:start + 7])
+        assert_matches_reference(index, texts[:start + 7], "alpha delta")
+    assert index._delta_postings < 50
+
+
+def test_compacted_equals_index_of_kept_rows(monkeypatch):
+    monkeypatch.setattr(bm25, "MERGE_POSTINGS", 50)
+    texts = corpus(120)
+    index = BM25Index()
+    index.add(texts[:60])
+    index.add(texts[60:])
+    keep = [row for row in range(len(texts)) if row % 3]
+
+    compacted = index.compacted(keep)
+    kept_texts = [texts[row] for row in keep]
+
+    assert len(compacted) == len(keep)
+    assert_matches_reference(compacted, kept_texts, "gamma theta")
+    # The original is unchanged
+    assert_matches_reference(index, texts, "gamma theta")
+    # Rows appended after compaction follow on
+    compacted.add(["omicron"])
+    assert compacted.search("omicron", 5)[0].tolist() == [len(keep)]
+
+
+def test_compacted_to_nothing():
+    index = BM25Index.build(corpus(10))
+    empty = index.compacted([])
+    assert len(empty) == 0
+    assert len(empty.search("alpha", 5)[0]) == 0
+    empty.add(["alpha"])
+    assert empty.search("alpha", 5)[0].tolist() == [0]
+
+
+def test_save_and_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "MERGE_POSTINGS", 50)
+    texts = corpus(80)
+    index = BM25Index()
+    index.add(texts)
+    index.save(tmp_path / "bm25.npz")
+
+    loaded = BM25Index.load(tmp_path / "bm25.npz")
+
+    assert len(loaded) == len(texts)
+    assert_matches_reference(loaded, texts, "iota lambda")
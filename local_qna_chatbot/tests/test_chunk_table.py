@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from src.embeddings.chunk_table import COLUMNS, OFFSETS_FILE, TEXT_FILE, ChunkTable, _column_file, replace_table
+
+
+def texts(start: int, stop: int):
+    # Multi-byte characters, so byte and character offsets differ
+    return [f"chunk {i} é漢{'x' * (i % 5)}" for i in range(start, stop)]
+
+
+def assert_rows(table, expected_texts, doc_ids=None):
+    assert len(table) == len(expected_texts)
+    assert list(table.texts()) == expected_texts
+    assert [table.text(row) for row in range(len(table))] == expected_texts
+    if doc_ids is not None:
+        assert table.column("doc_id").tolist() == doc_ids
+
+
+def test_save_and_open_round_trip(tmp_path):
+    table = ChunkTable()
+    table.append(texts(0, 3), [{"start": 0, "end": 10, "page": 1}, {"page": None}, {}], doc_id=7)
+    table.save(tmp_path)
+
+    opened = ChunkTable.open(tmp_path)
+
+    assert_rows(opened, texts(0, 3), [7, 7, 7])
+    assert opened[0] == {"id": 1, "text": texts(0, 1)[0], "doc_id": 7, "start": 0, "end": 10, "page": 1, "page_end": None}
+    assert opened[1]["page"] is None
+    assert opened[-1]["id"] == 3
+
+
+def test_appends_after_save_are_written_incrementally(tmp_path):
+    table = ChunkTable()
+    table.append(texts(0, 4), doc_id=1)
+    table.save(tmp_path)
+    table.append(texts(4, 6), doc_id=2)
+    table.append(texts(6, 9), doc_id=3)
+    # Rows past the saved ones are searchable before they are written
+    assert_rows(table, texts(0, 9), [1] * 4 + [2] * 2 + [3] * 3)
+
+    table.save(tmp_path, saved_rows=4)
+
+    assert_rows(ChunkTable.open(tmp_path), texts(0, 9), [1] * 4 + [2] * 2 + [3] * 3)
+
+
+def test_interrupted_save_is_cut_back_to_the_committed_rows(tmp_path):
+    table = ChunkTable()
+    table.append(texts(0, 5), doc_id=1)
+    table.save(tmp_path)
+    # A save that died after writing text and some columns, before the offsets
+    with open(tmp_path / TEXT_FILE, "ab") as f:
+        f.write("half written".encode("utf-8"))
+    with open(tmp_path / _column_file("doc_id"), "ab") as f:
+        f.write(np.array([9, 9], dtype=COLUMNS["doc_id"]).tobytes())
+
+    assert_rows(ChunkTable.open(tmp_path), texts(0, 5), [1] * 5)
+
+    table = ChunkTable.open(tmp_path)
+    table.append(texts(5, 7), doc_id=2)
+    table.save(tmp_path, saved_rows=5)
+    assert_rows(ChunkTable.open(tmp_path), texts(0, 7), [1] * 5 + [2] * 2)
+
+
+def test_rows_past_a_given_count_are_ignored(tmp_path):
+    table = ChunkTable()
+    table.append(texts(0, 6))
+    table.save(tmp_path)
+
+    assert_rows(ChunkTable.open(tmp_path, rows=4), texts(0, 4))
+    with pytest.raises(ValueError):
+        ChunkTable.open(tmp_path, rows=7)
+
+
+def test_offsets_beyond_the_text_are_rejected(tmp_path):
+    table = ChunkTable()
+    table.append(texts(0, 3))
+    table.save(tmp_path)
+    with open(tmp_path / TEXT_FILE, "r+b") as f:
+        f.truncate(5)
+
+    with pytest.raises(ValueError):
+        ChunkTable.open(tmp_path)
+
+
+def test_empty_table(tmp_path):
+    ChunkTable().save(tmp_path)
+
+    opened = ChunkTable.open(tmp_path)
+
+    assert len(opened) == 0
+    assert (tmp_path / OFFSETS_FILE).stat().st_size == 0
+    with pytest.raises(IndexError):
+        opened.text(0)
+
+
+def test_compacted_keeps_rows_across_segments(tmp_path):
+    table = ChunkTable()
+    table.append(texts(0, 4), doc_id=1)
+    table.save(tmp_path)
+    table.append(texts(4, 8), doc_id=2)
+    keep = [0, 3, 4, 7]
+
+    compacted = table.compacted(keep)
+
+    assert_rows(compacted, [texts(0, 8)[row] for row in keep], [1, 1, 2, 2])
+    assert_rows(table, texts(0, 8))
+
+
+def test_unknown_metadata_is_rejected():
+    with pytest.raises(ValueError):
+        ChunkTable().append(["text"], [{"colour": 1}])
+
+
+def test_replace_table(tmp_path):
+    directory = tmp_path / "chunks"
+    old = ChunkTable()
+    old.append(texts(0, 5))
+    old.save(directory)
+    new = ChunkTable()
+    new.append(texts(10, 12))
+
+    replace_table(new, directory)
+
+    assert_rows(ChunkTable.open(directory), texts(10, 12))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["chunks"]
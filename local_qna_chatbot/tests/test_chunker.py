@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.ingestion.chunker import chunk_document, tokenize
+from src.ingestion.cleaner import clean_text
+
+
+def document(sentences: int = 120) -> str:
+    rng = np.random.default_rng(0)
+    words = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+    text = []
+    for i in range(sentences):
+        text.append(" ".join(rng.choice(words, rng.integers(5, 15))).capitalize() + ".")
+        text.append("\n\n" if i % 7 == 6 else "  ")
+    return "".join(text)
+
+
+def token_index(text: str):
+    starts, ends = tokenize(text)
+    return {int(start): i for i, start in enumerate(starts)}, {int(end): i for i, end in enumerate(ends)}
+
+
+def test_tokens_are_words_and_punctuation():
+    text = "Hello, world! It's 3.5"
+    starts, ends = tokenize(text)
+    assert [text[s:e] for s, e in zip(starts, ends)] == ["Hello", ",", "world", "!", "It", "'", "s", "3", ".", "5"]
+
+
+@pytest.mark.parametrize("respect_boundaries", [False, True])
+def test_offsets_locate_chunk_text(respect_boundaries):
+    text = document()
+    chunks = list(chunk_document([text], size=40, overlap=8, respect_boundaries=respect_boundaries))
+
+    assert len(chunks) > 5
+    for chunk in chunks:
+        assert chunk.text == clean_text(text[chunk.start:chunk.end])
+    assert chunks[0].start == 0
+    assert chunks[-1].end == len(text.rstrip())
+
+
+def test_fixed_windows_overlap_by_exactly_overlap_tokens():
+    text = document()
+    by_start, by_end = token_index(text)
+    chunks = list(chunk_document([text], size=40, overlap=8, respect_boundaries=False))
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        first, last = by_start[previous.start], by_end[previous.end]
+        assert last - first + 1 == 40
+        assert by_start[chunk.start] == last + 1 - 8
+
+
+def test_boundaries_end_chunks_at_sentence_ends():
+    text = document()
+    chunks = list(chunk_document([text], size=40, overlap=8, respect_boundaries=True))
+
+    for chunk in chunks[:-1]:
+        assert text[chunk.end - 1] == "."
+    # Consecutive chunks still overlap
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start < previous.end
+
+
+@pytest.mark.parametrize("piece_size", [1, 7, 100, 1000])
+def test_pieces_give_the_same_chunks_as_the_whole_text(piece_size):
+    text = document()
+    pieces = [text[i:i + piece_size] for i in range(0, len(text), piece_size)]
+
+    assert list(chunk_document(pieces, size=40, overlap=8)) == list(chunk_document([text], size=40, overlap=8))
+
+
+def test_pages_are_recorded_per_chunk():
+    pages = [document(10), document(10), document(10)]
+    chunks = list(chunk_document(pages, size=30, overlap=5, paged=True))
+
+    page_starts = np.cumsum([0] + [len(page) for page in pages])
+    for chunk in chunks:
+        assert chunk.page == np.searchsorted(page_starts, chunk.start, side="right")
+        assert chunk.page_end == np.searchsorted(page_starts, chunk.end - 1, side="right")
+    assert chunks[0].page == 1 and chunks[-1].page_end == 3
+
+
+def test_short_and_empty_documents():
+    assert list(chunk_document([""])) == []
+    chunks = list(chunk_document(["Just a few words."], size=40, overlap=8))
+    assert [chunk.text for chunk in chunks] == ["Just a few words."]
+
+
+@pytest.mark.parametrize("size, overlap", [(0, 0), (10, 10), (10, -1)])
+def test_invalid_sizes_are_rejected(size, overlap):
+    with pytest.raises(ValueError):
+        list(chunk_document(["text"], size=size, overlap=overlap))
@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.rag import collections
+from src.rag.collections import CollectionRegistry
+
+
+class FakeStore:
+    def memory_bytes(self):
+        return 0
+
+    def flush(self):
+        pass
+
+
+class SlowPipeline:
+    """Stands in for RAGPipeline; collections named "slow..." load until `release` is set."""
+    release = threading.Event()
+    loads = []
+
+    def __init__(self, store_dir, **options):
+        SlowPipeline.loads.append(store_dir.name)
+        if store_dir.name.startswith("slow"):
+            assert SlowPipeline.release.wait(10)
+        if store_dir.name.startswith("broken"):
+            raise OSError("unreadable store")
+        self.store = FakeStore()
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    SlowPipeline.release = threading.Event()
+    SlowPipeline.loads = []
+    monkeypatch.setattr(collections, "RAGPipeline", SlowPipeline)
+    return CollectionRegistry(root=tmp_path)
+
+
+def test_slow_load_does_not_block_other_collections(registry):
+    loaded = registry.get("fast")
+    with ThreadPoolExecutor(4) as pool:
+        slow = [pool.submit(registry.get, "slow") for _ in range(3)]
+        time.sleep(0.1)
+
+        # Served while "slow" is still loading
+        started = time.perf_counter()
+        assert registry.get("fast") is loaded
+        assert registry.get("other") is not None
+        assert time.perf_counter() - started < 1.0
+        assert not any(future.done() for future in slow)
+
+        SlowPipeline.release.set()
+        pipelines = {id(future.result(timeout=10)) for future in slow}
+
+    # Concurrent requests shared one load
+    assert len(pipelines) == 1
+    assert SlowPipeline.loads.count("slow") == 1
+
+
+def test_failed_load_raises_and_is_tried_again(registry):
+    with pytest.raises(OSError):
+        registry.get("broken")
+    with pytest.raises(OSError):
+        registry.pin("broken")
+
+    assert SlowPipeline.loads.count("broken") == 2
+    assert [entry["collection_id"] for entry in registry.list() if entry["loaded"]] == []
@@ -0,0 +1,130 @@
+from typing import Callable, List, Optional
+
+import numpy as np
+import pytest
+
+from src.embeddings.embedder import Embedder
+from src.embeddings.embedding_job import EmbeddingJob, embed_with_retry
+
+
+class FakeEmbedder(Embedder):
+    """Embeds text i as a one-hot-ish vector, in batches of 2, failing on chosen calls."""
+
+    backend = "fake"
+
+    def __init__(self, fail_calls=(), error=ConnectionError):
+        super().__init__("fake-model")
+        self.fail_calls = set(fail_calls)
+        self.error = error
+        self.calls = 0
+        self.texts: List[str] = []
+
+    def _embed_uncached(self, texts: List[str], on_progress: Optional[Callable[[int], None]] = None) -> np.ndarray:
+        self.calls += 1
+        vectors = []
+        for start in range(0, len(texts), 2):
+            # Fail part-way through, after some progress was reported
+            if self.calls in self.fail_calls and start > 0:
+                raise self.error("embedding server went away")
+            batch = texts[start:start + 2]
+            vectors.extend(vector(text) for text in batch)
+            self.texts.extend(batch)
+            if on_progress:
+                on_progress(len(batch))
+        return np.vstack(vectors)
+
+
+def vector(text: str) -> np.ndarray:
+    v = np.zeros(4, dtype=np.float32)
+    v[int(text.split()[-1]) % 4] = 1.0
+    v[3] += 0.5
+    return v / np.linalg.norm(v)
+
+
+def text(row: int) -> str:
+    return f"chunk {row}"
+
+
+def make_job(directory, rows, shard_size=3, hashes=None):
+    rows = np.asarray(rows)
+    hashes = rows + 100 if hashes is None else hashes
+    return EmbeddingJob(directory, rows, hashes, "fake:fake-model", shard_size=shard_size)
+
+
+def job_vectors(job):
+    return {int(row): np.asarray(v) for rows, vectors in job.shards() for row, v in zip(rows, vectors)}
+
+
+def test_retry_reports_each_text_once():
+    progress = []
+    embedder = FakeEmbedder(fail_calls={1, 2})
+
+    vectors = embed_with_retry(embedder, [text(i) for i in range(7)], delay=0.0, on_progress=progress.append)
+
+    assert embedder.calls == 3
+    assert len(vectors) == 7
+    assert sum(progress) == 7
+
+
+def test_errors_that_are_not_transient_are_not_retried():
+    embedder = FakeEmbedder(fail_calls={1}, error=ValueError)
+
+    with pytest.raises(ValueError):
+        embed_with_retry(embedder, [text(i) for i in range(5)], delay=0.0)
+    assert embedder.calls == 1
+
+
+def test_job_embeds_every_row_in_shards(tmp_path):
+    rows = [5, 1, 9, 3, 7, 2, 8]
+    progress = []
+    job = make_job(tmp_path / "job", rows)
+
+    job.run(FakeEmbedder(), text, on_progress=progress.append)
+
+    assert job.done and job.n_shards == 3 and job.dimension == 4
+    assert sum(progress) == len(rows)
+    vectors = job_vectors(job)
+    assert sorted(vectors) == sorted(rows)
+    for row, v in vectors.items():
+        np.testing.assert_allclose(v, vector(text(row)))
+
+
+def test_interrupted_job_resumes_after_last_completed_shard(tmp_path):
+    rows = list(range(10))
+    job = make_job(tmp_path / "job", rows)
+    # Shard 0 succeeds, shard 1 fails for good
+    with pytest.raises(ValueError):
+        job.run(FakeEmbedder(fail_calls={2}, error=ValueError), text)
+    assert job.completed == 1
+
+    resumed = make_job(tmp_path / "job", rows)
+    embedder = FakeEmbedder()
+    progress = []
+    resumed.run(embedder, text, on_progress=progress.append)
+
+    assert resumed.done
+    # Only the rows of the unfinished shards were embedded again
+    assert embedder.texts == [text(row) for row in rows[3:]]
+    assert sum(progress) == len(rows)
+    assert sorted(job_vectors(resumed)) == rows
+
+
+def test_job_for_other_rows_starts_over(tmp_path):
+    job = make_job(tmp_path / "job", range(6))
+    job.run(FakeEmbedder(), text)
+
+    changed = make_job(tmp_path / "job", range(6), hashes=np.arange(6) + 200)
+    assert changed.completed == 0
+    assert list(changed.shards()) == []
+
+    other_shards = make_job(tmp_path / "job", range(6), shard_size=4)
+    assert other_shards.completed == 0
+
+
+def test_training_sample_spreads_over_shards(tmp_path):
+    job = make_job(tmp_path / "job", range(10))
+    job.run(FakeEmbedder(), text)
+
+    sample = job.training_sample(4)
+
+    assert sample.shape == (4, 4)
@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.ingestion.incremental import DELETED, chunk_hash, load_state, update_chunks, update_processed
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+
+
+def text(seed: int, sentences: int = 150) -> str:
+    rng = np.random.default_rng(seed)
+    return "  ".join(" ".join(rng.choice(WORDS, rng.integers(5, 15))).capitalize() + "." for _ in range(sentences))
+
+
+def live_texts(state):
+    return {key: [state.table.text(row) for row in entry["rows"]] for key, entry in state.records.items()}
+
+
+def test_first_run_adds_every_chunk():
+    state, stats = update_chunks([{"id": 1, "text": text(1)}, {"id": 2, "text": text(2)}], None)
+
+    assert (stats.added, stats.changed, stats.unchanged) == (2, 0, 0)
+    assert stats.new_chunks == len(state.table) == len(state.hashes) > 2
+    assert state.hashes.tolist() == [chunk_hash(t) for t in state.table.texts()]
+    assert sorted(row for entry in state.records.values() for row in entry["rows"]) == list(range(len(state.table)))
+
+
+def test_unchanged_records_keep_their_rows():
+    records = [{"id": 1, "text": text(1)}, {"id": 2, "text": text(2)}]
+    first, _ = update_chunks(records, None)
+    rows = {key: list(entry["rows"]) for key, entry in first.records.items()}
+    n_rows = len(first.table)
+
+    state, stats = update_chunks(records, first)
+
+    assert (stats.unchanged, stats.new_chunks, stats.deleted_chunks) == (2, 0, 0)
+    assert len(state.table) == n_rows
+    assert {key: entry["rows"] for key, entry in state.records.items()} == rows
+
+
+def test_changed_record_reuses_rows_of_unchanged_chunks():
+    original = text(1)
+    first, _ = update_chunks([{"id": 1, "text": original}], None)
+    old_rows = first.records["id:1"]["rows"]
+    n_rows = len(first.table)
+
+    # Only the end changes, so the leading chunks keep their text and offsets
+    edited = original[:-200] + " Omega omega omega."
+    state, stats = update_chunks([{"id": 1, "text": edited}], first)
+    new_rows = state.records["id:1"]["rows"]
+
+    assert stats.changed == 1
+    assert new_rows[:-2] == old_rows[:-2]
+    assert all(row in old_rows or row >= n_rows for row in new_rows)
+    # Old rows no longer used are tombstoned, never renumbered or reused
+    dropped = sorted(set(old_rows) - set(new_rows))
+    assert dropped and stats.deleted_chunks == len(dropped)
+    assert (state.hashes[dropped] == DELETED).all()
+    assert (state.hashes[new_rows] != DELETED).all()
+    assert live_texts(state)["id:1"] == live_texts(update_chunks([{"id": 1, "text": edited}], None)[0])["id:1"]
+
+
+def test_removed_record_is_tombstoned():
+    first, _ = update_chunks([{"id": 1, "text": text(1)}, {"id": 2, "text": text(2)}], None)
+    removed_rows = first.records["id:2"]["rows"]
+
+    state, stats = update_chunks([{"id": 1, "text": text(1)}], first)
+
+    assert (stats.removed, stats.deleted_chunks) == (1, len(removed_rows))
+    assert (state.hashes[removed_rows] == DELETED).all()
+    assert len(state.table) == len(first.table)
+
+
+def test_records_without_id_are_keyed_by_content():
+    first, _ = update_chunks([{"text": text(1)}, {"text": text(2)}], None)
+
+    # Reordered: same content, same rows
+    state, stats = update_chunks([{"text": text(2)}, {"text": text(1)}], first)
+
+    assert (stats.unchanged, stats.new_chunks) == (2, 0)
+
+
+def test_executor_gives_the_same_rows():
+    records = [{"id": i, "text": text(i, 40)} for i in range(10)]
+    serial, _ = update_chunks(records, None, batch_records=3)
+    with ThreadPoolExecutor(2) as executor:
+        pooled, _ = update_chunks(records, None, executor=executor, batch_records=3)
+
+    assert pooled.records == serial.records
+    assert list(pooled.table.texts()) == list(serial.table.texts())
+
+
+def test_update_processed_resumes_from_disk(tmp_path):
+    records = [{"id": i, "text": text(i, 40)} for i in range(5)]
+    update_processed(records, tmp_path, flush_rows=4)
+    saved = load_state(tmp_path)
+
+    records[2] = {"id": 2, "text": text(20, 40)}
+    stats = update_processed(records, tmp_path, flush_rows=4)
+    state = load_state(tmp_path)
+
+    assert (stats.unchanged, stats.changed) == (4, 1)
+    assert len(state.table) == len(state.hashes) == len(saved.table) + stats.new_chunks
+    assert live_texts(state) == live_texts(update_chunks(records, None)[0])
+
+
+def test_rows_of_an_unfinished_run_are_ignored(tmp_path):
+    records = [{"id": i, "text": text(i, 40)} for i in range(3)]
+    update_processed(records, tmp_path)
+    state = load_state(tmp_path)
+    # Rows written by a run that died before writing the hashes
+    state.table.append(["orphan"])
+    state.table.save(tmp_path / "chunks", len(state.hashes))
+
+    reloaded = load_state(tmp_path)
+
+    assert len(reloaded.table) == len(state.hashes)
+    stats = update_processed(records, tmp_path)
+    assert stats.unchanged == 3
+    assert len(load_state(tmp_path).table) == len(state.hashes)
@@ -0,0 +1,99 @@
+import faiss
+import numpy as np
+import pytest
+
+from src.embeddings.index_factory import index_kind
+from src.embeddings.index_store import IndexStore
+
+DIMENSION = 16
+# Enough vectors to train the IVF index types
+TRAINED_ROWS = 12000
+
+
+def vectors(n: int, seed: int) -> np.ndarray:
+    embeddings = np.random.default_rng(seed).standard_normal((n, DIMENSION), dtype=np.float32)
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def add(store: IndexStore, name: str, embeddings: np.ndarray) -> dict:
+    texts = [f"{name} chunk {i}" for i in range(len(embeddings))]
+    return store.add_document(name, embeddings, texts, content_hash=name, embedding_model="test")
+
+
+def nearest(store: IndexStore, queries: np.ndarray) -> np.ndarray:
+    return store.snapshot().index.search(queries, 1)[1][:, 0]
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_reloaded_ivf_store_takes_new_documents(tmp_path, index_type):
+    store = IndexStore(tmp_path, index_type=index_type)
+    add(store, "first", vectors(TRAINED_ROWS, 0))
+    assert index_kind(store.index) == index_type
+
+    reloaded = IndexStore(tmp_path, index_type=index_type)
+    assert reloaded.load()
+    second = vectors(500, 1)
+    add(reloaded, "second", second)
+
+    assert len(reloaded) == TRAINED_ROWS + 500
+    reopened = IndexStore(tmp_path, index_type=index_type)
+    assert reopened.load()
+    assert reopened.index.ntotal == TRAINED_ROWS + 500
+    assert [doc["name"] for doc in reopened.documents] == ["first", "second"]
+    if index_type == "ivf_flat":
+        assert (nearest(reopened, second[:20]) == np.arange(TRAINED_ROWS, TRAINED_ROWS + 20)).all()
+
+
+@pytest.mark.parametrize("index_type, rows", [("flat", 300), ("hnsw", 300), ("ivf_flat", TRAINED_ROWS)])
+def test_rows_written_after_the_last_commit_are_dropped_on_load(tmp_path, index_type, rows):
+    store = IndexStore(tmp_path, index_type=index_type)
+    committed = vectors(rows, 0)
+    add(store, "committed", committed)
+    # A crash between writing the index and the manifest
+    doc = store.begin_document("interrupted")
+    store.append_chunks(doc["doc_id"], vectors(50, 1), [f"lost {i}" for i in range(50)], persist=False)
+    store._fold_tail()
+    faiss.write_index(store.index, str(store.index_path))
+
+    reloaded = IndexStore(tmp_path, index_type=index_type)
+    assert reloaded.load()
+
+    assert reloaded.index.ntotal == len(reloaded) == rows
+    assert index_kind(reloaded.index) == index_type
+    assert (nearest(reloaded, committed[:20]) == np.arange(20)).all()
+
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    if index_kind(index) in ("ivf_flat", "ivf_pq"):
+        index = faiss.clone_index(index)
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+@pytest.mark.parametrize("index_type, rows", [
+    ("flat", 300), ("hnsw", 300), ("ivf_flat", TRAINED_ROWS), ("ivf_pq", TRAINED_ROWS)
+])
+def test_removing_a_document_keeps_the_other_rows_exactly(tmp_path, index_type, rows):
+    store = IndexStore(tmp_path, index_type=index_type)
+    add(store, "first", vectors(rows, 0))
+    removed = add(store, "removed", vectors(200, 1))
+    last = vectors(100, 2)
+    add(store, "last", last)
+    before = reconstruct_all(store.index)
+
+    assert store.remove_document(removed["doc_id"])
+    # Exactly the same vectors: IVF-PQ codes are not quantized again
+    after = reconstruct_all(store.index)
+
+    kept = np.r_[0:rows, rows + 200:rows + 300]
+    assert index_kind(store.index) == index_type
+    assert store.index.ntotal == len(store) == rows + 100
+    np.testing.assert_array_equal(after, before[kept])
+    assert [store.chunks.text(row) for row in (rows - 1, rows)] == [f"first chunk {rows - 1}", "last chunk 0"]
+    if index_type != "ivf_pq":
+        assert (nearest(store, last[:20]) == np.arange(rows, rows + 20)).all()
+
+    reloaded = IndexStore(tmp_path, index_type=index_type)
+    assert reloaded.load()
+    np.testing.assert_array_equal(reconstruct_all(reloaded.index), after)
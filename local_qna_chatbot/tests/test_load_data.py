@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from src.ingestion import load_data
+from src.ingestion.load_data import iter_dataset, iter_json
+
+ITEMS = [
+    1.5, 2, -0.25, 10, 3e-2, -2E+10, 123456789, 0, True, None, "text",
+    {"id": 7, "question": "Why \"quoted\"?", "answer": "Café ☕ – naïve\nline"},
+    [1, [2, {"a": [3.75]}]], "", {}, [],
+]
+
+
+def write(tmp_path, text: str, name: str = "data.json"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("layout", ["compact", "spaced"])
+def test_array_split_at_every_offset(tmp_path, monkeypatch, layout):
+    text = json.dumps(ITEMS, ensure_ascii=False, indent=None if layout == "compact" else 1)
+    path = write(tmp_path, text)
+
+    for read_size in range(1, len(text) + 2):
+        monkeypatch.setattr(load_data, "READ_SIZE", read_size)
+        assert list(iter_json(path)) == ITEMS, read_size
+
+
+def test_numbers_cut_before_fraction_or_exponent(tmp_path, monkeypatch):
+    path = write(tmp_path, "[1.5, 2e+10, 3E-2]")
+
+    for read_size in (1, 2, 3, 4, 5):
+        monkeypatch.setattr(load_data, "READ_SIZE", read_size)
+        assert list(iter_json(path)) == [1.5, 2e+10, 3e-2]
+
+
+def test_json_lines_and_byte_order_mark(tmp_path):
+    path = write(tmp_path, "﻿" + "\n".join(json.dumps(item) for item in ITEMS) + "\n\n")
+
+    assert list(iter_json(path)) == ITEMS
+
+
+@pytest.mark.parametrize("text", ["[1, 2", "[1 2]", "[1, x]", '[{"a": 1}, "unterminated', "[1.5.]"])
+def test_invalid_arrays_raise(tmp_path, monkeypatch, text):
+    path = write(tmp_path, text)
+
+    for read_size in (1, 3, 1 << 20):
+        monkeypatch.setattr(load_data, "READ_SIZE", read_size)
+        with pytest.raises(ValueError):
+            list(iter_json(path))
+
+
+@pytest.mark.parametrize("read_size", [1, 4, 40, 1 << 16])
+def test_json_lines_with_raw_line_separators_in_strings(tmp_path, monkeypatch, read_size):
+    # Valid unescaped in JSON strings, and not line breaks of JSON Lines
+    items = [{"text": f"a\u2028b\u2029c\x85d {i}"} for i in range(3)]
+    path = write(tmp_path, "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items))
+    monkeypatch.setattr(load_data, "READ_SIZE", read_size)
+
+    assert list(iter_json(path)) == items
+
+
+def test_invalid_json_lines_name_the_line(tmp_path):
+    path = write(tmp_path, '{"a": 1}\n{"a": \n')
+
+    with pytest.raises(ValueError, match="line 2"):
+        list(iter_json(path))
+
+
+def test_oversized_item_raises_without_reading_the_rest(tmp_path, monkeypatch):
+    monkeypatch.setattr(load_data, "READ_SIZE", 16)
+    monkeypatch.setattr(load_data, "MAX_ITEM_SIZE", 64)
+    path = write(tmp_path, '[1, "' + "x" * 10000 + '"]')
+    reads = []
+    original = load_data._refill
+
+    def refill(f, buffer, pos):
+        result = original(f, buffer, pos)
+        reads.append(len(result[0]))
+        return result
+
+    monkeypatch.setattr(load_data, "_refill", refill)
+    with pytest.raises(ValueError):
+        list(iter_json(path))
+    assert max(reads) < 4 * 64
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(iter_json(tmp_path / "missing.json"))
+
+
+def test_iter_dataset_joins_question_and_answer(tmp_path):
+    path = write(tmp_path, json.dumps([{"id": 1, "question": "Q?", "answer": "A."}, {"answer": "Only"}]))
+
+    assert list(iter_dataset(str(path))) == [{"id": 1, "text": "Q? A."}, {"id": None, "text": "Only"}]
@@ -0,0 +1,40 @@
+import asyncio
+
+from src.monitoring import count, finish_trace, start_trace, trace_request, use_trace
+from src.monitoring import metrics
+
+
+def test_zero_counts_are_not_recorded():
+    with trace_request("/test") as trace:
+        count("test_zero_items", 0)
+        count("test_items", 3)
+    assert trace.counts == {"test_items": 3}
+    assert "test_zero_items" not in metrics.ITEMS.summary()
+
+
+def test_stream_trace_survives_a_generator_closed_in_another_task():
+    async def stages():
+        for i in range(3):
+            count("test_stream_items", 1)
+            yield i
+
+    async def main():
+        trace = start_trace()
+        events = stages()
+
+        async def step():
+            with use_trace(trace):
+                return await events.__anext__()
+
+        # Each step and the close run in a task of their own, as when a
+        # client disconnects from a streaming response
+        assert await asyncio.create_task(step()) == 0
+        assert await asyncio.create_task(step()) == 1
+        await asyncio.create_task(events.aclose())
+        finish_trace("/test/stream", trace)
+        return trace
+
+    trace = asyncio.run(main())
+    assert trace.counts == {"test_stream_items": 2}
+    assert metrics.current_trace() is None
+    assert metrics.REQUEST_SECONDS.summary()["/test/stream"]["count"] == 1
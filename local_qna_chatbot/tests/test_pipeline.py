@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from src.rag import generator, pipeline
+from src.rag.pipeline import RAGPipeline
+
+FAILING_STREAM = [
+    {"message": {"content": "The port"}, "done": False},
+    {"message": {"content": " is"}, "done": False},
+    # Ollama reports errors mid-stream as a line of its own
+    {"error": "model runner has unexpectedly stopped"},
+]
+WHOLE_STREAM = [
+    {"message": {"content": "The port"}, "done": False},
+    {"message": {"content": " is 8123."}, "done": False},
+    {"done": True, "eval_count": 2},
+]
+
+
+class FakeResponse:
+    def __init__(self, lines):
+        self.lines = [json.dumps(line) for line in lines]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        yield from self.lines
+
+    async def aiter_lines(self):
+        for line in self.lines:
+            yield line
+
+
+class FakeOllama:
+    def __init__(self, *streams):
+        self.streams = list(streams)
+
+    def post(self, *args, **kwargs):
+        return FakeResponse(self.streams.pop(0))
+
+    def stream(self, *args, **kwargs):
+        return FakeResponse(self.streams.pop(0))
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "embed_query", lambda query: np.ones(4, dtype=np.float32) / 2)
+    monkeypatch.setattr(RAGPipeline, "_retrieve", lambda self, query, query_embedding=None: ["The port is 8123."])
+    rag = RAGPipeline(store_dir=tmp_path, answer_cache=True, rerank=False)
+    rag.initialized = True
+    return rag
+
+
+def ask(rag, question="Which port?"):
+    events = list(rag.process_query_stream(question, temperature=0.0))
+    return "".join(event["content"] for event in events if event["type"] == "token"), events
+
+
+def test_answer_cut_short_by_an_error_is_not_cached(rag, monkeypatch):
+    monkeypatch.setattr(generator, "_session", FakeOllama(FAILING_STREAM, WHOLE_STREAM))
+
+    answer, events = ask(rag)
+    assert answer.startswith("The port is" + generator.ERROR_RESPONSE_PREFIX)
+    assert events[-1] == {"type": "done"}
+    assert rag.answer_cache.stats()["entries"] == 0
+
+    # Asked again, the question is answered anew
+    answer, events = ask(rag)
+    assert answer == "The port is 8123."
+    assert "cached" not in events[0]
+    assert rag.answer_cache.stats()["entries"] == 1
+    assert ask(rag)[1][0]["cached"] == "exact"
+
+
+def test_async_answer_cut_short_by_an_error_is_not_cached(rag, monkeypatch):
+    fake = FakeOllama(FAILING_STREAM)
+    monkeypatch.setattr(pipeline, "aembed_query", lambda query: asyncio.sleep(0, np.ones(4, dtype=np.float32) / 2))
+    monkeypatch.setattr(generator, "_get_async_client", lambda: fake)
+
+    async def aretrieve(self, query, query_embedding=None):
+        return ["The port is 8123."]
+
+    monkeypatch.setattr(RAGPipeline, "_aretrieve", aretrieve)
+
+    async def collect():
+        return [event async for event in rag.aprocess_query_stream("Which port?", temperature=0.0)]
+
+    events = asyncio.run(collect())
+    tokens = [event["content"] for event in events if event["type"] == "token"]
+    assert tokens[:2] == ["The port", " is"]
+    assert tokens[-1].startswith(generator.ERROR_RESPONSE_PREFIX)
+    assert rag.answer_cache.stats()["entries"] == 0
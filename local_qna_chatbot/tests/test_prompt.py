@@ -0,0 +1,76 @@
+from src.rag.prompt import MIN_TRIMMED_TOKENS, estimate_tokens, pack_context
+
+
+def sentence(tag: str, words: int = 6) -> str:
+    """A sentence of words found in no other sentence, so nothing counts as a duplicate."""
+    return " ".join(f"{tag}{i}" for i in range(words)).capitalize() + "."
+
+
+def chunk(tag: str, sentences: int = 4) -> str:
+    return " ".join(sentence(f"{tag}s{i}x") for i in range(sentences))
+
+
+def test_whole_chunks_fit_the_budget_in_rank_order():
+    context = [chunk("a"), chunk("b"), chunk("c")]
+    per_chunk = estimate_tokens(context[0])
+
+    packed = pack_context("question", context, budget=2 * per_chunk + MIN_TRIMMED_TOKENS - 1)
+
+    assert packed.chunks[:2] == context[:2]
+    assert packed.tokens <= 2 * per_chunk + MIN_TRIMMED_TOKENS - 1
+    assert packed.tokens == sum(estimate_tokens(text) for text in packed.chunks)
+    assert packed.duplicates == 0
+
+
+def test_everything_fits_a_large_budget():
+    context = [chunk("a"), chunk("b")]
+    packed = pack_context("question", context, budget=10_000)
+    assert packed == (context, sum(estimate_tokens(text) for text in context), 0, 0, 0)
+
+
+def test_near_duplicates_are_skipped():
+    first = chunk("a", sentences=8)
+    # An overlapping window of the same text
+    overlapping = " ".join(first.split()[4:]) + " " + sentence("extra")
+    packed = pack_context("question", [first, overlapping, chunk("b")], budget=10_000)
+
+    assert packed.chunks == [first, chunk("b")]
+    assert packed.duplicates == 1
+
+
+def test_remaining_budget_goes_to_the_sentences_sharing_most_words_with_the_query():
+    first = chunk("a")
+    relevant = [sentence("b0x"), "The port number of the service is 8123 whenever the backend runs on this host.",
+                sentence("b2x"), "A closed backend port makes every client report that the connection was refused."]
+    second = " ".join(relevant)
+    # Less room than another sentence would take
+    budget = estimate_tokens(first) + estimate_tokens(relevant[1]) + estimate_tokens(relevant[3]) + 5
+
+    packed = pack_context("Which port does the backend use?", [first, second], budget=budget)
+
+    # Both matching sentences, in their original order, and none of the others
+    assert packed.chunks == [first, f"{relevant[1]} {relevant[3]}"]
+    assert packed.tokens <= budget
+    assert (packed.trimmed, packed.dropped) == (1, 0)
+
+
+def test_chunks_with_no_sentence_that_fits_are_dropped():
+    context = [chunk("a"), sentence("b", words=40), sentence("c", words=40)]
+    budget = estimate_tokens(context[0]) + MIN_TRIMMED_TOKENS + 1
+
+    packed = pack_context("question", context, budget=budget)
+
+    assert packed.chunks == [context[0]]
+    assert (packed.trimmed, packed.dropped) == (0, 2)
+
+
+def test_small_remainder_is_not_filled_with_trimmed_chunks():
+    context = [chunk("a"), chunk("b", sentences=8), sentence("c")]
+    budget = estimate_tokens(context[0]) + MIN_TRIMMED_TOKENS - 1
+    # The last sentence alone would fit the remainder
+    assert estimate_tokens(context[2]) < MIN_TRIMMED_TOKENS - 1
+
+    packed = pack_context("question", context, budget=budget)
+
+    assert packed.chunks == [context[0]]
+    assert (packed.trimmed, packed.dropped) == (0, 2)